@@ -0,0 +1,459 @@
+'''
+Potion strength and gold value, following the game's alchemy formula
+
+Every effect has a base cost, magnitude and duration (EFFECT_DATA, from
+UESP's Skyrim:Alchemy_Effects page; effects it doesn't know, such as
+those of modded ingredients, are worth nothing). Ingredients can scale
+them, which the UESP ingredient table notes after the effect name, e.g.
+'Fortify Sneak (2x mag)'. A potion gets each of its effects from the
+ingredient giving the most valuable version of it.
+
+The alchemist's power multiplies the magnitude (or the duration, for
+effects without a magnitude or with a fixed percentage one):
+    power = 4 * (1 + 0.5 * skill / 100) * (1 + fortify_alchemy / 100)
+            * (1 + alchemist perk) * (1 + physician perk)
+            * (1 + benefactor / poisoner perk)
+and each effect is worth
+    floor(cost * max(magnitude, 1) ** 1.1 * (duration / 10) ** 1.1)
+gold, with the duration term taken as 1 for instant effects.
+'''
+import re
+import heapq
+import numpy as np
+import pandas as pd
+
+from potion_cache import POTION_COLUMNS, encode_potions
+
+# Effect -> (base cost, base magnitude, base duration)
+EFFECT_DATA = {
+    'Cure Disease': (0.5, 5, 0),
+    'Damage Health': (3.0, 2, 1),
+    'Damage Magicka': (2.2, 3, 1),
+    'Damage Magicka Regen': (0.5, 100, 5),
+    'Damage Stamina': (1.8, 3, 1),
+    'Damage Stamina Regen': (0.3, 100, 5),
+    'Fear': (5.0, 1, 30),
+    'Fortify Alteration': (0.2, 4, 60),
+    'Fortify Barter': (2.0, 1, 30),
+    'Fortify Block': (0.5, 4, 60),
+    'Fortify Carry Weight': (0.15, 4, 300),
+    'Fortify Conjuration': (0.25, 5, 60),
+    'Fortify Destruction': (0.5, 5, 60),
+    'Fortify Enchanting': (0.6, 1, 30),
+    'Fortify Health': (0.35, 4, 60),
+    'Fortify Heavy Armor': (0.5, 2, 60),
+    'Fortify Illusion': (0.4, 4, 60),
+    'Fortify Light Armor': (0.5, 2, 60),
+    'Fortify Lockpicking': (0.5, 2, 30),
+    'Fortify Magicka': (0.3, 4, 60),
+    'Fortify Marksman': (0.5, 4, 60),
+    'Fortify One-handed': (0.5, 4, 60),
+    'Fortify Pickpocket': (0.5, 4, 60),
+    'Fortify Restoration': (0.5, 4, 60),
+    'Fortify Smithing': (0.75, 4, 30),
+    'Fortify Sneak': (0.5, 4, 60),
+    'Fortify Stamina': (0.3, 4, 60),
+    'Fortify Two-handed': (0.5, 4, 60),
+    'Frenzy': (15.0, 1, 10),
+    'Invisibility': (100.0, 0, 4),
+    'Lingering Damage Health': (12.0, 1, 10),
+    'Lingering Damage Magicka': (10.0, 1, 10),
+    'Lingering Damage Stamina': (1.8, 1, 10),
+    'Paralysis': (500.0, 0, 1),
+    'Ravage Health': (0.4, 2, 10),
+    'Ravage Magicka': (1.0, 2, 10),
+    'Ravage Stamina': (1.6, 2, 10),
+    'Regenerate Health': (0.1, 5, 300),
+    'Regenerate Magicka': (0.1, 5, 300),
+    'Regenerate Stamina': (0.1, 5, 300),
+    'Resist Fire': (0.5, 3, 60),
+    'Resist Frost': (0.5, 3, 60),
+    'Resist Magic': (1.0, 1, 60),
+    'Resist Poison': (0.5, 4, 60),
+    'Resist Shock': (0.5, 3, 60),
+    'Restore Health': (0.5, 5, 0),
+    'Restore Magicka': (0.6, 5, 0),
+    'Restore Stamina': (0.6, 5, 0),
+    'Slow': (1.0, 50, 5),
+    'Waterbreathing': (5.0, 0, 5),
+    'Weakness to Fire': (0.6, 3, 30),
+    'Weakness to Frost': (0.5, 3, 30),
+    'Weakness to Magic': (1.0, 2, 30),
+    'Weakness to Poison': (1.0, 2, 30),
+    'Weakness to Shock': (0.7, 3, 30),
+}
+# Effects missing from EFFECT_DATA (e.g. from mods) are worth no gold
+UNKNOWN_EFFECT = (0.0, 0, 0)
+# Effects whose magnitude is a fixed percentage, power goes to duration
+DURATION_EFFECTS = {'Damage Magicka Regen', 'Damage Stamina Regen', 'Slow'}
+HARMFUL_WORDS = ['Damage', 'Ravage', 'Lingering', 'Weakness', 'Fear',
+                 'Frenzy', 'Paralysis', 'Slow']
+SCORE_COLUMNS = ['Value', 'Primary Effect', 'Magnitude', 'Duration']
+
+MULTIPLIER = re.compile(
+    r'([\d.]+)\s*x\s*(mag|magnitude|dur|duration|val|value|cost)?',
+    re.IGNORECASE
+)
+
+
+def is_harmful(effect):
+    return any(word in effect for word in HARMFUL_WORDS)
+
+
+def parse_effect(text):
+    '''
+    Split an ingredient table effect into its name and multipliers
+
+    Args:
+        text (str): e.g. 'Restore Health', 'Fortify Sneak (2x mag)' or
+            'Slow (0.5x mag, 3x dur)'; a bare '(2x)' scales the magnitude
+
+    Returns:
+        (str): Effect name
+        (dict): 'Magnitude', 'Duration' and 'Value' multipliers
+    '''
+    name, _, notes = text.partition(' (')
+    multipliers = {'Magnitude': 1.0, 'Duration': 1.0, 'Value': 1.0}
+    for factor, kind in MULTIPLIER.findall(notes):
+        kind = (kind or 'mag')[:3].lower()
+        column = {'mag': 'Magnitude', 'dur': 'Duration'}.get(kind, 'Value')
+        multipliers[column] *= float(factor)
+    return name, multipliers
+
+
+def get_ingredient_multipliers(ingredients):
+    '''
+    Parsed effect multipliers of an ingredient table
+
+    Args:
+        ingredients (pd.DataFrame): Output of get_ingredients
+
+    Returns:
+        (pd.DataFrame): Ingredient Name, Effect, Magnitude, Duration and
+            Value multipliers, one row per ingredient effect
+    '''
+    rows = []
+    columns = ['Ingredient Name'] + [f'Effect {n+1}' for n in range(4)]
+    for name, *effects in ingredients[columns].itertuples(index=False):
+        for effect in effects:
+            effect, multipliers = parse_effect(effect)
+            rows.append({
+                'Ingredient Name': name, 'Effect': effect, **multipliers
+            })
+    return pd.DataFrame(rows)
+
+
+def get_power(effects, skill=15, alchemist=0, physician=False,
+              benefactor=False, poisoner=False, fortify_alchemy=0):
+    '''
+    Alchemist's power multiplier for each effect
+
+    Args:
+        effects (list of str): Effect names
+        skill (float): Alchemy skill level
+        alchemist (int): Ranks of the Alchemist perk (0-5, +20% each)
+        physician (bool): Physician perk (+25% to Restore effects)
+        benefactor (bool): Benefactor perk (+25% to beneficial effects)
+        poisoner (bool): Poisoner perk (+25% to harmful effects)
+        fortify_alchemy (float): Total Fortify Alchemy from gear, in %
+
+    Returns:
+        (np.ndarray): Power of each effect
+    '''
+    power = 4 * (1 + 0.5 * skill / 100) * (1 + fortify_alchemy / 100) \
+        * (1 + 0.2 * alchemist)
+    is_restore = np.array(
+        [effect.startswith('Restore') for effect in effects], bool
+    )
+    harmful = np.array([is_harmful(effect) for effect in effects], bool)
+    perk = np.where(harmful, 0.25 * poisoner, 0.25 * benefactor)
+    return power * (1 + 0.25 * physician * is_restore) * (1 + perk)
+
+
+def make_character(skill=None, fortify_alchemy=None, perks=()):
+    '''
+    get_power keyword arguments from the alchemist controls of the apps
+
+    Args:
+        skill (float or None): Alchemy skill, 15 if None
+        fortify_alchemy (float or None): Fortify Alchemy %, 0 if None
+        perks (list of str): Any of 'alchemist' (all 5 ranks),
+            'physician', 'benefactor' and 'poisoner'
+
+    Returns:
+        (dict): Keyword arguments of get_power
+    '''
+    perks = perks or ()
+    return {
+        'skill': skill or 15,
+        'fortify_alchemy': fortify_alchemy or 0,
+        'alchemist': 5 if 'alchemist' in perks else 0,
+        'physician': 'physician' in perks,
+        'benefactor': 'benefactor' in perks,
+        'poisoner': 'poisoner' in perks,
+    }
+
+
+def get_effect_values(ingredient_names, effects, ingredients=None,
+                      **character):
+    '''
+    Strength and value each ingredient gives each effect
+
+    Args:
+        ingredient_names (list of str): Rows of the output
+        effects (list of str): Columns of the output
+        ingredients (pd.DataFrame or None): Ingredient table to read the
+            effect multipliers from; all multipliers are 1 if None
+        **character: Keyword arguments of get_power
+
+    Returns:
+        (dict): 'Value', 'Magnitude' and 'Duration' arrays of shape
+            (#ingredients, #effects). Value is 0 for effects an ingredient
+            of the table doesn't have; ingredients missing from the table
+            get the unmodified effects.
+    '''
+    cost, magnitude, duration = np.array(
+        [EFFECT_DATA.get(effect, UNKNOWN_EFFECT) for effect in effects],
+        float
+    ).T.reshape(3, 1, -1)
+    shape = (len(ingredient_names), len(effects))
+    scale = {
+        column: np.ones(shape)
+        for column in ['Magnitude', 'Duration', 'Value']
+    }
+    if ingredients is not None:
+        multipliers = get_ingredient_multipliers(ingredients)
+        rows = pd.Index(ingredient_names).get_indexer(
+            multipliers['Ingredient Name']
+        )
+        columns = pd.Index(effects).get_indexer(multipliers['Effect'])
+        known = (rows >= 0) & (columns >= 0)
+
+        # Ingredients of the table are worth nothing for effects they lack
+        scale['Value'][np.unique(rows[known])] = 0
+        for column, values in scale.items():
+            values[rows[known], columns[known]] = \
+                multipliers[column].to_numpy()[known]
+
+    # Power goes to the magnitude, or the duration if there is none
+    power = get_power(effects, **character)
+    has_magnitude = (magnitude > 0) & np.array(
+        [effect not in DURATION_EFFECTS for effect in effects], bool
+    )
+    magnitude = np.round(
+        magnitude * scale['Magnitude'] * np.where(has_magnitude, power, 1)
+    )
+    duration = np.round(
+        duration * scale['Duration'] * np.where(has_magnitude, 1, power)
+    )
+    value = np.floor(
+        cost * scale['Value'] * np.maximum(magnitude, 1) ** 1.1
+        * np.where(duration > 0, duration / 10, 1) ** 1.1
+    )
+    return {'Value': value, 'Magnitude': magnitude, 'Duration': duration}
+
+
+def score_arrays(arrays, ingredients=None, **character):
+    '''
+    Gold value and strength of every potion of an encoded table
+
+    Each effect comes from the potion's ingredient giving the most
+    valuable version of it; the most valuable effect is the primary one,
+    and decides whether it's a potion or a poison.
+
+    Args:
+        arrays (dict): Output of potion_cache.encode_potions or
+            potion_cache.load_potion_arrays
+        ingredients (pd.DataFrame or None): Ingredient table, for the
+            effect multipliers (see get_effect_values)
+        **character: Keyword arguments of get_power
+
+    Returns:
+        (dict): SCORE_COLUMNS -> array, one entry per potion
+    '''
+    # Columns in alphabetical order, so ties pick the same primary effect
+    # whatever the bit order
+    order = np.argsort(arrays['effect_names'])
+    effects = list(np.array(arrays['effect_names'], object)[order])
+    has_fx = np.unpackbits(
+        np.asarray(arrays['effects']).astype('<u8').view(np.uint8), axis=1,
+        bitorder='little'
+    )[:, order].astype(bool)
+    values = get_effect_values(
+        arrays['ingredient_names'], effects, ingredients, **character
+    )
+
+    # Best ingredient of each effect; code -1 (no ingredient) picks the
+    # extra last row, worth nothing
+    codes = np.asarray(arrays['ingredients']).astype(np.intp)
+    value_table = np.vstack([values['Value'], np.full(len(effects), -1.0)])
+    potion_values = value_table[codes[:, 0]]
+    best_codes = np.repeat(codes[:, [0]], len(effects), axis=1)
+    for k in (1, 2):
+        candidate = value_table[codes[:, k]]
+        is_better = candidate > potion_values
+        potion_values = np.where(is_better, candidate, potion_values)
+        best_codes = np.where(is_better, codes[:, [k]], best_codes)
+
+    # Primary effect and its strength; effects the potion lacks can't be
+    # primary, even when all of its own are worth nothing
+    primary = np.where(has_fx, potion_values, -np.inf).argmax(axis=1)
+    primary_codes = best_codes[np.arange(codes.shape[0]), primary]
+    potion_values = np.where(has_fx, potion_values, 0)
+    return {
+        'Value': potion_values.sum(axis=1).astype(int),
+        'Primary Effect': np.array(effects, object)[primary],
+        'Magnitude': values['Magnitude'][primary_codes, primary].astype(int),
+        'Duration': values['Duration'][primary_codes, primary].astype(int),
+    }
+
+
+def score_potions(potions, ingredients=None, **character):
+    '''
+    Gold value and strength of every potion of a table (see score_arrays)
+
+    Returns:
+        (pd.DataFrame): SCORE_COLUMNS, with the index of potions
+    '''
+    effects = ', '.join(potions['Effects'].unique()).split(', ')
+    arrays = encode_potions(potions, sorted(set(EFFECT_DATA) | set(effects)))
+    return pd.DataFrame(
+        score_arrays(arrays, ingredients, **character), index=potions.index
+    )
+
+
+def find_top_potions(ing_space, k=20, ingredients=None, block_size=64,
+                     **character):
+    '''
+    The k most valuable potions of an ingredient-space, without listing
+    them all
+
+    Pairs are scored directly. Then every pair gets an upper bound on the
+    value of its 3-ingredient potions, and pairs are extended best bound
+    first, in blocks, stopping once no bound can beat the k-th best value
+    so far. Potions follow find_ALL_potions rules.
+
+    Args:
+        ing_space (pd.DataFrame): Output of get_ing_space, e.g. only the
+            ingredients you have
+        k (int): Number of potions
+        ingredients (pd.DataFrame or None): Ingredient table, for the
+            effect multipliers (see get_effect_values)
+        block_size (int): Number of pairs extended at once
+        **character: Keyword arguments of get_power
+
+    Returns:
+        (pd.DataFrame): Potion table columns and SCORE_COLUMNS, most
+            valuable first (ties in find_ALL_potions order)
+
+    Raises:
+        ValueError: If k is less than 1
+    '''
+    if k < 1:
+        raise ValueError(f'k must be at least 1, got {k}')
+
+    # Value each ingredient gives each of its effects
+    fx = ing_space.to_numpy() > 0
+    num_ing = fx.shape[0]
+    values = get_effect_values(
+        list(ing_space.index), list(ing_space.columns), ingredients,
+        **character
+    )
+    worth = np.where(fx, values['Value'], 0)
+
+    # Best value any ingredient from row i on gives each effect
+    best_after = np.vstack([
+        np.maximum.accumulate(worth[::-1], axis=0)[::-1],
+        np.zeros(fx.shape[1])
+    ])
+
+    # Min-heap of the k best so far: (value, negated loop order, inds)
+    heap = []
+
+    def threshold():
+        return heap[0][0] if len(heap) == k else -1
+
+    def push(value, inds):
+        item = (value, tuple(-i for i in inds), inds)
+        if len(heap) < k:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+
+    # A third ingredient brings at most this many effects
+    max_fx = max(1, min(int(fx.sum(axis=1).max()), fx.shape[1]))
+    pairs, bounds = [], []
+    for n in range(num_ing - 1):
+        # All 2-combinations starting with n
+        ms = np.arange(n + 1, num_ing)
+        best_12 = np.maximum(worth[n], worth[ms])
+        fx_12 = fx[n] & fx[ms]
+        pair_values = (best_12 * fx_12).sum(axis=1)
+        for m in ms[fx_12.any(axis=1) & (pair_values >= threshold())]:
+            push(pair_values[m - n - 1], (n, m, -1))
+
+        # Upper bound of the 3-ingredient potions of each pair: shared
+        # effects at their best, plus the best effects of only one of
+        # them that a third ingredient could share
+        best = np.maximum(best_12, best_after[ms + 1])
+        one_sided = np.where(fx[n] ^ fx[ms], best, 0)
+        one_sided = -np.partition(-one_sided, max_fx - 1, axis=1)
+        pairs.append(np.stack([np.full(ms.shape[0], n), ms], axis=1))
+        bounds.append(
+            (best * fx_12).sum(axis=1) + one_sided[:, :max_fx].sum(axis=1)
+        )
+
+    # Extend the most promising pairs first, a block at a time, until no
+    # bound can beat the k-th best value
+    pairs = np.concatenate(pairs) if pairs else np.zeros((0, 2), int)
+    bounds = np.concatenate(bounds) if bounds else np.zeros(0)
+    order = np.argsort(-bounds, kind='stable')
+    for start in range(0, order.shape[0], block_size):
+        block = order[start:start + block_size]
+        block = block[bounds[block] >= threshold()]
+        if block.shape[0] == 0:
+            break
+
+        # Expand to one entry per (n, m, j) triple
+        ns, ms = pairs[block].T
+        counts = num_ing - 1 - ms
+        n_arr = np.repeat(ns, counts)
+        m_arr = np.repeat(ms, counts)
+        starts = np.repeat(np.cumsum(counts) - counts, counts)
+        j_arr = np.arange(m_arr.shape[0]) - starts + m_arr + 1
+
+        fx_12 = fx[n_arr] & fx[m_arr]
+        fx_13 = fx[n_arr] & fx[j_arr]
+        fx_23 = fx[m_arr] & fx[j_arr]
+        fx_123 = fx_12 | fx_13 | fx_23
+        triple_values = (np.maximum(
+            np.maximum(worth[n_arr], worth[m_arr]), worth[j_arr]
+        ) * fx_123).sum(axis=1)
+
+        # Keep valuable enough potions with no dead ingredient
+        is_ok = (
+            (triple_values >= threshold())
+            & (fx_123 != fx_12).any(axis=1)
+            & (fx_123 != fx_13).any(axis=1)
+            & (fx_123 != fx_23).any(axis=1)
+        )
+        for t in np.flatnonzero(is_ok):
+            push(triple_values[t], (n_arr[t], m_arr[t], j_arr[t]))
+
+    # Most valuable first
+    inds = np.array([item[2] for item in sorted(heap, reverse=True)], int)
+    if inds.shape[0] == 0:
+        return pd.DataFrame(columns=POTION_COLUMNS + SCORE_COLUMNS)
+    names = np.append(np.asarray(ing_space.index, object), None)
+    columns = np.asarray(ing_space.columns)
+    has_fx = fx[inds[:, 0]] & fx[inds[:, 1]]
+    has_fx |= (fx[inds[:, 0]] | fx[inds[:, 1]]) & np.where(
+        inds[:, [2]] >= 0, fx[inds[:, 2]], False
+    )
+    potions = pd.DataFrame({
+        'Ingredient 1': names[inds[:, 0]],
+        'Ingredient 2': names[inds[:, 1]],
+        'Ingredient 3': names[inds[:, 2]],
+        'Effects': [', '.join(columns[row]) for row in has_fx],
+    })
+    return potions.join(score_potions(potions, ingredients, **character))
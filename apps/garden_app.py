@@ -0,0 +1,111 @@
+from dash import dcc, html, dash_table
+from dash.dependencies import Input, Output
+from app import app
+
+import registry
+import query_cache
+from alchemy import make_character
+from garden import get_yields, has_yields, plan_garden
+from planner import PLAN_COLUMNS
+
+PLANTING_COLUMNS = ['Ingredient Name', 'Plots', 'Harvest']
+
+layout = html.Div([
+    html.H1('Garden Planner'),
+    html.H4('Number of Garden Plots'),
+    dcc.Input(id='garden-plots', type='number', min=1, step=1, value=12),
+    html.H4('Maximize'),
+    dcc.RadioItems(
+        id='garden-objective',
+        options=[
+            {'label': 'Gold per Harvest', 'value': 'gold'},
+            {'label': 'Potions per Harvest', 'value': 'potions'},
+        ],
+        value='gold'
+    ),
+    html.H4('Alchemist'),
+    html.Div([
+        html.Label('Alchemy Skill '),
+        dcc.Input(id='garden-skill', type='number', min=15, max=100,
+                  value=15, style={'margin-right': 30}),
+        html.Label('Fortify Alchemy (%) '),
+        dcc.Input(id='garden-fortify', type='number', min=0, value=0),
+    ]),
+    dcc.Checklist(
+        id='garden-perks',
+        options=[
+            {'label': 'Alchemist (5/5)', 'value': 'alchemist'},
+            {'label': 'Physician', 'value': 'physician'},
+            {'label': 'Benefactor', 'value': 'benefactor'},
+            {'label': 'Poisoner', 'value': 'poisoner'},
+        ],
+        value=[],
+        inline=True
+    ),
+    html.P(id='garden-summary', style={'fontSize': 20}),
+    html.P(id='garden-warning', style={'color': 'darkred'}),
+    html.H4('Plantings'),
+    dash_table.DataTable(
+        id='garden-plantings',
+        columns=[{"name": i, "id": i} for i in PLANTING_COLUMNS],
+        data=[],
+        style_cell=dict(textAlign='left'),
+        style_header=dict(backgroundColor="palegreen"),
+        style_data=dict(backgroundColor="lavender")
+    ),
+    html.H4('Brewing Plan per Harvest'),
+    dash_table.DataTable(
+        id='garden-plan',
+        columns=[{"name": i, "id": i} for i in PLAN_COLUMNS],
+        data=[],
+        style_cell=dict(textAlign='left'),
+        style_header=dict(backgroundColor="paleturquoise"),
+        style_data=dict(backgroundColor="lavender")
+    ),
+])
+
+
+@app.callback(
+    Output('garden-plantings', 'data'),
+    Output('garden-plan', 'data'),
+    Output('garden-summary', 'children'),
+    Output('garden-warning', 'children'),
+    Input('garden-plots', 'value'),
+    Input('garden-objective', 'value'),
+    Input('garden-skill', 'value'),
+    Input('garden-fortify', 'value'),
+    Input('garden-perks', 'value'))
+def update_garden_plan(n_plots, objective, skill, fortify_alchemy, perks):
+    if not n_plots:
+        return [], [], 'Enter a number of plots.', ''
+
+    # Garden yields come from the ingredient snapshot, else 1 per plot
+    # (with a warning)
+    potions = registry.get_potions('garden')
+    try:
+        garden = registry.get_ingredients('garden')
+    except FileNotFoundError:
+        garden = None
+    yields = get_yields(garden, potions)
+    warning = '' if has_yields(garden) else (
+        'The ingredient snapshot has no Garden Yield, so every plot is '
+        'assumed to yield 1 ingredient: the plan is a rough guide. Refresh '
+        'the snapshot from UESP (python snapshot.py refresh) for real '
+        'yields.'
+    )
+    values = query_cache.score_potions(
+        'garden', **make_character(skill, fortify_alchemy, perks)
+    )['Value']
+    plantings, plan, bound = plan_garden(
+        potions, yields, int(n_plots), values, objective
+    )
+
+    unit = 'gold' if objective == 'gold' else 'potions'
+    summary = (
+        f'{int(plan["Total Value"].sum())} {unit} per harvest '
+        f'(at most {bound:.0f} with these plots)'
+    )
+    return (
+        plantings.to_dict('records'), plan.to_dict('records'), summary,
+        warning
+    )
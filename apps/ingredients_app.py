@@ -1,60 +1,74 @@
 from dash import dcc, html, dash_table
 from dash.dependencies import Input, Output
 
-from util import get_ingredients, get_effects, filter_by_effect
+import registry
+import query_cache
 from app import app
+from util import OPTIONAL_COLUMNS
 
 
-ingredients, garden = get_ingredients()
-fx = get_effects(ingredients)
-all_fx = fx['all']
-fx_options = [{'label': effect, 'value': effect} for effect in all_fx]
+def get_layout():
+    # Built on first visit, so the ingredient table loads lazily
+    ingredients = registry.get_ingredients()
+    all_fx = registry.get_ingredient_effects()['all']
+    fx_options = [{'label': effect, 'value': effect} for effect in all_fx]
 
-layout = html.Div([
-    html.H1('Ingredient Explorer'),
-    # Selections
-    html.Div([
+    # Columns the ingredient table doesn't have are left out, not shown
+    # as 0
+    missing = [
+        column for column in OPTIONAL_COLUMNS if column not in ingredients
+    ]
+    note = (
+        f'No {", ".join(missing)} in the ingredient table. Refresh the '
+        'snapshot from UESP (python snapshot.py refresh) for these figures.'
+        if missing else ''
+    )
+    return html.Div([
+        html.H1('Ingredient Explorer'),
+        html.P(note, style={'color': 'darkred'}),
+        # Selections
         html.Div([
-            html.H4('Select Set of Ingredients'),
-            dcc.RadioItems(
-                id='df-toggle',
-                options=[
-                    {'label': 'All', 'value': 'ingredients'},
-                    {'label': 'Garden', 'value': 'garden'},
-                ],
-                value='ingredients'
-            ),
-        ], style={'display': 'inline-block', 'margin-right': 50}),
-        html.Div([
-            html.H4('Select Effect Filter Logic'),
-            dcc.RadioItems(
-                id='logic-toggle',
-                options=[
-                    {'label': 'Union', 'value': '|'},
-                    {'label': 'Intersection', 'value': '&'},
-                ],
-                value='&'
-            ),
-        ], style={'display': 'inline-block'})
-    ]),
-    html.H4('Filter by Effect(s)'),
-    dcc.Dropdown(
-        id='effect-dropdown',
-        options=fx_options,
-        multi=True,
-        value=[]
-    ),
-    html.H4('Ingredients Table'),
-    dash_table.DataTable(
-        id='ingredient-table',
-        columns=[{"name": i, "id": i}
-                 for i in ingredients.columns],
-        data=ingredients.to_dict('records'),
-        style_cell=dict(textAlign='left'),
-        style_header=dict(backgroundColor="paleturquoise"),
-        style_data=dict(backgroundColor="lavender")
-    ),
-])
+            html.Div([
+                html.H4('Select Set of Ingredients'),
+                dcc.RadioItems(
+                    id='df-toggle',
+                    options=[
+                        {'label': 'All', 'value': 'ingredients'},
+                        {'label': 'Garden', 'value': 'garden'},
+                    ],
+                    value='ingredients'
+                ),
+            ], style={'display': 'inline-block', 'margin-right': 50}),
+            html.Div([
+                html.H4('Select Effect Filter Logic'),
+                dcc.RadioItems(
+                    id='logic-toggle',
+                    options=[
+                        {'label': 'Union', 'value': '|'},
+                        {'label': 'Intersection', 'value': '&'},
+                    ],
+                    value='&'
+                ),
+            ], style={'display': 'inline-block'})
+        ]),
+        html.H4('Filter by Effect(s)'),
+        dcc.Dropdown(
+            id='effect-dropdown',
+            options=fx_options,
+            multi=True,
+            value=[]
+        ),
+        html.H4('Ingredients Table'),
+        dash_table.DataTable(
+            id='ingredient-table',
+            columns=[{"name": i, "id": i}
+                     for i in ingredients.columns],
+            data=ingredients.to_dict('records'),
+            style_cell=dict(textAlign='left'),
+            style_header=dict(backgroundColor="paleturquoise"),
+            style_data=dict(backgroundColor="lavender")
+        ),
+    ])
 
 
 @app.callback(
@@ -63,17 +77,8 @@ layout = html.Div([
     Input('df-toggle', 'value'),
     Input('logic-toggle', 'value'))
 def update_figure(effects, kind, logic):
-    # Check whether or not to use garden
-    if kind == 'garden':
-        df = garden
-    elif kind == 'ingredients':
-        df = ingredients
-
-    # Check whether to filter by effect
-    if len(effects) == 0:
-        filtered_df = df
-    else:
-        filtered_df = filter_by_effect(df, effects, logic=logic)
+    # Filter the ingredient subset by effect (cached)
+    filtered_df = query_cache.filter_ingredients(kind, effects, logic)
 
     # Return the result
     return filtered_df.to_dict('records')
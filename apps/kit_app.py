@@ -2,21 +2,14 @@ from dash import dcc, html, dash_table
 from dash.dependencies import Input, Output, State
 from app import app
 
-import pickle
 import pandas as pd
-from pathlib import Path
+import registry
+import query_cache
 from util import make_kit, get_kit_effects
+from kit_solver import make_searched_kit
+from connectivity import get_compatible_effects, get_feasibility
 
-# Load caches
-cache_path = Path(
-    '/Users/patri/Documents/Python Stuff/Skyrim_Alchemy/cache'
-)
-with open(cache_path / 'all_fx.pkl', 'rb') as pickle_file:
-    all_fx = pickle.load(pickle_file)
-fx_options = [{'label': effect, 'value': effect} for effect in all_fx]
-
-all_potions = pd.read_csv(cache_path / 'all_potions.csv', index_col=0)
-garden_potions = pd.read_csv(cache_path / 'garden_potions.csv', index_col=0)
+fx_options = registry.get_effect_options()
 empty_kit = pd.DataFrame(
     columns=['Ingredient 1', 'Ingredient 2', 'Ingredient 3', 'Effects']
 )
@@ -44,6 +37,22 @@ layout = html.Div([
         multi=True,
         value=[]
     ),
+    html.P(id='kit-feasibility', children=[]),
+    html.H3('Select Kit Method'),
+    dcc.RadioItems(
+        id='kit-method',
+        options=[
+            {'label': 'Smallest', 'value': 'optimal'},
+            {'label': 'Local Search', 'value': 'search'},
+            {'label': 'Random', 'value': 'random'},
+        ],
+        value='optimal'
+    ),
+    html.H3('Max Number of Potions'),
+    dcc.Input(
+        id='kit-size', type='number', min=1, step=1, value=None,
+        placeholder='No limit (5 for local search)'
+    ),
     html.Button(id='generate-button', n_clicks=0, children='Generate'),
 
     # Status message
@@ -109,22 +118,75 @@ layout = html.Div([
 ])
 
 
+@app.callback(
+    Output('effect-dropdown-k', 'options'),
+    Output('kit-feasibility', 'children'),
+    Input('kit-subset', 'value'),
+    Input('effect-dropdown-k', 'value'))
+def update_effect_options(subset, effects):
+    # Answered from the connectivity graphs, not the potion table
+    effects = effects or []
+    connectivity = registry.get_connectivity(subset)
+    feasibility = get_feasibility(connectivity, effects)
+    present = set(get_compatible_effects(connectivity))
+    together = set(feasibility['together'])
+
+    options = []
+    for effect in sorted(present | set(effects) | registry.get_all_fx()):
+        option = {'label': effect, 'value': effect}
+        if effect not in present:
+            option['label'] += ' (not in sub-set)'
+            option['disabled'] = effect not in effects
+        elif feasibility['single'] and effect not in together:
+            option['label'] += ' (separate potion)'
+        options.append(option)
+
+    # Feasibility of the selection
+    messages = []
+    if feasibility['missing']:
+        messages.append(
+            f'Not possible: {", ".join(feasibility["missing"])}'
+        )
+    if feasibility['single']:
+        messages.append(
+            'The rest fits in a single potion' if feasibility['missing']
+            else 'Fits in a single potion'
+        )
+    elif feasibility['min_potions'] > 1:
+        messages.append(
+            f'Needs at least {feasibility["min_potions"]} potions'
+        )
+    return options, '. '.join(messages)
+
+
 @app.callback(
     Output('potion-storage-k', 'data'),
     Input('generate-button', 'n_clicks'),
     State('kit-subset', 'value'),
     State('effect-dropdown-k', 'value'),
+    State('kit-method', 'value'),
+    State('kit-size', 'value'),
 )
-def update_potion_storage(n_clicks, subset, effects):
-    if subset == 'ingredients':
-        kit_potions, fx, status = make_kit(all_potions, effects)
-    elif subset == 'garden':
-        kit_potions, fx, status = make_kit(garden_potions, effects)
+def update_potion_storage(n_clicks, subset, effects, method, kit_size):
+    potions = registry.get_potions(subset)
+    index = registry.get_effect_index(subset)
+    proven = None
+    if method == 'optimal':
+        kit_potions, fx, status, proven = query_cache.make_kit(
+            subset, effects, max_size=kit_size
+        )
+    elif method == 'search':
+        kit_potions, fx, status = make_searched_kit(
+            potions, effects, index, kit_size=kit_size or 5
+        )
+    elif method == 'random':
+        kit_potions, fx, status = make_kit(potions, effects, index)
     return (
         kit_potions.to_dict('records'),
         kit_potions.index.shape[0],
         status,
-        fx.to_dict()
+        fx.to_dict(),
+        proven
     )
 
 
@@ -152,12 +214,18 @@ def update_status_message(tup):
     status = tup[2]
     if status == 'no-effects':
         return 'No effects selected'
-    elif status == 'success':
-        return 'Kit successfully generated'
+    # Exact kits say whether the search proved them smallest
+    proven = tup[4]
+    note = {
+        True: ' (smallest possible)',
+        False: ' (best found, search budget reached)',
+    }.get(proven, '')
+    if status == 'success':
+        return 'Kit successfully generated' + note
     elif status == 'partial-success':
         fx = pd.Series(tup[3])
         missing_fx = ', '.join(fx[fx == -1].index)
-        return f'Some effects not possible: {missing_fx}'
+        return f'Some effects not possible: {missing_fx}' + note
     elif status == 'no-potions':
         return 'No potions with desired effects found'
 
@@ -1,22 +1,18 @@
-from dash import dcc, html, dash_table
+from dash import dcc, html, dash_table, ctx
 from dash.dependencies import Input, Output
+from dash.exceptions import MissingCallbackContextException
 from app import app
 
-import pickle
-import pandas as pd
-from pathlib import Path
-from util import filter_potions
+import registry
+import query_cache
+from alchemy import SCORE_COLUMNS, make_character
+from connectivity import get_compatible_effects
+from util import filter_table, sort_table, get_page
 
-# Load caches
-cache_path = Path(
-    '/Users/patri/Documents/Python Stuff/Skyrim_Alchemy/cache'
-)
-with open(cache_path / 'all_fx.pkl', 'rb') as pickle_file:
-    all_fx = pickle.load(pickle_file)
-fx_options = [{'label': effect, 'value': effect} for effect in all_fx]
+PAGE_SIZE = 25
 
-all_potions = pd.read_csv(cache_path / 'all_potions.csv', index_col=0)
-garden_potions = pd.read_csv(cache_path / 'garden_potions.csv', index_col=0)
+fx_options = registry.get_effect_options()
+all_potions = registry.get_potions('ingredients')
 
 layout = html.Div([
     html.H1('Potion Crafter'),
@@ -36,6 +32,25 @@ layout = html.Div([
         multi=True,
         value=[]
     ),
+    html.H4('Alchemist'),
+    html.Div([
+        html.Label('Alchemy Skill '),
+        dcc.Input(id='alchemy-skill', type='number', min=15, max=100,
+                  value=15, style={'margin-right': 30}),
+        html.Label('Fortify Alchemy (%) '),
+        dcc.Input(id='fortify-alchemy', type='number', min=0, value=0),
+    ]),
+    dcc.Checklist(
+        id='alchemy-perks',
+        options=[
+            {'label': 'Alchemist (5/5)', 'value': 'alchemist'},
+            {'label': 'Physician', 'value': 'physician'},
+            {'label': 'Benefactor', 'value': 'benefactor'},
+            {'label': 'Poisoner', 'value': 'poisoner'},
+        ],
+        value=[],
+        inline=True
+    ),
     html.H4('Potion Table'),
     html.P(
         id='potion-count',
@@ -43,43 +58,82 @@ layout = html.Div([
     dash_table.DataTable(
         id='potion-table',
         columns=[{"name": i, "id": i}
-                 for i in all_potions.columns],
-        data=all_potions.to_dict('records'),
+                 for i in all_potions.columns] +
+                [{"name": i, "id": i,
+                  "type": "text" if i == 'Primary Effect' else "numeric"}
+                 for i in SCORE_COLUMNS],
+        page_current=0,
+        page_size=PAGE_SIZE,
+        page_action='custom',
+        sort_action='custom',
+        sort_mode='multi',
+        sort_by=[],
+        filter_action='custom',
+        filter_query='',
         style_cell=dict(textAlign='left'),
         style_header=dict(backgroundColor="paleturquoise"),
         style_data=dict(backgroundColor="lavender")
     ),
-    dcc.Store(id='potion-storage')
 ])
 
 
+def is_paging():
+    # Whether the callback was fired by the table's page controls only
+    try:
+        triggered = ctx.triggered_prop_ids
+    except MissingCallbackContextException:
+        return True
+    return set(triggered) <= {'potion-table.page_current',
+                              'potion-table.page_size'}
+
+
 @app.callback(
-    Output('potion-storage', 'data'),
+    Output('potion-table', 'data'),
+    Output('potion-table', 'page_count'),
+    Output('potion-table', 'page_current'),
+    Output('potion-count', 'children'),
     Input('potion-subset', 'value'),
     Input('effect-dropdown-p', 'value'),
-)
-def update_potion_storage(subset, effects):
-    if subset == 'ingredients':
-        filtered_potions = filter_potions(all_potions, effects)
-    elif subset == 'garden':
-        filtered_potions = filter_potions(garden_potions, effects)
-    return (
-        filtered_potions.to_dict('records'),
-        filtered_potions.index.shape[0]
+    Input('alchemy-skill', 'value'),
+    Input('fortify-alchemy', 'value'),
+    Input('alchemy-perks', 'value'),
+    Input('potion-table', 'page_current'),
+    Input('potion-table', 'page_size'),
+    Input('potion-table', 'sort_by'),
+    Input('potion-table', 'filter_query'))
+def update_potion_table(subset, effects, skill, fortify_alchemy, perks,
+                        page_current, page_size, sort_by, filter_query):
+    # Filter by effect with the index, then score the rows (cached)
+    filtered_potions = query_cache.filter_potions(subset, effects)
+    scores = query_cache.score_potions(
+        subset, **make_character(skill, fortify_alchemy, perks)
     )
+    filtered_potions = filtered_potions.join(scores)
+    filtered_potions = filter_table(filtered_potions, filter_query)
 
-
-@app.callback(
-    Output('potion-table', 'data'),
-    Input('potion-storage', 'data')
-)
-def update_potion_table(tup):
-    return tup[0]
+    # Only send the visible page; a new query starts on the first one
+    if not is_paging():
+        page_current = 0
+    sorted_potions = sort_table(filtered_potions, sort_by)
+    page, page_count = get_page(sorted_potions, page_current, page_size)
+    return (
+        page.to_dict('records'),
+        page_count,
+        min(page_current, page_count - 1),
+        f'Number of Potions: {filtered_potions.index.shape[0]}'
+    )
 
 
 @app.callback(
-    Output('potion-count', 'children'),
-    Input('potion-storage', 'data')
-)
-def update_potion_count(tup):
-    return f'Number of Potions: {tup[1]}'
+    Output('effect-dropdown-p', 'options'),
+    Input('potion-subset', 'value'),
+    Input('effect-dropdown-p', 'value'))
+def update_effect_options(subset, effects):
+    # Only effects some potion has along with the selection
+    compatible = get_compatible_effects(
+        registry.get_connectivity(subset), effects or []
+    )
+    return [
+        {'label': effect, 'value': effect}
+        for effect in sorted(set(compatible) | set(effects or []))
+    ]
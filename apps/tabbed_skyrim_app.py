@@ -6,6 +6,8 @@ import numpy as np
 import pandas as pd
 from collections import defaultdict
 
+from potion_engine import find_potions_auto
+
 
 def check_first(s):
     bads = {'Collected', 'Harvested', 'collected', 'harvested'}
@@ -127,38 +129,10 @@ def filter_ing_space(ing_space, effects=[], logic='|'):
     return ing_space[conds]
 
 
-def find_potions(ing_space, effects=[]):
-    potions = []
-    num_ing = ing_space.index.shape[0]
-    for n in range(num_ing):
-        ing1 = ing_space.iloc[n]
-        for m in range(n+1, num_ing):
-            ing2 = ing_space.iloc[m]
-            combo = ing1 + ing2
-            check = combo[effects] > 1
-            if check.all():
-                potions.append({
-                    'Ingredient 1': ing_space.index[n],
-                    'Ingredient 2': ing_space.index[m],
-                    'Ingredient 3': None,
-                    'Effects': ', '.join(combo[combo > 1].index)
-                })
-            for j in range(m+1, num_ing):
-                combo = ing1 + ing2 + ing_space.iloc[j]
-                check = combo[effects] > 1
-                if check.all():
-                    potions.append({
-                        'Ingredient 1': ing_space.index[n],
-                        'Ingredient 2': ing_space.index[m],
-                        'Ingredient 3': ing_space.index[j],
-                        'Effects': ', '.join(combo[combo > 1].index)
-                    })
-    return pd.DataFrame(potions)
-
-
 def filter_find_potions(ing_space, effects=[]):
+    # find_potions rules, chunked on large ingredient-spaces
     filtered_space = filter_ing_space(ing_space, effects=effects)
-    potions = find_potions(filtered_space, effects=effects)
+    potions = find_potions_auto(filtered_space, effects=effects)
     return potions
 
 
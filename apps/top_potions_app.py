@@ -0,0 +1,87 @@
+from dash import dcc, html, dash_table
+from dash.dependencies import Input, Output, State
+from app import app
+
+import registry
+import query_cache
+from alchemy import SCORE_COLUMNS, make_character
+from potion_cache import POTION_COLUMNS
+
+layout = html.Div([
+    html.H1('Most Valuable Potions'),
+    html.H4('Select Ingredient Sub-set'),
+    dcc.RadioItems(
+        id='top-subset',
+        options=[
+            {'label': 'All', 'value': 'ingredients'},
+            {'label': 'Garden', 'value': 'garden'},
+        ],
+        value='ingredients'
+    ),
+    html.H4('Ingredients You Have (empty for all)'),
+    dcc.Dropdown(
+        id='top-ingredients',
+        options=[],
+        multi=True,
+        value=[]
+    ),
+    html.H4('Alchemist'),
+    html.Div([
+        html.Label('Alchemy Skill '),
+        dcc.Input(id='top-skill', type='number', min=15, max=100,
+                  value=15, style={'margin-right': 30}),
+        html.Label('Fortify Alchemy (%) '),
+        dcc.Input(id='top-fortify', type='number', min=0, value=0),
+    ]),
+    dcc.Checklist(
+        id='top-perks',
+        options=[
+            {'label': 'Alchemist (5/5)', 'value': 'alchemist'},
+            {'label': 'Physician', 'value': 'physician'},
+            {'label': 'Benefactor', 'value': 'benefactor'},
+            {'label': 'Poisoner', 'value': 'poisoner'},
+        ],
+        value=[],
+        inline=True
+    ),
+    html.H4('Number of Potions'),
+    dcc.Input(id='top-k', type='number', min=1, max=500, step=1, value=20),
+    html.Button(id='top-button', n_clicks=0, children='Find'),
+    html.H4('Potion Table'),
+    dash_table.DataTable(
+        id='top-table',
+        columns=[{"name": i, "id": i} for i in POTION_COLUMNS + SCORE_COLUMNS],
+        data=[],
+        style_cell=dict(textAlign='left'),
+        style_header=dict(backgroundColor="paleturquoise"),
+        style_data=dict(backgroundColor="lavender")
+    ),
+])
+
+
+@app.callback(
+    Output('top-ingredients', 'options'),
+    Input('top-subset', 'value'))
+def update_ingredient_options(subset):
+    return [
+        {'label': name, 'value': name}
+        for name in registry.get_ing_space(subset).index
+    ]
+
+
+@app.callback(
+    Output('top-table', 'data'),
+    Input('top-button', 'n_clicks'),
+    State('top-subset', 'value'),
+    State('top-ingredients', 'value'),
+    State('top-skill', 'value'),
+    State('top-fortify', 'value'),
+    State('top-perks', 'value'),
+    State('top-k', 'value'))
+def update_top_table(n_clicks, subset, names, skill, fortify_alchemy, perks,
+                     k):
+    # Best-first search with pruning, no full potion list (cached)
+    top = query_cache.top_potions(
+        subset, k or 20, names, **make_character(skill, fortify_alchemy, perks)
+    )
+    return top.to_dict('records')
@@ -0,0 +1,74 @@
+'''
+Check and time the effect co-occurrence graph against the potion table
+
+Usage:
+    python benchmarks/bench_connectivity.py [--queries 200]
+
+For random selections of 1-3 effects, compares the compatible effects
+and whether a single potion has the selection with a scan of the potion
+table's distinct Effects strings, and times building the graphs and
+answering a query.
+'''
+import sys
+import time
+import argparse
+import numpy as np
+from pathlib import Path
+
+root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(root))
+
+from connectivity import (  # noqa: E402
+    get_connectivity, get_compatible_effects, get_feasibility
+)
+from potion_cache import load_potion_arrays, load_potion_cache  # noqa: E402
+
+
+def scan_compatible(effect_sets, effects):
+    # Union of the potions having all of effects
+    compatible = set()
+    for potion_fx in effect_sets:
+        if effects <= potion_fx:
+            compatible |= potion_fx
+    return compatible
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    for name in ['all_potions', 'garden_potions']:
+        arrays = load_potion_arrays(root / 'cache' / name)
+        potions, _ = load_potion_cache(root / 'cache' / name)
+        effect_sets = [
+            set(fx.split(', ')) for fx in potions['Effects'].unique()
+        ]
+
+        start = time.perf_counter()
+        connectivity = get_connectivity(arrays)
+        t_build = time.perf_counter() - start
+
+        n_wrong, t_query, t_scan = 0, 0, 0
+        for _ in range(args.queries):
+            effects = set(rng.choice(
+                connectivity['effect_names'], rng.integers(1, 4),
+                replace=False
+            ))
+            start = time.perf_counter()
+            compatible = get_compatible_effects(connectivity, effects)
+            t_query += time.perf_counter() - start
+            start = time.perf_counter()
+            expected = scan_compatible(effect_sets, effects)
+            t_scan += time.perf_counter() - start
+            n_wrong += set(compatible) != expected
+            single = get_feasibility(connectivity, effects)['single']
+            n_wrong += single != bool(expected)
+
+        print(f'{name}: {potions.index.shape[0]} potions, '
+              f'built in {t_build * 1e3:.1f} ms, '
+              f'{t_query / args.queries * 1e6:.0f} us per query '
+              f'(scan: {t_scan / args.queries * 1e6:.0f} us), '
+              f'{n_wrong} wrong')
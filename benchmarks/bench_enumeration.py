@@ -0,0 +1,71 @@
+'''
+Benchmark the bitmask potion enumeration against the pandas reference
+
+Usage:
+    python benchmarks/bench_enumeration.py [--n-ingredients 40]
+
+The ingredient-space is rebuilt offline from cache/all_potions.csv. The
+pandas path is cubic in Series arithmetic, so it is timed on a subset of
+the ingredients; the bitmask and batch paths are also timed on the full
+set, and checked against cache/all_potions.csv. The rebuilt space orders
+effects alphabetically, and the cache in ingredient table order, so the
+Effects strings are compared as sets (the rows are compared as is).
+'''
+import sys
+import time
+import argparse
+import pandas as pd
+from pathlib import Path
+
+root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(root))
+
+from util import find_ALL_potions, get_ing_space_from_potions  # noqa: E402
+from potion_engine import (  # noqa: E402
+    find_ALL_potions_bitmask, find_ALL_potions_batch
+)
+
+
+def sort_effects(potions):
+    # Same table, with the effects of each potion in alphabetical order
+    potions = potions.copy()
+    potions['Effects'] = potions['Effects'].map(
+        lambda fx: ', '.join(sorted(fx.split(', ')))
+    )
+    return potions
+
+
+def time_it(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n-ingredients', type=int, default=40)
+    args = parser.parse_args()
+
+    potions = pd.read_csv(root / 'cache' / 'all_potions.csv', index_col=0)
+    ing_space = get_ing_space_from_potions(potions)
+    subset = ing_space.iloc[:args.n_ingredients]
+
+    slow, t_pandas = time_it(find_ALL_potions, subset)
+    fast, t_bitmask = time_it(find_ALL_potions_bitmask, subset)
+    batch, t_batch = time_it(find_ALL_potions_batch, subset)
+    assert slow.to_csv() == fast.to_csv(), 'Outputs differ'
+    assert slow.to_csv() == batch.to_csv(), 'Outputs differ'
+    print(f'{subset.shape[0]} ingredients, {fast.shape[0]} potions')
+    print(f'  pandas:  {t_pandas:8.3f} s')
+    print(f'  bitmask: {t_bitmask:8.3f} s ({t_pandas / t_bitmask:.0f}x)')
+    print(f'  batch:   {t_batch:8.3f} s ({t_pandas / t_batch:.0f}x)')
+
+    full, t_full = time_it(find_ALL_potions_bitmask, ing_space)
+    full_batch, t_full_batch = time_it(find_ALL_potions_batch, ing_space)
+    assert full.to_csv() == full_batch.to_csv(), 'Outputs differ'
+    assert sort_effects(full).to_csv() == sort_effects(potions).to_csv(), \
+        'Output differs from cache/all_potions.csv'
+    print(f'{ing_space.shape[0]} ingredients, {full.shape[0]} potions')
+    print(f'  bitmask: {t_full:8.3f} s')
+    print(f'  batch:   {t_full_batch:8.3f} s')
+    print('  same potions as cache/all_potions.csv')
@@ -0,0 +1,63 @@
+'''
+Benchmark the garden planner over different numbers of plots
+
+Usage:
+    python benchmarks/bench_garden.py [--plots 1 4 12 48 192]
+
+Garden yields come from the ingredient snapshot. Without them (no
+snapshot, or one rebuilt offline), every garden ingredient of
+cache/garden_potions gets a random yield of 1-4 (--seed): with equal
+yields, the first potion found uses every plot and the plans are
+trivial, so they wouldn't exercise the plot allocation.
+'''
+import sys
+import time
+import argparse
+import numpy as np
+from pathlib import Path
+
+root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(root))
+
+from alchemy import score_potions  # noqa: E402
+from garden import get_yields, has_yields, plan_garden  # noqa: E402
+from potion_cache import load_potion_cache  # noqa: E402
+from snapshot import load_snapshot  # noqa: E402
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--plots', type=int, nargs='+',
+                        default=[1, 4, 12, 48, 192])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    potions, _ = load_potion_cache(root / 'cache' / 'garden_potions')
+    try:
+        garden = load_snapshot(root / 'cache')[1]
+    except FileNotFoundError:
+        garden = None
+    if has_yields(garden):
+        yields = get_yields(garden)
+        print('Garden yields from the ingredient snapshot')
+    else:
+        names = sorted(get_yields(None, potions))
+        rng = np.random.default_rng(args.seed)
+        yields = dict(zip(names, rng.integers(1, 5, len(names)).tolist()))
+        print('No garden yields in the ingredient snapshot, using random '
+              'ones')
+    values = score_potions(potions)['Value']
+
+    print(f'{"Plots":>5} {"Objective":>9} {"Planted":>7} {"Total":>7} '
+          f'{"Bound":>7} {"Time":>9}')
+    for n_plots in args.plots:
+        for objective in ['gold', 'potions']:
+            start = time.perf_counter()
+            plantings, plan, bound = plan_garden(
+                potions, yields, n_plots, values, objective
+            )
+            seconds = time.perf_counter() - start
+            print(f'{n_plots:>5} {objective:>9} '
+                  f'{plantings.index.shape[0]:>7} '
+                  f'{int(plan["Total Value"].sum()):>7} {bound:>7.0f} '
+                  f'{seconds * 1e3:>6.1f} ms')
@@ -0,0 +1,174 @@
+'''
+Benchmark get_ing_space and get_fx_masks against the original loops
+
+Usage:
+    python benchmarks/bench_ing_space.py [--scale 1 10 100] [--check]
+
+Uses the ingredient snapshot when there is one, otherwise an ingredient
+table rebuilt from cache/all_potions.csv. Larger scales repeat the table
+under new names.
+
+Before timing anything, check_equal compares the vectorized functions
+with the loop versions on the table and on edge cases (effect
+multipliers, a single ingredient, reordered rows, the garden subset),
+and checks that missing effects are rejected instead of becoming 'nan'.
+--check stops after the checks.
+'''
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(root))
+
+from util import (  # noqa: E402
+    get_ing_space, get_ing_space_from_potions, get_effect_matrix
+)
+from potion_engine import get_fx_masks  # noqa: E402
+from snapshot import load_snapshot  # noqa: E402
+
+
+def get_ing_space_loop(ingredients):
+    # Original implementation
+    fx = sorted({
+        effect.split(' (')[0]
+        for n in range(4) for effect in ingredients[f'Effect {n+1}']
+    })
+    num_ing = ingredients.index.shape[0]
+    ing_space = pd.DataFrame(
+        np.zeros((num_ing, len(fx)), int),
+        index=ingredients['Ingredient Name'],
+        columns=fx
+    )
+    for n in range(num_ing):
+        row = ingredients.iloc[n]
+        name = row['Ingredient Name']
+        for m in range(4):
+            effect = row[f'Effect {m+1}'].split(' (')[0]
+            ing_space.loc[name, effect] += 1
+    return ing_space
+
+
+def get_fx_masks_loop(ing_space):
+    # Original implementation
+    masks = []
+    for row in (ing_space.values > 0):
+        mask = 0
+        for k, has_fx in enumerate(row):
+            if has_fx:
+                mask |= 1 << k
+        masks.append(mask)
+    return masks
+
+
+def load_ingredients():
+    try:
+        return load_snapshot(root / 'cache')[0]
+    except FileNotFoundError:
+        potions = pd.read_csv(root / 'cache' / 'all_potions.csv',
+                              index_col=0)
+        ing_space = get_ing_space_from_potions(potions)
+        rows = []
+        for name, has_fx in zip(ing_space.index, ing_space.to_numpy()):
+            rows.append([name] + list(ing_space.columns[has_fx > 0]))
+        return pd.DataFrame(rows, columns=[
+            'Ingredient Name', 'Effect 1', 'Effect 2', 'Effect 3',
+            'Effect 4'
+        ])
+
+
+def get_edge_cases(base):
+    '''
+    (dict): Name -> ingredient table exercising the vectorized paths
+    '''
+    multipliers = base.copy()
+    multipliers['Effect 1'] = multipliers['Effect 1'] + ' (1.5x)'
+    multipliers['Effect 3'] = multipliers['Effect 3'] + ' (2x mag)'
+    cases = {
+        'table': base,
+        'multipliers': multipliers,
+        'single ingredient': base.iloc[[0]],
+        'reordered': base.iloc[::-1],
+    }
+    if 'Garden Yield' in base:
+        cases['garden'] = base[base['Garden Yield'] > 0]
+    return cases
+
+
+def check_equal(base):
+    '''
+    Compare get_ing_space, get_effect_matrix and get_fx_masks with the
+    loop versions, and check that missing effects are rejected
+
+    Raises:
+        AssertionError: Naming the case that differs
+    '''
+    for name, ingredients in get_edge_cases(base).items():
+        slow = get_ing_space_loop(ingredients)
+        fast = get_ing_space(ingredients)
+        pd.testing.assert_frame_equal(slow, fast, obj=name)
+        pd.testing.assert_frame_equal(
+            slow, get_ing_space(ingredients, sparse=True).sparse.to_dense(),
+            obj=f'{name} (sparse)'
+        )
+        has_fx, all_fx = get_effect_matrix(ingredients)
+        assert list(all_fx) == list(slow.columns), f'{name}: effects differ'
+        assert (has_fx == (slow.to_numpy() > 0)).all(), \
+            f'{name}: effect matrix differs'
+        assert get_fx_masks_loop(slow) == get_fx_masks(fast), \
+            f'{name}: masks differ'
+
+    missing = base.copy()
+    missing.loc[missing.index[1], 'Effect 2'] = np.nan
+    try:
+        get_ing_space(missing)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('a missing effect was encoded')
+    print(f'get_ing_space, get_effect_matrix and get_fx_masks match the '
+          f'loops on {len(get_edge_cases(base))} cases')
+
+
+def time_it(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=int, nargs='+', default=[1, 10])
+    parser.add_argument('--check', action='store_true',
+                        help='Only run the equality checks')
+    args = parser.parse_args()
+
+    base = load_ingredients()
+    check_equal(base)
+    if args.check:
+        sys.exit(0)
+    print(f'{"Ingredients":>11} {"loop":>10} {"vectorized":>11} '
+          f'{"sparse":>10} {"masks loop":>11} {"masks":>10}')
+    for scale in args.scale:
+        ingredients = pd.concat([
+            base.assign(**{
+                'Ingredient Name': base['Ingredient Name'] + f' {k}'
+            }) for k in range(scale)
+        ], ignore_index=True)
+
+        slow, t_loop = time_it(get_ing_space_loop, ingredients)
+        fast, t_fast = time_it(get_ing_space, ingredients)
+        sparse, t_sparse = time_it(get_ing_space, ingredients, sparse=True)
+        pd.testing.assert_frame_equal(slow, fast)
+        pd.testing.assert_frame_equal(slow, sparse.sparse.to_dense())
+
+        masks_slow, t_masks_loop = time_it(get_fx_masks_loop, slow)
+        masks, t_masks = time_it(get_fx_masks, fast)
+        assert masks_slow == masks, 'Masks differ'
+
+        print(f'{ingredients.index.shape[0]:>11} {t_loop * 1e3:7.1f} ms '
+              f'{t_fast * 1e3:8.1f} ms {t_sparse * 1e3:7.1f} ms '
+              f'{t_masks_loop * 1e3:8.1f} ms {t_masks * 1e3:7.1f} ms')
@@ -0,0 +1,64 @@
+'''
+Benchmark the inventory planner on random inventories
+
+Usage:
+    python benchmarks/bench_planner.py [--items 25 50 110] [--max-count 50]
+
+Each inventory holds a random subset of the ingredients of
+cache/all_potions, with random counts. Prints the plan's total value,
+its upper bound and the time taken, for value and effect plans.
+'''
+import sys
+import time
+import argparse
+import warnings
+import numpy as np
+from pathlib import Path
+
+root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(root))
+
+from alchemy import score_potions  # noqa: E402
+from planner import plan_for_value, plan_for_effects  # noqa: E402
+from potion_cache import load_potion_cache, POTION_COLUMNS  # noqa: E402
+
+EFFECTS = ['Restore Health', 'Fortify Health', 'Resist Fire',
+           'Fortify Destruction', 'Regenerate Stamina', 'Invisibility']
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, nargs='+',
+                        default=[25, 50, 110])
+    parser.add_argument('--max-count', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    potions, _ = load_potion_cache(root / 'cache' / 'all_potions')
+    values = score_potions(potions)['Value']
+    names = sorted(potions[POTION_COLUMNS[:3]].stack().dropna().unique())
+    rng = np.random.default_rng(args.seed)
+
+    print(f'{"Items":>5} {"Units":>6} {"Value":>8} {"Bound":>8} '
+          f'{"Time":>9} {"Effects":>16} {"Time":>9}')
+    for n_items in args.items:
+        chosen = rng.choice(names, min(n_items, len(names)), replace=False)
+        inventory = {
+            name: int(count) for name, count in
+            zip(chosen, rng.integers(1, args.max_count, len(chosen)))
+        }
+
+        start = time.perf_counter()
+        plan, _, bound = plan_for_value(potions, values, inventory)
+        t_value = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            _, _, status, _ = plan_for_effects(potions, EFFECTS, inventory)
+        t_effects = time.perf_counter() - start
+
+        print(f'{len(inventory):>5} {sum(inventory.values()):>6} '
+              f'{plan["Total Value"].sum():>8} {bound:>8.0f} '
+              f'{t_value * 1e3:>6.0f} ms {status:>16} '
+              f'{t_effects * 1e3:>6.0f} ms')
@@ -0,0 +1,55 @@
+'''
+Benchmark the Potion Crafter table callback: payload size and latency
+
+Usage:
+    python benchmarks/bench_potion_table.py
+
+"Before" reproduces the old callback, which sent every filtered potion to
+the browser; "after" is the paged callback of apps/potions_app.py.
+'''
+import sys
+import json
+import time
+from pathlib import Path
+
+root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(root))
+
+import registry  # noqa: E402
+from util import filter_potions  # noqa: E402
+from apps.potions_app import update_potion_table, PAGE_SIZE  # noqa: E402
+
+QUERIES = [[], ['Resist Fire'], ['Fortify Sneak', 'Resist Fire']]
+
+
+def old_callback(subset, effects):
+    filtered_potions = filter_potions(registry.get_potions(subset), effects)
+    return (
+        filtered_potions.to_dict('records'),
+        filtered_potions.index.shape[0]
+    )
+
+
+def measure(func, *args, n_runs=5):
+    start = time.perf_counter()
+    for _ in range(n_runs):
+        result = func(*args)
+    seconds = (time.perf_counter() - start) / n_runs
+    payload = len(json.dumps(result, default=str))
+    return seconds, payload
+
+
+if __name__ == '__main__':
+    print(f'{"Effects":<30} {"Before":>20} {"After":>20}')
+    for effects in QUERIES:
+        t_old, size_old = measure(old_callback, 'ingredients', effects)
+        t_new, size_new = measure(
+            update_potion_table, 'ingredients', effects, 15, 0, [],
+            0, PAGE_SIZE, [], ''
+        )
+        label = ', '.join(effects) or '(none)'
+        print(
+            f'{label:<30} '
+            f'{t_old * 1e3:7.1f} ms {size_old / 1e3:7.0f} kB '
+            f'{t_new * 1e3:7.1f} ms {size_new / 1e3:7.1f} kB'
+        )
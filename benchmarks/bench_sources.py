@@ -0,0 +1,109 @@
+'''
+Load and score synthetic mod ingredient tables
+
+Usage:
+    python benchmarks/bench_sources.py [--ingredients 60 500 2000]
+        [--effects 70] [--top 5]
+
+Each table is written as CSV and JSON to a temporary folder, then loaded
+with sources.load_ingredients. Its effect universe is larger than the
+vanilla one, so some effects are unknown to alchemy.EFFECT_DATA: the
+script checks that the pipelines of the apps (potion enumeration,
+find_top_potions, score_potions and planner.plan_for_value) run on it,
+and that the unknown effects are worth no gold.
+'''
+import sys
+import time
+import json
+import argparse
+import tempfile
+import numpy as np
+from pathlib import Path
+
+root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(root))
+
+from util import get_ing_space  # noqa: E402
+from sources import load_ingredients  # noqa: E402
+from synthetic import load_reference, make_ingredients  # noqa: E402
+from potion_engine import find_ALL_potions_auto  # noqa: E402
+from alchemy import (  # noqa: E402
+    EFFECT_DATA, find_top_potions, score_potions
+)
+from planner import plan_for_value  # noqa: E402
+from potion_cache import POTION_COLUMNS  # noqa: E402
+
+MAX_POTION_TABLE = 150  # ingredients enumerated for scoring and planning
+
+
+def write_sources(ingredients, folder):
+    # The same table as CSV, and as JSON mapping names to effects
+    csv_path = Path(folder) / 'mod.csv'
+    json_path = Path(folder) / 'mod.json'
+    ingredients.to_csv(csv_path, index=False)
+    effects = ingredients[[f'Effect {n + 1}' for n in range(4)]]
+    with open(json_path, 'w') as json_file:
+        json.dump(dict(zip(ingredients['Ingredient Name'],
+                           effects.values.tolist())), json_file)
+    return csv_path, json_path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ingredients', type=int, nargs='+',
+                        default=[60, 500, 2000])
+    parser.add_argument('--effects', type=int, default=70)
+    parser.add_argument('--top', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    reference = load_reference()
+    print(f'{"Ingredients":>11} {"Unknown":>7} {"CSV":>8} {"JSON":>8} '
+          f'{"Top":>8} {"Plan":>8} {"Best":>6}')
+    with tempfile.TemporaryDirectory() as folder:
+        for n in args.ingredients:
+            table = make_ingredients(n, reference, args.effects, args.seed)
+            paths = write_sources(table, folder)
+            loaded, seconds = [], []
+            for path in paths:
+                start = time.perf_counter()
+                loaded.append(load_ingredients(path)[0])
+                seconds.append(time.perf_counter() - start)
+            ingredients = loaded[0]
+            assert loaded[1]['Ingredient Name'].tolist() == \
+                ingredients['Ingredient Name'].tolist()
+
+            ing_space = get_ing_space(ingredients)
+            unknown = [fx for fx in ing_space.columns
+                       if fx not in EFFECT_DATA]
+            assert unknown, 'the table should have non-vanilla effects'
+
+            # Top potions: unknown effects add nothing to the value
+            start = time.perf_counter()
+            top = find_top_potions(ing_space, args.top, ingredients)
+            t_top = time.perf_counter() - start
+            assert top.index.shape[0] > 0
+
+            # Score and plan on the potions of the first ingredients
+            space = ing_space.iloc[:MAX_POTION_TABLE]
+            potions = find_ALL_potions_auto(space)
+            scores = score_potions(potions, ingredients)
+            only_unknown = potions['Effects'].map(
+                lambda fx: not set(fx.split(', ')) & set(EFFECT_DATA)
+            ).to_numpy()
+            assert (scores['Value'].to_numpy()[only_unknown] == 0).all()
+            assert all(
+                primary in fx.split(', ') for primary, fx
+                in zip(scores['Primary Effect'], potions['Effects'])
+            ), 'a primary effect should be one of the potion\'s effects'
+
+            names = potions[POTION_COLUMNS[:3]].stack().dropna().unique()
+            inventory = dict.fromkeys(names, 5)
+            start = time.perf_counter()
+            plan, _, _ = plan_for_value(potions, scores['Value'], inventory)
+            t_plan = time.perf_counter() - start
+
+            best = int(np.max(top['Value']))
+            print(f'{n:>11} {len(unknown):>7} {seconds[0]:>7.3f}s '
+                  f'{seconds[1]:>7.3f}s {t_top:>7.3f}s {t_plan:>7.3f}s '
+                  f'{best:>6}', flush=True)
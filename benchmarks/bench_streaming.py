@@ -0,0 +1,86 @@
+'''
+Compare streaming potion enumeration with building the whole table
+
+Usage:
+    python benchmarks/bench_streaming.py [--n-ingredients 200]
+        [--batch-size 8192] [--first 100]
+
+Writes find_ALL_potions of the benchmark fixture (plus synthetic
+ingredients beyond 109) to a CSV, once from the full table and once
+batch by batch with iter_potion_batches, and reports the time and peak
+traced memory of both. Then times finding the first --first potions with
+an effect, against finding them all.
+'''
+import sys
+import time
+import argparse
+import itertools
+import tempfile
+import tracemalloc
+import pandas as pd
+from pathlib import Path
+
+root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(root))
+
+from util import get_ing_space  # noqa: E402
+from potion_engine import (  # noqa: E402
+    find_ALL_potions_batch, find_potions_batch, iter_potion_batches,
+    iter_potions
+)
+from bench_suite import FIXTURE, scale_ingredients  # noqa: E402
+
+
+def measure(func):
+    '''
+    (object, float, float): Result, seconds, peak traced memory in MB
+    '''
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, peak / 2**20
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n-ingredients', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=8192)
+    parser.add_argument('--first', type=int, default=100)
+    parser.add_argument('--effect', default='Paralysis')
+    args = parser.parse_args()
+
+    ingredients = scale_ingredients(pd.read_csv(FIXTURE), args.n_ingredients)
+    ing_space = get_ing_space(ingredients)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        full_path, stream_path = Path(tmp) / 'full.csv', Path(tmp) / 's.csv'
+
+        def write_full():
+            find_ALL_potions_batch(ing_space).to_csv(full_path)
+
+        def write_stream():
+            with open(stream_path, 'w', newline='') as csv_file:
+                for k, batch in enumerate(iter_potion_batches(
+                    ing_space, batch_size=args.batch_size
+                )):
+                    batch.to_csv(csv_file, header=k == 0)
+
+        _, t_full, mb_full = measure(write_full)
+        _, t_stream, mb_stream = measure(write_stream)
+        same = full_path.read_bytes() == stream_path.read_bytes()
+
+    print(f'{ing_space.shape[0]} ingredients, write all potions to CSV')
+    print(f'  full table: {t_full:7.2f} s {mb_full:8.1f} MB')
+    print(f'  streamed:   {t_stream:7.2f} s {mb_stream:8.1f} MB '
+          f'(identical file: {same})')
+
+    effects = [args.effect]
+    _, t_all, _ = measure(lambda: find_potions_batch(ing_space, effects))
+    first, t_first, _ = measure(lambda: list(itertools.islice(
+        iter_potions(ing_space, effects), args.first
+    )))
+    print(f'First {len(first)} potions with {args.effect}: '
+          f'{t_first * 1e3:.1f} ms (all of them: {t_all * 1e3:.1f} ms)')
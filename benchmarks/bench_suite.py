@@ -0,0 +1,288 @@
+'''
+Benchmark suite for the enumeration, filter and kit pipelines
+
+Usage:
+    python benchmarks/bench_suite.py [--scales 109 500 2000]
+        [--cases find_ALL_potions_batch make_kit ...] [--repeat 3]
+        [--save] [--tolerance 1.5] [--memory-tolerance 1.25]
+
+Runs offline on benchmarks/fixtures/ingredients.csv, the 109 vanilla
+ingredients (rebuilt from cache/all_potions, effects in alphabetical
+order). Larger scales, simulating mod packs, add synthetic ingredients
+with the fixture's effect frequencies (see synthetic.py).
+
+Every case records its best time over --repeat runs and its peak traced
+memory (tracemalloc, in a separate run). Cases whose cost grows too fast
+run on the first max_ingredients ingredients of the scale only (the
+potion table of the filter and kit cases is enumerated from the first
+250); the Ingredients column shows how many were used, and a capped case
+is only run at the first scale that reaches its cap. At mod-pack size,
+iter_potion_batches streams the potions of the first 500 ingredients,
+keeping those with a kit effect, and the *_kit_table cases search kits
+in that table.
+
+Results are compared with benchmarks/baselines.json: a case is flagged
+when it is more than --tolerance times slower, or uses more than
+--memory-tolerance times the memory (ignoring differences under 5 ms and
+1 MB, which are noise), and the script then exits with status 1. --save
+stores the results as the new baselines. Baselines are machine-specific,
+so refresh them on the machine that compares.
+'''
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(root))
+
+import util  # noqa: E402
+from potion_engine import (  # noqa: E402
+    find_ALL_potions_batch, find_potions_batch, iter_potion_batches
+)
+from kit_solver import make_optimal_kit, optimize_kit  # noqa: E402
+from synthetic import make_ingredients  # noqa: E402
+
+FIXTURE = Path(__file__).parent / 'fixtures' / 'ingredients.csv'
+BASELINES = Path(__file__).parent / 'baselines.json'
+EFFECTS = ['Restore Health', 'Fortify Health']
+KIT_EFFECTS = ['Resist Fire', 'Fortify Destruction', 'Regenerate Stamina',
+               'Invisibility', 'Restore Magicka', 'Fortify Sneak']
+POTION_TABLE_SIZE = 250  # ingredients enumerated for the potion table
+KIT_TABLE_SIZE = 500  # ingredients enumerated for the kit table
+MIN_SECONDS, MIN_MB = 0.005, 1.0  # smaller differences are noise
+
+
+def scale_ingredients(ingredients, n, seed=0):
+    '''
+    First n ingredients of the fixture, plus synthetic ones if n is larger
+
+    Synthetic ingredients follow the fixture's effect frequencies (see
+    synthetic.make_ingredients).
+    '''
+    if n <= ingredients.index.shape[0]:
+        return ingredients.iloc[:n].reset_index(drop=True)
+    extra = make_ingredients(
+        n - ingredients.index.shape[0], ingredients, seed=seed
+    )
+    return pd.concat([ingredients, extra[ingredients.columns]],
+                     ignore_index=True)
+
+
+def get_kit_potions(ing_space):
+    '''
+    Potions of an ingredient-space with any of KIT_EFFECTS, streamed
+    batch by batch (the whole table doesn't fit in memory at 500)
+    '''
+    pattern = '|'.join(KIT_EFFECTS)
+    batches = [
+        batch[batch['Effects'].str.contains(pattern)]
+        for batch in iter_potion_batches(ing_space, batch_size=2**18)
+    ]
+    return pd.concat(batches, ignore_index=True)
+
+
+def get_cases(data):
+    '''
+    (dict): Case name -> (max_ingredients, function of the scale's data)
+    '''
+    def space(n):
+        return data['ing_space'].iloc[:n]
+
+    return {
+        # Enumeration
+        'find_ALL_potions': (
+            20, lambda n: util.find_ALL_potions(space(n))
+        ),
+        'find_ALL_potions_batch': (
+            POTION_TABLE_SIZE, lambda n: find_ALL_potions_batch(space(n))
+        ),
+        'find_potions': (
+            109, lambda n: util.find_potions(
+                util.filter_ing_space(space(n), EFFECTS), EFFECTS
+            )
+        ),
+        'find_potions_batch': (
+            None, lambda n: find_potions_batch(
+                util.filter_ing_space(space(n), EFFECTS), EFFECTS
+            )
+        ),
+        'iter_potion_batches': (
+            KIT_TABLE_SIZE, lambda n: get_kit_potions(space(n))
+        ),
+
+        # Filters
+        'filter_by_effect': (
+            None, lambda n: util.filter_by_effect(
+                data['ingredients'].iloc[:n], EFFECTS, '|'
+            )
+        ),
+        'filter_potions': (
+            POTION_TABLE_SIZE,
+            lambda n: util.filter_potions(data['potions'], EFFECTS)
+        ),
+        'filter_potions_index': (
+            POTION_TABLE_SIZE, lambda n: util.filter_potions(
+                data['potions'], EFFECTS, data['index']
+            )
+        ),
+
+        # Kits
+        'make_kit': (
+            POTION_TABLE_SIZE, lambda n: util.make_kit(
+                data['potions'], KIT_EFFECTS, data['index']
+            )
+        ),
+        'make_optimal_kit': (
+            POTION_TABLE_SIZE, lambda n: make_optimal_kit(
+                data['potions'], KIT_EFFECTS, data['index']
+            )
+        ),
+        'optimize_kit': (
+            POTION_TABLE_SIZE, lambda n: optimize_kit(
+                data['potions'], KIT_EFFECTS, 3, data['index'],
+                n_restarts=3, time_limit=np.inf, seed=0
+            )
+        ),
+        'make_kit_kit_table': (
+            KIT_TABLE_SIZE, lambda n: util.make_kit(
+                data['kit_potions'], KIT_EFFECTS, data['kit_index']
+            )
+        ),
+        'make_optimal_kit_kit_table': (
+            KIT_TABLE_SIZE, lambda n: make_optimal_kit(
+                data['kit_potions'], KIT_EFFECTS, data['kit_index']
+            )
+        ),
+    }
+
+
+def get_data(fixture, n, cases):
+    '''
+    Ingredients, ingredient-space, potion table and effect index of a
+    scale, plus the kit table and its index if cases need them
+    '''
+    ingredients = scale_ingredients(fixture, n)
+    ing_space = util.get_ing_space(ingredients)
+    potions = find_ALL_potions_batch(ing_space.iloc[:POTION_TABLE_SIZE])
+    data = {
+        'ingredients': ingredients,
+        'ing_space': ing_space,
+        'potions': potions,
+        'index': util.get_effect_index(potions),
+    }
+    if any(case.endswith('_kit_table') for case in cases):
+        data['kit_potions'] = get_kit_potions(
+            ing_space.iloc[:KIT_TABLE_SIZE]
+        )
+        data['kit_index'] = util.get_effect_index(data['kit_potions'])
+    return data
+
+
+def measure(func, n, repeat):
+    '''
+    (float, float): Best time in seconds, peak traced memory in MB
+    '''
+    times = []
+    for _ in range(repeat):
+        np.random.seed(0)
+        start = time.perf_counter()
+        func(n)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    np.random.seed(0)
+    func(n)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak / 2**20
+
+
+def compare(results, baselines, tolerance, memory_tolerance):
+    '''
+    Add the ratios to the baselines, and flag regressions
+
+    Returns:
+        (pd.DataFrame): results with 'x Time', 'x Memory' and 'Regression'
+    '''
+    results = results.copy()
+    keys = results['Case'] + '@' + results['Scale'].astype(str)
+    base_time = keys.map(
+        lambda key: baselines.get(key, {}).get('Seconds')
+    ).astype(float)
+    base_memory = keys.map(
+        lambda key: baselines.get(key, {}).get('MB')
+    ).astype(float)
+    results['x Time'] = results['Seconds'] / base_time
+    results['x Memory'] = results['MB'] / base_memory
+    results['Regression'] = (
+        (results['x Time'] > tolerance)
+        & (results['Seconds'] - base_time > MIN_SECONDS)
+    ) | (
+        (results['x Memory'] > memory_tolerance)
+        & (results['MB'] - base_memory > MIN_MB)
+    )
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scales', type=int, nargs='+',
+                        default=[109, 500, 2000])
+    parser.add_argument('--cases', nargs='+', default=None)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--save', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=1.5)
+    parser.add_argument('--memory-tolerance', type=float, default=1.25)
+    args = parser.parse_args()
+
+    fixture = pd.read_csv(FIXTURE)
+    rows, done = [], set()
+    for scale in args.scales:
+        # Cases to run at this scale (capped ones run once)
+        todo = {}
+        for name, (max_ingredients, _) in get_cases({}).items():
+            n = min(scale, max_ingredients or scale)
+            if (args.cases is None or name in args.cases) and \
+                    (name, n) not in done:
+                todo[name] = n
+        data = get_data(fixture, scale, todo)
+        for name, (_, func) in get_cases(data).items():
+            if name not in todo:
+                continue
+            n = todo[name]
+            done.add((name, n))
+            seconds, mb = measure(func, n, args.repeat)
+            rows.append({
+                'Case': name, 'Scale': scale, 'Ingredients': n,
+                'Seconds': seconds, 'MB': mb,
+            })
+            print(f'{name:>22} {scale:>5} {n:>5} {seconds:>9.4f} s '
+                  f'{mb:>8.1f} MB', flush=True)
+    results = pd.DataFrame(rows)
+
+    baselines = {}
+    if BASELINES.exists():
+        with open(BASELINES) as json_file:
+            baselines = json.load(json_file)
+    if args.save:
+        for row in rows:
+            baselines[f'{row["Case"]}@{row["Scale"]}'] = {
+                'Ingredients': row['Ingredients'],
+                'Seconds': round(row['Seconds'], 6),
+                'MB': round(row['MB'], 3),
+            }
+        with open(BASELINES, 'w') as json_file:
+            json.dump(baselines, json_file, indent=1, sort_keys=True)
+        print(f'Saved {len(rows)} baselines to {BASELINES}')
+    else:
+        results = compare(
+            results, baselines, args.tolerance, args.memory_tolerance
+        )
+        print(results.to_string(index=False, float_format='{:.3f}'.format))
+        if results['Regression'].any():
+            sys.exit(1)
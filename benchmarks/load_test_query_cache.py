@@ -0,0 +1,94 @@
+'''
+Load test of the query cache backends across worker processes
+
+Usage:
+    python benchmarks/load_test_query_cache.py [--workers 4] [--queries 300]
+
+Each worker process plays the role of a gunicorn worker: it issues kit
+and potion-filter queries drawn from a Zipf distribution over a fixed
+pool of effect selections (a few popular selections, a long tail), and
+records the latency of every query. The run is repeated with the
+in-memory backend (one cache per worker) and the SQLite backend (one
+cache shared by all workers on the host).
+'''
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+from pathlib import Path
+from multiprocessing import Pool
+
+root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(root))
+
+import registry  # noqa: E402
+import query_cache  # noqa: E402
+
+
+def make_queries(n_queries, n_distinct, seed):
+    # Same pool of selections for every worker, different draws
+    rng = np.random.default_rng(0)
+    all_fx = sorted(registry.get_all_fx())
+    pool = [
+        tuple(rng.choice(all_fx, size=rng.integers(2, 7), replace=False))
+        for _ in range(n_distinct)
+    ]
+    rng = np.random.default_rng(seed + 1)
+    ranks = np.minimum(rng.zipf(1.3, size=n_queries), n_distinct) - 1
+    return [pool[rank] for rank in ranks]
+
+
+def run_worker(args):
+    backend, db_path, n_queries, n_distinct, seed = args
+    query_cache.set_backend(query_cache.make_backend(backend, db_path))
+    queries = make_queries(n_queries, n_distinct, seed)
+
+    latencies = []
+    for n, effects in enumerate(queries):
+        start = time.perf_counter()
+        if n % 2:
+            query_cache.make_kit('ingredients', effects)
+        else:
+            query_cache.filter_potions('ingredients', effects)
+        latencies.append(time.perf_counter() - start)
+
+    stats = query_cache.cache.stats()
+    return latencies, stats['hits'], stats['misses']
+
+
+def load_test(backend, n_workers, n_queries, n_distinct):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'query_cache.sqlite')
+        tasks = [
+            (backend, db_path, n_queries, n_distinct, seed)
+            for seed in range(n_workers)
+        ]
+        with Pool(n_workers) as pool:
+            results = pool.map(run_worker, tasks)
+
+    latencies = np.concatenate([result[0] for result in results])
+    hits = sum(result[1] for result in results)
+    misses = sum(result[2] for result in results)
+    return hits / (hits + misses), latencies
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--queries', type=int, default=300)
+    parser.add_argument('--distinct', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f'{args.workers} workers x {args.queries} queries, '
+          f'{args.distinct} distinct effect selections')
+    print(f'{"Backend":<8} {"Hit rate":>9} {"p50":>10} {"p95":>10} '
+          f'{"p99":>10}')
+    for backend in ['memory', 'sqlite']:
+        hit_rate, latencies = load_test(
+            backend, args.workers, args.queries, args.distinct
+        )
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1e3
+        print(f'{backend:<8} {hit_rate:9.1%} {p50:7.2f} ms {p95:7.2f} ms '
+              f'{p99:7.2f} ms')
@@ -0,0 +1,406 @@
+'''
+Rebuild the potion caches in parallel
+
+Usage:
+    python build_cache.py [--out-dir cache] [--workers 8]
+    python build_cache.py --incremental [--verify]
+    python build_cache.py --from-potions cache/all_potions.csv
+    python build_cache.py --ingredients mod_ingredients.csv
+
+The outer (first ingredient) loop of find_ALL_potions is sharded across a
+process pool. The ingredient-space is sent to each worker once, when the
+worker starts, and every shard is streamed to its own part file, batch by
+batch, along with its columnar encoding. Parts are merged in
+first-ingredient order, so the output is identical to a single-threaded
+find_ALL_potions run and diffs between rebuilds only show real changes.
+
+With --incremental, the existing cache is patched instead: only the
+combinations using added or changed ingredients are recomputed. Its
+ingredients and effects keep their order (new ones come last), so a run
+without changes leaves the tables as they are.
+'''
+import os
+import pickle
+import argparse
+import tempfile
+import pandas as pd
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from potion_engine import (
+    iter_potion_batches, find_ALL_potions_touching,
+    find_ALL_potions_auto
+)
+from potion_cache import (
+    encode_potions, get_effect_order, get_ingredient_order,
+    load_potion_cache, write_potion_cache, write_potion_strings
+)
+from sources import load_ingredients
+from util import get_effects, get_ing_space, get_ing_space_from_potions
+
+POTION_COLUMNS = ['Ingredient 1', 'Ingredient 2', 'Ingredient 3', 'Effects']
+
+# Set once per worker process by init_worker
+_ing_space = None
+
+
+def init_worker(ing_space):
+    global _ing_space
+    _ing_space = ing_space
+
+
+def build_shard(args):
+    '''
+    Find all potions starting with ingredients ns, and write them to path,
+    plus their columnar encoding to path.ingredients.npy / .effects.npy
+
+    Ingredients are coded against all of the ingredient-space's names
+    (sorted), so the parts can be concatenated as they are.
+    '''
+    ns, path, chunk_size = args
+    effects = list(_ing_space.columns)
+    names = sorted(_ing_space.index)
+    n_words = max(1, -(-len(effects) // 64))
+    codes = [np.empty((0, 3), np.int32)]
+    masks = [np.empty((0, n_words), np.uint64)]
+    n_potions = 0
+    with open(path, 'w', newline='') as part:
+        for batch in iter_potion_batches(
+            _ing_space, None, chunk_size, chunk_size, ns=ns
+        ):
+            batch.to_csv(part, header=False, index=False)
+            encoded = encode_potions(batch, effects, names)
+            codes.append(encoded['ingredients'])
+            masks.append(encoded['effects'])
+            n_potions += batch.index.shape[0]
+    np.save(path.with_suffix('.ingredients.npy'), np.concatenate(codes))
+    np.save(path.with_suffix('.effects.npy'), np.concatenate(masks))
+    return path, n_potions
+
+
+def merge_shards(paths, out_path):
+    '''
+    Concatenate part files in order, renumbering the index like to_csv
+    '''
+    n_rows = 0
+    with open(out_path, 'w', newline='') as out:
+        out.write(',' + ','.join(POTION_COLUMNS) + '\n')
+        for path in paths:
+            with open(path, newline='') as part:
+                for line in part:
+                    out.write(f'{n_rows},{line}')
+                    n_rows += 1
+    return n_rows
+
+
+def merge_shard_arrays(paths, cache_path, ing_space, all_fx=None):
+    '''
+    Concatenate the columnar parts of build_shard into a potion cache
+    directory, identical to write_potion_cache on the merged table
+
+    The parts are copied one at a time into memory-mapped .npy files, so
+    the potion table is never held as a DataFrame.
+    '''
+    cache_path = Path(cache_path)
+    cache_path.mkdir(parents=True, exist_ok=True)
+    parts = [
+        (np.load(path.with_suffix('.ingredients.npy'), mmap_mode='r'),
+         np.load(path.with_suffix('.effects.npy'), mmap_mode='r'))
+        for path in paths
+    ]
+    names = np.array(sorted(ing_space.index), object)
+    n_rows = sum(codes.shape[0] for codes, _ in parts)
+    n_words = max(1, -(-ing_space.columns.shape[0] // 64))
+
+    # Like encode_potions, only keep the names some potion uses
+    used = np.zeros(names.shape[0] + 1, bool)
+    for codes, _ in parts:
+        used[np.asarray(codes).ravel()] = True
+    used = used[:-1]  # code -1 (no ingredient)
+    new_codes = np.append(np.cumsum(used) - 1, -1)
+    dtype = np.int16 if used.sum() < 2**15 else np.int32
+
+    ingredients = np.lib.format.open_memmap(
+        cache_path / 'ingredients.npy', 'w+', dtype, (n_rows, 3)
+    )
+    effects = np.lib.format.open_memmap(
+        cache_path / 'effects.npy', 'w+', np.uint64, (n_rows, n_words)
+    )
+    start = 0
+    for codes, masks in parts:
+        stop = start + codes.shape[0]
+        ingredients[start:stop] = new_codes[codes]
+        effects[start:stop] = masks
+        start = stop
+    ingredients.flush()
+    effects.flush()
+
+    arrays = {
+        'ingredients': ingredients,
+        'effects': effects,
+        'ingredient_names': list(names[used]),
+        'effect_names': list(ing_space.columns),
+    }
+    write_potion_strings(arrays, cache_path, all_fx)
+
+
+def build_potions(ing_space, out_path, workers=None, chunk_size=2**16,
+                  all_fx=None):
+    '''
+    Sharded, multiprocess equivalent of find_ALL_potions(...).to_csv(...)
+
+    The columnar copy (see potion_cache) is written to out_path without
+    its suffix, e.g. cache/all_potions/, from the same shards.
+
+    Args:
+        ing_space (pd.DataFrame): Output of get_ing_space
+        out_path (str or Path): CSV file to write
+        workers (int or None): Number of processes (default: all cores)
+        chunk_size (int): Passed to iter_potion_batches
+        all_fx (set or None): Stored with the columnar copy
+
+    Returns:
+        (int): Number of potions written
+    '''
+    num_ing = ing_space.index.shape[0]
+
+    # One shard per first ingredient; the pool hands them out dynamically,
+    # which balances the heavy low-n shards against the light high-n ones
+    with tempfile.TemporaryDirectory(dir=Path(out_path).parent) as tmp:
+        tasks = [
+            ([n], Path(tmp) / f'part-{n:05d}.csv', chunk_size)
+            for n in range(num_ing - 1)
+        ]
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=init_worker,
+            initargs=(ing_space,)
+        ) as executor:
+            paths = [
+                path for path, _ in executor.map(build_shard, tasks)
+            ]
+
+        # Merge next to the target, then swap it in atomically
+        tmp_path = Path(tmp) / 'merged.csv'
+        n_potions = merge_shards(paths, tmp_path)
+        os.replace(tmp_path, out_path)
+        merge_shard_arrays(
+            paths, Path(out_path).with_suffix(''), ing_space, all_fx
+        )
+    return n_potions
+
+
+def diff_ing_spaces(old_space, new_space):
+    '''
+    Ingredients added, removed, or with different effects
+
+    Returns:
+        (dict of sets): 'added', 'removed' and 'changed' ingredient names
+    '''
+    def effect_sets(ing_space):
+        has_fx = ing_space.values > 0
+        columns = np.asarray(ing_space.columns)
+        return {
+            name: frozenset(columns[row])
+            for name, row in zip(ing_space.index, has_fx)
+        }
+
+    old_fx = effect_sets(old_space)
+    new_fx = effect_sets(new_space)
+    return {
+        'added': set(new_fx) - set(old_fx),
+        'removed': set(old_fx) - set(new_fx),
+        'changed': {
+            name for name in set(old_fx) & set(new_fx)
+            if old_fx[name] != new_fx[name]
+        },
+    }
+
+
+def align_ing_space(ing_space, potions):
+    '''
+    Reorder an ingredient-space like the one a potion table was built from
+
+    The table's ingredients and effects keep their order there, the others
+    follow in ing_space order, so find_ALL_potions of the result only
+    differs from the table where ingredients were added, removed or
+    changed.
+
+    Args:
+        ing_space (pd.DataFrame): Output of get_ing_space
+        potions (pd.DataFrame): Potion table, e.g. the cache
+
+    Returns:
+        (pd.DataFrame): ing_space with its rows and columns reordered
+    '''
+    def align(names, order):
+        known = set(names)
+        order = [name for name in order if name in known]
+        ordered = set(order)
+        return order + [name for name in names if name not in ordered]
+
+    return ing_space.loc[
+        align(ing_space.index, get_ingredient_order(potions)),
+        align(ing_space.columns, get_effect_order(potions))
+    ]
+
+
+def update_potions(potions, old_space, new_space):
+    '''
+    Patch find_ALL_potions(old_space) into find_ALL_potions(new_space)
+
+    Only the combinations using added or changed ingredients are
+    recomputed; rows using removed or changed ones are dropped. The kept
+    rows are rewritten in new_space order, so the spaces may list their
+    ingredients and effects in different orders (see align_ing_space to
+    keep the table's own).
+
+    Args:
+        potions (pd.DataFrame): find_ALL_potions(old_space), e.g. the cache
+        old_space (pd.DataFrame): Ingredient-space the cache was built from
+        new_space (pd.DataFrame): Updated ingredient-space
+
+    Returns:
+        (pd.DataFrame): Patched potion table
+        (dict of sets): Output of diff_ing_spaces
+    '''
+    diff = diff_ing_spaces(old_space, new_space)
+    stale = diff['removed'] | diff['changed']
+
+    # Keep the untouched rows, with their ingredients and effects in
+    # new_space order
+    columns = POTION_COLUMNS[:3]
+    kept = potions[~potions[columns].isin(stale).any(axis=1)].copy()
+    positions = {name: n for n, name in enumerate(new_space.index)}
+    keys = np.column_stack([
+        kept[column].map(positions).fillna(len(positions)).values
+        for column in columns
+    ])
+    kept[columns] = np.take_along_axis(
+        kept[columns].to_numpy(object),
+        np.argsort(keys, axis=1, kind='stable'), axis=1
+    )
+    fx_order = {effect: k for k, effect in enumerate(new_space.columns)}
+    fx_names = {
+        fx: ', '.join(sorted(fx.split(', '), key=fx_order.get))
+        for fx in kept['Effects'].unique()
+    }
+    kept['Effects'] = kept['Effects'].map(fx_names)
+    kept['Ingredient 3'] = kept['Ingredient 3'].astype(object)\
+        .where(kept['Ingredient 3'].notna(), None)
+
+    # Recompute everything touching new or changed ingredients
+    fresh = find_ALL_potions_touching(
+        new_space, diff['added'] | diff['changed']
+    )
+
+    # Merge back into loop order
+    merged = pd.concat([kept, fresh], ignore_index=True)
+    keys = [
+        merged[column].map(positions).fillna(-1).astype(int).values
+        for column in columns
+    ]
+    order = np.lexsort(keys[::-1])
+    merged = merged.iloc[order].reset_index(drop=True)
+    return merged, diff
+
+
+def write_potions(potions, out_path, ing_space, all_fx):
+    '''
+    Atomically write a potion table as CSV, plus its columnar copy
+    '''
+    out_path = Path(out_path)
+    tmp_path = out_path.with_suffix('.csv.tmp')
+    potions.to_csv(tmp_path)
+    os.replace(tmp_path, out_path)
+    write_potion_cache(
+        potions, out_path.with_suffix(''), all_fx=all_fx,
+        effects=list(ing_space.columns)
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--out-dir', default='cache')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=2**16)
+    parser.add_argument(
+        '--ingredients', default='snapshot',
+        help='Ingredient source: snapshot, uesp, or a CSV / JSON table '
+             '(see sources.py)'
+    )
+    parser.add_argument(
+        '--from-potions', default=None,
+        help='Rebuild the ingredient-space from an existing potion cache '
+             'instead of the ingredient snapshot'
+    )
+    parser.add_argument(
+        '--incremental', action='store_true',
+        help='Only recompute potions using added or changed ingredients'
+    )
+    parser.add_argument(
+        '--verify', action='store_true',
+        help='Check the result against a full single-process rebuild'
+    )
+    args = parser.parse_args()
+    out_dir = Path(args.out_dir)
+
+    if args.from_potions is not None:
+        potions = pd.read_csv(args.from_potions, index_col=0)
+        spaces = {'all': get_ing_space_from_potions(potions)}
+    else:
+        ingredients, garden = load_ingredients(args.ingredients, out_dir)
+        fx = get_effects(ingredients)
+        with open(out_dir / 'all_fx.pkl', 'wb') as pickle_file:
+            pickle.dump(fx['all'], pickle_file)
+        spaces = {
+            'all': get_ing_space(ingredients),
+            'garden': get_ing_space(garden),
+        }
+
+    all_fx = set(spaces['all'].columns)
+
+    # Current caches to patch, and every effect of their ingredients (the
+    # garden table alone doesn't show them all)
+    old_tables = {}
+    for name in spaces if args.incremental else []:
+        path = out_dir / f'{name}_potions.csv'
+        if path.exists():
+            old_tables[name] = pd.read_csv(path, index_col=0)
+    if old_tables:
+        cached_space = get_ing_space_from_potions(
+            pd.concat(old_tables.values())
+        )
+
+    for name, ing_space in spaces.items():
+        out_path = out_dir / f'{name}_potions.csv'
+
+        if name in old_tables:
+            # Diff against the space the cache was built from, in its order,
+            # and keep that order so unchanged rows are written as they were
+            old_potions = old_tables.pop(name)
+            old_space = cached_space.loc[get_ingredient_order(old_potions)]
+            ing_space = align_ing_space(ing_space, old_potions)
+            potions, diff = update_potions(old_potions, old_space, ing_space)
+            write_potions(potions, out_path, ing_space, all_fx)
+            print(
+                f'Patched {out_path}: {len(diff["added"])} added, '
+                f'{len(diff["removed"])} removed, '
+                f'{len(diff["changed"])} changed ingredients, '
+                f'{potions.index.shape[0]} potions'
+            )
+        else:
+            n_potions = build_potions(
+                ing_space, out_path, args.workers, args.chunk_size, all_fx
+            )
+            print(f'Wrote {n_potions} potions to {out_path}')
+
+        if args.verify:
+            # Both copies of the table, against a single-process rebuild
+            full = find_ALL_potions_auto(ing_space, args.chunk_size)\
+                .reindex(columns=POTION_COLUMNS).to_csv()
+            written = pd.read_csv(out_path, index_col=0).to_csv()
+            columnar, _ = load_potion_cache(out_path.with_suffix(''))
+            same = full == written == columnar.to_csv()
+            print(f'  {name} potions match a full rebuild: {same}')
@@ -0,0 +1,246 @@
+'''
+Effect co-occurrence and ingredient-sharing graphs of a potion table
+
+Both graphs are computed in one vectorized pass over the columnar potion
+arrays (see potion_cache.load_potion_arrays) and stored as CSR arrays:
+row x of a graph is indices[indptr[x]:indptr[x + 1]], with the number of
+potions in counts. The co-occurrence diagonal is the number of potions
+with each effect. Every effect also gets a bitmask of its neighbours (same
+bit order as the potion effect masks), so the effects that combine with
+any selection are found with a few bitwise ANDs.
+
+The graphs are cached next to the potion arrays, in connectivity.npz.
+Name -> row dictionaries ('effect_rows', 'ingredient_rows') are rebuilt
+on load, so rows are looked up in O(1).
+'''
+import numpy as np
+from pathlib import Path
+
+CONNECTIVITY_FILE = 'connectivity.npz'
+KINDS = ('effect', 'ingredient')
+
+
+def to_csr(rows, columns, counts, n_rows):
+    # Sorted COO entries -> (indptr, indices, counts)
+    order = np.lexsort((columns, rows))
+    indptr = np.zeros(n_rows + 1, np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+    return indptr, columns[order].astype(np.int32), counts[order]
+
+
+def add_rows(connectivity):
+    # Name -> row dictionaries of both graphs, not saved to disk
+    for kind in KINDS:
+        connectivity[f'{kind}_rows'] = {
+            name: k for k, name in enumerate(connectivity[f'{kind}_names'])
+        }
+    return connectivity
+
+
+def get_connectivity(arrays):
+    '''
+    Effect co-occurrence and ingredient-sharing graphs of a potion table
+
+    Args:
+        arrays (dict): Columnar potion arrays ('ingredients', 'effects',
+            'ingredient_names', 'effect_names')
+
+    Returns:
+        (dict): 'effect_names', 'ingredient_names', the CSR arrays
+            'effect_indptr', 'effect_indices', 'effect_counts' (potions
+            with both effects) and 'ingredient_indptr',
+            'ingredient_indices', 'ingredient_counts' (potions with both
+            ingredients), 'neighbours' ((#effects, #words) bitmasks of the
+            co-occurring effects), the distinct effect masks 'masks',
+            and the name -> row dictionaries 'effect_rows' and
+            'ingredient_rows'
+    '''
+    effect_names = list(arrays['effect_names'])
+    ingredient_names = list(arrays['ingredient_names'])
+    n_fx, n_ing = len(effect_names), len(ingredient_names)
+    n_words = arrays['effects'].shape[1]
+
+    # Distinct effect masks and how many potions have each
+    masks = np.ascontiguousarray(arrays['effects'])
+    uniques, inverse = np.unique(
+        masks.view(np.dtype((np.void, 8 * n_words))), return_inverse=True
+    )
+    uniques = uniques.view(np.uint64).reshape(-1, n_words)
+    n_potions = np.bincount(inverse.ravel(), minlength=uniques.shape[0])
+    has_fx = np.unpackbits(
+        uniques.astype('<u8').view(np.uint8), axis=1, bitorder='little'
+    )[:, :n_fx].astype(np.int64)
+
+    # Effect x effect: potions with both effects
+    cooccurrence = has_fx.T @ (has_fx * n_potions[:, None])
+    rows, columns = np.nonzero(cooccurrence)
+    effect_csr = to_csr(rows, columns, cooccurrence[rows, columns], n_fx)
+    neighbours = np.packbits(
+        np.pad(cooccurrence > 0, ((0, 0), (0, 64 * n_words - n_fx))),
+        axis=1, bitorder='little'
+    ).view('<u8').astype(np.uint64)
+
+    # Ingredient x ingredient: potions with both ingredients, both ways
+    codes = np.asarray(arrays['ingredients'], np.int64)
+    pairs = [codes[:, [a, b]] for a, b in [(0, 1), (0, 2), (1, 2)]]
+    pairs = np.concatenate(pairs)
+    pairs = pairs[(pairs >= 0).all(axis=1)]
+    pairs = np.concatenate([pairs, pairs[:, ::-1]])
+    keys, counts = np.unique(
+        pairs[:, 0] * n_ing + pairs[:, 1], return_counts=True
+    )
+    ingredient_csr = to_csr(keys // n_ing, keys % n_ing, counts, n_ing)
+
+    return add_rows({
+        'effect_names': effect_names,
+        'ingredient_names': ingredient_names,
+        'effect_indptr': effect_csr[0],
+        'effect_indices': effect_csr[1],
+        'effect_counts': effect_csr[2],
+        'ingredient_indptr': ingredient_csr[0],
+        'ingredient_indices': ingredient_csr[1],
+        'ingredient_counts': ingredient_csr[2],
+        'neighbours': neighbours,
+        'masks': uniques,
+    })
+
+
+def write_connectivity(connectivity, path):
+    '''
+    Save the output of get_connectivity to <path>/connectivity.npz
+    '''
+    arrays = {
+        key: value for key, value in connectivity.items()
+        if not key.endswith('_rows')
+    }
+    for kind in KINDS:
+        arrays[f'{kind}_names'] = np.array(arrays[f'{kind}_names'], str)
+    np.savez(Path(path) / CONNECTIVITY_FILE, **arrays)
+
+
+def load_connectivity(path):
+    '''
+    Load <path>/connectivity.npz, as returned by get_connectivity
+    '''
+    with np.load(Path(path) / CONNECTIVITY_FILE) as npz:
+        connectivity = {key: npz[key] for key in npz.files}
+    for kind in KINDS:
+        connectivity[f'{kind}_names'] = \
+            connectivity[f'{kind}_names'].tolist()
+    return add_rows(connectivity)
+
+
+def get_row(connectivity, kind, name):
+    '''
+    (dict): Neighbour -> number of potions, of an effect or ingredient
+
+    Args:
+        kind (str): 'effect' or 'ingredient'
+        name (str): Effect or ingredient name
+    '''
+    names = connectivity[f'{kind}_names']
+    k = connectivity[f'{kind}_rows'].get(name)
+    if k is None:
+        return {}
+    start, stop = connectivity[f'{kind}_indptr'][k:k + 2]
+    indices = connectivity[f'{kind}_indices'][start:stop]
+    counts = connectivity[f'{kind}_counts'][start:stop]
+    return {names[i]: int(n) for i, n in zip(indices, counts)}
+
+
+def get_compatible_effects(connectivity, effects=()):
+    '''
+    Effects that at least one potion has together with all of effects
+
+    Neighbour bitmasks give a superset (effects co-occurring with each
+    selected effect, pair by pair); it is made exact with the distinct
+    effect masks of the potions having the whole selection.
+
+    Args:
+        connectivity (dict): Output of get_connectivity
+        effects (iterable of str): Selected effects
+
+    Returns:
+        (list of str): Compatible effects, including the selected ones,
+            in bit order; empty if no potion has all of effects
+    '''
+    names = connectivity['effect_names']
+    neighbours = connectivity['neighbours']
+    bits = connectivity['effect_rows']
+    effects = set(effects)
+    if not effects.issubset(bits):
+        return []
+
+    selected = np.zeros(neighbours.shape[1], np.uint64)
+    candidates = np.bitwise_or.reduce(neighbours, axis=0)
+    for effect in effects:
+        word, bit = divmod(bits[effect], 64)
+        selected[word] |= np.uint64(1 << bit)
+        candidates &= neighbours[bits[effect]]
+
+    # Exact: union of the masks containing the selection
+    if len(effects) > 1:
+        masks = connectivity['masks']
+        has_all = ((masks & selected) == selected).all(axis=1)
+        candidates &= np.bitwise_or.reduce(
+            masks[has_all], axis=0, initial=np.uint64(0)
+        )
+    is_compatible = np.unpackbits(
+        candidates.astype('<u8').view(np.uint8), bitorder='little'
+    )[:len(names)].astype(bool)
+    return [name for name, ok in zip(names, is_compatible) if ok]
+
+
+def has_bit(masks, k):
+    # Bit k of each (..., #words) mask
+    word, bit = divmod(k, 64)
+    return (masks[..., word] >> np.uint64(bit)) & np.uint64(1) == 1
+
+
+def get_feasibility(connectivity, effects):
+    '''
+    How a selection of effects can be covered, without the potion table
+
+    Answered from the distinct effect masks (the effect sets a single
+    potion can have) and the neighbour bitmasks (compatible pairs).
+
+    Args:
+        connectivity (dict): Output of get_connectivity
+        effects (iterable of str): Selected effects
+
+    Returns:
+        (dict): 'missing': selected effects no potion has,
+            'single': whether one potion has all the others,
+            'together': effects one potion can have along with all the
+            others (see get_compatible_effects),
+            'min_potions': lower bound on the number of potions of a kit,
+            from a set of pairwise incompatible selected effects
+    '''
+    names = connectivity['effect_names']
+    neighbours = connectivity['neighbours']
+    bits = connectivity['effect_rows']
+    effects = list(dict.fromkeys(effects))
+    missing = [
+        effect for effect in effects
+        if effect not in bits or not has_bit(neighbours[bits[effect]],
+                                             bits[effect])
+    ]
+    found = [effect for effect in effects if effect not in missing]
+    together = get_compatible_effects(connectivity, found)
+
+    # Greedy set of pairwise incompatible effects, most incompatible first
+    codes = np.array([bits[effect] for effect in found], int)
+    is_compatible = np.array([
+        [has_bit(neighbours[i], j) for j in codes] for i in codes
+    ], bool).reshape(len(codes), len(codes))
+    separate = []
+    for k in np.argsort(is_compatible.sum(axis=1), kind='stable'):
+        if not is_compatible[k, separate].any():
+            separate.append(k)
+
+    return {
+        'missing': missing,
+        'single': len(found) > 0 and len(together) > 0,
+        'together': together,
+        'min_potions': len(separate),
+    }
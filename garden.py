@@ -0,0 +1,160 @@
+'''
+Hearthfire garden planner: what to plant for the most potions or gold
+
+Every plot grows one ingredient, and yields its Garden Yield of it per
+harvest. With brews b of a potion per harvest, ingredient i needs
+b / yield_i plots, so a potion costs sum(1 / yield_i) plots per brew.
+With a single constraint (the number of plots), the best fractional
+plan grows a single potion: the one with the most value per plot, which
+gives the upper bound. Plots being whole, plan_garden instead picks the
+potion with the most value for the plots left, exactly, and repeats with
+the remaining plots.
+'''
+import numpy as np
+import pandas as pd
+
+from planner import plan_for_value, get_ingredient_codes
+from potion_cache import POTION_COLUMNS
+
+OBJECTIVES = ('gold', 'potions')
+
+
+def has_yields(garden):
+    '''
+    Whether a garden ingredient table has Garden Yield data
+    '''
+    return garden is not None and 'Garden Yield' in garden and \
+        bool((garden['Garden Yield'] > 0).any())
+
+
+def get_yields(garden, potions=None):
+    '''
+    Ingredient name -> Garden Yield, for a garden ingredient table
+
+    Without Garden Yield data (see has_yields), every ingredient of
+    potions (e.g. the garden potions) yields 1 per plot, a placeholder
+    that makes plans a rough guide at best.
+
+    Args:
+        garden (pd.DataFrame or None): Garden ingredient table
+        potions (pd.DataFrame or None): Potion table for the fallback
+
+    Returns:
+        (dict): Ingredient name -> Garden Yield
+    '''
+    if has_yields(garden):
+        garden = garden[garden['Garden Yield'] > 0]
+        return dict(zip(garden['Ingredient Name'], garden['Garden Yield']))
+    if potions is None:
+        return {}
+    names = potions[POTION_COLUMNS[:3]].stack().dropna().unique()
+    return dict.fromkeys(sorted(names), 1)
+
+
+def allocate_plots(recipe_yields, n_plots):
+    '''
+    Most brews per harvest of each potion, growing only its ingredients
+
+    Binary search on the number of brews b, for all potions at once: b is
+    feasible when sum(ceil(b / yield_i)) plots are enough.
+
+    Args:
+        recipe_yields (np.ndarray): (#potions, 3) yield of each ingredient
+            of each potion, 0 for no ingredient
+        n_plots (int): Number of plots
+
+    Returns:
+        (np.ndarray): Brews per harvest of each potion
+        (np.ndarray): (#potions, 3) plots given to each ingredient
+    '''
+    recipe_yields = np.asarray(recipe_yields, np.int64)
+    has = recipe_yields > 0
+    safe_yields = np.where(has, recipe_yields, 1)
+
+    def plots_for(brews):
+        return np.where(has, -(-brews[:, None] // safe_yields), 0)
+
+    low = np.zeros(recipe_yields.shape[0], np.int64)
+    high = n_plots * recipe_yields.max(axis=1) + 1
+    while (high - low > 1).any():
+        mid = (low + high) // 2
+        is_ok = plots_for(mid).sum(axis=1) <= n_plots
+        low = np.where(is_ok, mid, low)
+        high = np.where(is_ok, high, mid)
+    return low, plots_for(low)
+
+
+def plan_garden(potions, yields, n_plots, values=None, objective='gold'):
+    '''
+    Plantings and brewing plan for a number of garden plots
+
+    Args:
+        potions (pd.DataFrame): Potion table, e.g. the garden potions
+        yields (dict): Ingredient name -> Garden Yield (see get_yields)
+        n_plots (int): Number of plots
+        values (array-like or None): Gold value of each potion, needed for
+            the 'gold' objective
+        objective (str): 'gold' (total value) or 'potions' (count)
+
+    Returns:
+        (pd.DataFrame): Ingredient Name, Plots, Harvest (per cycle)
+        (pd.DataFrame): Brewing plan of the harvest (see
+            planner.plan_for_value), whose Total Value is the number of
+            potions for the 'potions' objective
+        (float): Upper bound on the objective per harvest
+    '''
+    if objective not in OBJECTIVES:
+        raise ValueError(f'Unknown objective: {objective}')
+    if objective == 'potions':
+        values = np.ones(potions.index.shape[0])
+    elif values is None:
+        raise ValueError('The gold objective needs potion values')
+    values = np.asarray(values, float)
+
+    # Potions that can be grown entirely
+    names = sorted(yields)
+    codes = get_ingredient_codes(potions, names)
+    is_grown = np.all(
+        (codes >= 0) | potions[POTION_COLUMNS[:3]].isna().to_numpy(), axis=1
+    )
+    codes, values = codes[is_grown], values[is_grown]
+    grown = potions[is_grown]
+    yield_array = np.array([yields[name] for name in names], np.int64)
+    recipe_yields = np.append(yield_array, 0)[codes]
+
+    # Best fractional plan: the most value per plot
+    bound = 0.0
+    if codes.shape[0] > 0:
+        plots_per_brew = np.where(
+            recipe_yields > 0, 1 / np.maximum(recipe_yields, 1), 0
+        ).sum(axis=1)
+        bound = float(n_plots * (values / plots_per_brew).max())
+
+    # Whole plots: best potion for the plots left, until none fits
+    plots = np.zeros(len(names), np.int64)
+    left = n_plots
+    while left > 0 and codes.shape[0] > 0:
+        brews, allocation = allocate_plots(recipe_yields, left)
+        best = int((values * brews).argmax())
+        if brews[best] == 0:
+            break
+        used = codes[best] >= 0
+        plots[codes[best][used]] += allocation[best][used]
+        left -= allocation[best].sum()
+
+    # Spare plots go to the planted ingredient with the smallest harvest
+    planted = np.flatnonzero(plots)
+    for _ in range(left if planted.shape[0] else 0):
+        smallest = planted[(plots * yield_array)[planted].argmin()]
+        plots[smallest] += 1
+
+    plantings = pd.DataFrame({
+        'Ingredient Name': names,
+        'Plots': plots,
+        'Harvest': plots * yield_array,
+    })
+    plantings = plantings[plantings['Plots'] > 0]\
+        .sort_values('Plots', ascending=False, kind='stable')
+    harvest = dict(zip(plantings['Ingredient Name'], plantings['Harvest']))
+    plan, _, _ = plan_for_value(grown, values, harvest)
+    return plantings.reset_index(drop=True), plan, bound
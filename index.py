@@ -1,8 +1,14 @@
+import time
 from dash import dcc, html
 from dash.dependencies import Input, Output
 
-from app import app
-from apps import ingredients_app, potions_app, kit_app
+start = time.perf_counter()
+
+import registry  # noqa: E402
+from app import app  # noqa: E402
+from apps import (  # noqa: E402
+    ingredients_app, potions_app, kit_app, top_potions_app, garden_app
+)
 
 
 app.layout = html.Div([
@@ -15,21 +21,36 @@ app.layout = html.Div([
     dcc.Link('Navigate to Potion Crafter', href='/potions'),
     html.Br(),
     dcc.Link('Navigate to Potion Kit Generator', href='/kit'),
+    html.Br(),
+    dcc.Link('Navigate to Most Valuable Potions', href='/top'),
+    html.Br(),
+    dcc.Link('Navigate to Garden Planner', href='/garden'),
 
     # App(let) layout based on url path
     html.Div(id='page-content')
 ])
 
 
+# Startup report: datasets loaded while importing the apps
+startup_seconds = time.perf_counter() - start
+startup_report = registry.report()
+print(f'Startup took {startup_seconds:.2f} s')
+print(startup_report.round(3).to_string())
+
+
 @app.callback(Output('page-content', 'children'),
               Input('url', 'pathname'))
 def display_page(pathname):
     if pathname == '/ingredients':
-        return ingredients_app.layout
+        return ingredients_app.get_layout()
     elif pathname == '/potions':
         return potions_app.layout
     elif pathname == '/kit':
         return kit_app.layout
+    elif pathname == '/top':
+        return top_potions_app.layout
+    elif pathname == '/garden':
+        return garden_app.layout
     else:
         return '404'
 
@@ -0,0 +1,416 @@
+import time
+import numpy as np
+import pandas as pd
+from collections import defaultdict
+
+from util import get_effect_index
+
+KIT_COLUMNS = ['Ingredient 1', 'Ingredient 2', 'Ingredient 3', 'Effects']
+MAX_NODES = 10000  # default search budget of solve_set_cover, ~1 s
+
+
+def popcount(mask):
+    return bin(mask).count('1')
+
+
+def get_cover_masks(potions, effects, index=None):
+    '''
+    Effect coverage of every potion, as bitmasks over the desired effects
+
+    Potions covering the same desired effects are merged, keeping the one
+    with the fewest effects overall, and coverages that are a strict
+    subset of another one are dropped: neither can make a kit smaller.
+
+    Args:
+        potions (pd.DataFrame): Potion table
+        effects (list of str): Desired effects (bit k = effects[k])
+        index (dict or None): Output of get_effect_index(potions)
+
+    Returns:
+        (dict): Coverage bitmask -> row position of a potion
+    '''
+    if index is None:
+        index = get_effect_index(potions)
+
+    # Coverage of every potion with at least one desired effect
+    coverage = defaultdict(int)
+    for k, effect in enumerate(effects):
+        for row in index.get(effect, []):
+            coverage[int(row)] |= 1 << k
+
+    # One potion per coverage: fewest effects, then first in the table
+    n_effects = potions['Effects'].str.count(', ').values + 1
+    best = {}
+    for row, mask in coverage.items():
+        if mask not in best or (n_effects[row], row) < \
+                (n_effects[best[mask]], best[mask]):
+            best[mask] = row
+
+    # Drop dominated coverages
+    masks = sorted(best, key=popcount, reverse=True)
+    kept = []
+    for mask in masks:
+        if not any(mask & other == mask for other in kept):
+            kept.append(mask)
+    return {mask: best[mask] for mask in kept}
+
+
+def greedy_cover(masks, target, max_size):
+    '''
+    Greedy set cover, used as the initial bound of solve_set_cover
+    '''
+    chosen = []
+    uncovered = target
+    while uncovered and len(chosen) < max_size:
+        mask = max(masks, key=lambda m: popcount(m & uncovered))
+        if mask & uncovered == 0:
+            break
+        chosen.append(mask)
+        uncovered &= ~mask
+    return chosen
+
+
+def solve_set_cover(masks, target, max_size=None, max_nodes=MAX_NODES,
+                    time_limit=None):
+    '''
+    Smallest set of masks covering target, by branch-and-bound
+
+    If max_size is too small to cover everything, the set of at most
+    max_size masks covering the most bits is returned instead (fewest
+    masks among ties). The search stops after max_nodes nodes, so the
+    result only depends on the input, not on the machine's speed.
+
+    Args:
+        masks (list of int): Candidate bitmasks
+        target (int): Bits to cover
+        max_size (int or None): Maximum number of masks
+        max_nodes (int or None): Search nodes before returning the best
+            so far, unlimited if None
+        time_limit (float or None): Seconds before returning the best so
+            far, unlimited if None (makes the result machine-dependent)
+
+    Returns:
+        (list of int): Chosen masks
+        (bool): Whether the result is proven optimal
+    '''
+    # Bits no mask covers can't be part of the kit
+    masks = list(masks)
+    reachable = 0
+    for mask in masks:
+        reachable |= mask
+    target &= reachable
+    if max_size is None:
+        max_size = popcount(target)
+    limited = max_size < popcount(target)
+    if max_nodes is None:
+        max_nodes = np.inf
+    deadline = time.perf_counter() + (
+        np.inf if time_limit is None else time_limit
+    )
+
+    # Masks covering each bit, and bits sharing a mask with each bit
+    covers = defaultdict(list)
+    for mask in masks:
+        for k in range(target.bit_length()):
+            if mask >> k & 1 and target >> k & 1:
+                covers[k].append(mask)
+    neighbors = {}
+    for k, k_masks in covers.items():
+        neighbors[k] = 0
+        for mask in k_masks:
+            neighbors[k] |= mask
+    by_rarity = sorted(covers, key=lambda k: len(covers[k]))
+
+    def n_independent(undecided):
+        # Bits that no single mask covers together each need their own mask
+        n_bits = 0
+        blocked = 0
+        for k in by_rarity:
+            if undecided >> k & 1 and not blocked >> k & 1:
+                n_bits += 1
+                blocked |= neighbors[k]
+        return n_bits
+
+    # Incumbent: (#bits covered, -#masks) is maximized
+    best = greedy_cover(masks, target, max_size)
+    covered = 0
+    for mask in best:
+        covered |= mask
+    best_key = (popcount(covered & target), -len(best))
+    n_nodes = 0
+    timed_out = False
+
+    def search(chosen, covered, undecided):
+        nonlocal best, best_key, n_nodes, timed_out
+        n_nodes += 1
+        if n_nodes > max_nodes or time.perf_counter() > deadline:
+            timed_out = True
+            return
+
+        # Leaf
+        key = (popcount(covered), -len(chosen))
+        if undecided == 0 or len(chosen) == max_size:
+            if key > best_key:
+                best, best_key = list(chosen), key
+            return
+
+        # Bound: every remaining slot covers at most max_gain new bits
+        max_gain = max(popcount(mask & undecided) for mask in masks)
+        n_undecided = popcount(undecided)
+        slots = max_size - len(chosen)
+        bound_covered = popcount(covered) + min(n_undecided, slots * max_gain)
+        n_needed = -(-min(n_undecided, slots * max_gain) // max_gain)
+        if not limited:
+            n_needed = max(n_needed, n_independent(undecided))
+        if (bound_covered, -(len(chosen) + n_needed)) <= best_key:
+            return
+
+        # Branch on the undecided bit with the fewest candidate masks
+        bit = min(
+            (k for k in covers if undecided >> k & 1),
+            key=lambda k: len(covers[k])
+        )
+        options = sorted(
+            covers[bit], key=lambda m: popcount(m & undecided), reverse=True
+        )
+        for mask in options:
+            chosen.append(mask)
+            search(chosen, covered | (mask & target), undecided & ~mask)
+            chosen.pop()
+            if timed_out:
+                return
+
+        # Leave the bit uncovered, only useful when slots are limited
+        if limited:
+            search(chosen, covered, undecided & ~(1 << bit))
+
+    search([], 0, target)
+    return best, not timed_out
+
+
+def make_optimal_kit(potions, effects, index=None, max_size=None,
+                     max_nodes=MAX_NODES, time_limit=None):
+    '''
+    Deterministic, smallest kit of potions with all the desired effects
+
+    Drop-in replacement for make_kit, solving the minimum set cover of the
+    desired effects exactly (see solve_set_cover).
+
+    Args:
+        potions (pd.DataFrame): Potion table
+        effects (list of str): Desired effects
+        index (dict or None): Output of get_effect_index(potions)
+        max_size (int or None): Maximum number of potions in the kit
+        max_nodes (int or None): Search budget (see solve_set_cover)
+        time_limit (float or None): Seconds before returning the best kit
+            so far
+
+    Returns:
+        (pd.DataFrame): Kit potions, with a '# Effects' column
+        (pd.Series): Number of kit potions with each effect (-1 if a
+            desired effect isn't in the kit)
+        (str): 'success', 'partial-success', 'no-potions' or 'no-effects'
+        (bool): Whether the kit is proven to be the smallest, False if
+            the search ran out of budget first
+    '''
+    if len(effects) == 0:
+        return (pd.DataFrame(columns=KIT_COLUMNS), pd.Series(), 'no-effects',
+                True)
+    effects = list(dict.fromkeys(effects))
+
+    # Solve the set cover over the desired effects
+    cover_masks = get_cover_masks(potions, effects, index)
+    target = (1 << len(effects)) - 1
+    chosen, proven = solve_set_cover(
+        list(cover_masks), target, max_size, max_nodes, time_limit
+    )
+    rows = sorted(cover_masks[mask] for mask in chosen)
+
+    kit = potions.iloc[rows][KIT_COLUMNS].copy()
+    return summarize_kit(kit, effects) + (proven,)
+
+
+def summarize_kit(kit, effects):
+    '''
+    Add '# Effects' to a kit, and count its effects like make_kit does
+
+    Returns:
+        (pd.DataFrame): Kit potions, sorted by '# Effects'
+        (pd.Series): Number of kit potions with each effect (-1 if a
+            desired effect isn't in the kit)
+        (str): 'success', 'partial-success' or 'no-potions'
+    '''
+    kit['# Effects'] = kit['Effects'].apply(lambda x: len(x.split(', ')))
+    kit.sort_values('# Effects', inplace=True)
+
+    # Count effects, flagging desired ones that are missing
+    fx = defaultdict(int)
+    for ptn_fx in kit['Effects']:
+        for effect in ptn_fx.split(', '):
+            fx[effect] += 1
+    for effect in effects:
+        if effect not in fx:
+            fx[effect] = -1
+    fx = pd.Series(fx, dtype=int)
+
+    if kit.index.shape[0] == 0:
+        status = 'no-potions'
+    elif (fx < 0).any():
+        status = 'partial-success'
+    else:
+        status = 'success'
+    return kit, fx, status
+
+
+def get_coverage_matrix(potions, effects, index=None, exclude=()):
+    '''
+    Boolean (potions x desired effects) coverage matrix
+
+    Args:
+        potions (pd.DataFrame): Potion table
+        effects (list of str): Desired effects (columns)
+        index (dict or None): Output of get_effect_index(potions)
+        exclude (iterable of str): Potions with any of these effects are
+            left out
+
+    Returns:
+        (np.ndarray): Row positions of the candidate potions, i.e. those
+            with a desired effect and no excluded one
+        (np.ndarray): Their coverage, of shape (#candidates, #effects)
+    '''
+    if index is None:
+        index = get_effect_index(potions)
+    n_potions = potions.index.shape[0]
+    coverage = np.zeros((n_potions, len(effects)), bool)
+    for k, effect in enumerate(effects):
+        coverage[index.get(effect, []), k] = True
+
+    is_candidate = coverage.any(axis=1)
+    for effect in exclude:
+        is_candidate[index.get(effect, [])] = False
+    rows = np.flatnonzero(is_candidate)
+    return rows, coverage[rows]
+
+
+def anneal_kit(coverage, kit_size, n_steps=2000, t_start=1.0, t_end=0.01,
+               rng=None, deadline=None):
+    '''
+    One simulated annealing run over kits of kit_size candidates
+
+    Each step picks a slot of the kit and scores every possible
+    replacement at once; the replacement is drawn with Boltzmann weights
+    exp(-#missing / T), with T decaying geometrically from t_start to
+    t_end.
+
+    Returns:
+        (np.ndarray): Best kit found, as indices into coverage
+        (int): Its number of missing effects
+        (list of int): Best number of missing effects after each step
+    '''
+    rng = np.random.default_rng(rng)
+    n_candidates, n_effects = coverage.shape
+    cover = coverage.astype(np.int32)
+
+    kit = rng.choice(
+        n_candidates, size=kit_size, replace=n_candidates < kit_size
+    )
+    counts = cover[kit].sum(axis=0)
+    missing = int((counts == 0).sum())
+    best_kit, best_missing = kit.copy(), missing
+    trajectory = []
+
+    decay = np.arange(n_steps) / max(1, n_steps - 1)
+    temps = t_start * (t_end / t_start) ** decay
+    for temp in temps:
+        if best_missing == 0 or (
+            deadline is not None and time.perf_counter() > deadline
+        ):
+            break
+
+        # Score every replacement of one slot
+        slot = rng.integers(kit_size)
+        rest = counts - cover[kit[slot]]
+        new_missing = n_effects - ((rest > 0) | coverage).sum(axis=1)
+
+        # Boltzmann draw over all replacements
+        weights = np.exp(-(new_missing - new_missing.min()) / temp)
+        new = rng.choice(n_candidates, p=weights / weights.sum())
+        kit[slot] = new
+        counts = rest + cover[new]
+        missing = int(new_missing[new])
+
+        if missing < best_missing:
+            best_kit, best_missing = kit.copy(), missing
+        trajectory.append(best_missing)
+
+    return best_kit, best_missing, trajectory
+
+
+def optimize_kit(potions, effects, kit_size, index=None, exclude=(),
+                 n_restarts=10, n_steps=2000, time_limit=1.0, seed=None):
+    '''
+    Kit of kit_size potions covering as many desired effects as possible,
+    by simulated annealing with restarts (see anneal_kit)
+
+    Args:
+        potions (pd.DataFrame): Potion table
+        effects (list of str): Desired effects
+        kit_size (int): Number of potions in the kit
+        index (dict or None): Output of get_effect_index(potions)
+        exclude (iterable of str): Effects no kit potion may have
+        n_restarts (int): Maximum number of annealing runs
+        n_steps (int): Steps per run
+        time_limit (float): Seconds for all runs together
+        seed (int or None): Random seed
+
+    Returns:
+        (pd.DataFrame): Kit potions
+        (set): Desired effects the kit doesn't have
+        (list of int): Best number of missing effects after every step,
+            over all restarts
+    '''
+    effects = list(dict.fromkeys(effects))
+    rows, coverage = get_coverage_matrix(potions, effects, index, exclude)
+    if rows.shape[0] == 0:
+        return potions.iloc[[]][KIT_COLUMNS].copy(), set(effects), []
+
+    # Potions with the same coverage are interchangeable, keep the first
+    coverage, firsts = np.unique(coverage, axis=0, return_index=True)
+    rows = rows[firsts]
+
+    rng = np.random.default_rng(seed)
+    deadline = time.perf_counter() + time_limit
+    best_kit, best_missing = None, len(effects) + 1
+    trajectory = []
+    for _ in range(n_restarts):
+        kit, missing, run = anneal_kit(
+            coverage, kit_size, n_steps, rng=rng, deadline=deadline
+        )
+        trajectory += [min(score, best_missing) for score in run]
+        if missing < best_missing:
+            best_kit, best_missing = kit, missing
+        if best_missing == 0 or time.perf_counter() > deadline:
+            break
+
+    # Drop potions that add nothing to the rest of the kit
+    best_kit = list(np.unique(best_kit))
+    covered = coverage[best_kit].any(axis=0)
+    for ind in sorted(best_kit, key=lambda i: coverage[i].sum()):
+        others = [i for i in best_kit if i != ind]
+        if (coverage[others].any(axis=0) == covered).all():
+            best_kit = others
+
+    kit = potions.iloc[sorted(rows[best_kit])][KIT_COLUMNS].copy()
+    missing_fx = {effect for effect, is_in in zip(effects, covered)
+                  if not is_in}
+    return kit, missing_fx, trajectory
+
+
+def make_searched_kit(potions, effects, index=None, kit_size=5, **kwargs):
+    '''
+    make_kit-style wrapper of optimize_kit (kwargs are passed through)
+    '''
+    if len(effects) == 0:
+        return pd.DataFrame(columns=KIT_COLUMNS), pd.Series(), 'no-effects'
+    kit, _, _ = optimize_kit(potions, effects, kit_size, index, **kwargs)
+    return summarize_kit(kit, list(dict.fromkeys(effects)))
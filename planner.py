@@ -0,0 +1,319 @@
+'''
+Brewing plans for a limited ingredient inventory
+
+Usage:
+    python planner.py inventory.json [--effects "Resist Fire" ...]
+        [--skill 15] [--fortify-alchemy 0] [--perks alchemist ...]
+
+An inventory maps ingredient names to counts, e.g. a JSON object
+{"Blue Mountain Flower": 12, ...} or a CSV with a name and a count column.
+Names may leave out the form ID ('Deathbell' for 'Deathbell 000516c8').
+Every brew uses one of each of its ingredients.
+
+Without --effects, the plan maximizes the total gold value of the potions
+(see plan_for_value); with --effects, it's the smallest set of potions
+with all of them that the inventory can brew (see plan_for_effects).
+'''
+import re
+import json
+import argparse
+import warnings
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from alchemy import score_potions, make_character
+from kit_solver import (
+    KIT_COLUMNS, MAX_NODES, make_optimal_kit, summarize_kit
+)
+from util import get_effect_index
+from potion_cache import POTION_COLUMNS, load_potion_cache
+
+PLAN_COLUMNS = POTION_COLUMNS + ['Brews', 'Value', 'Total Value']
+
+
+def read_inventory(path):
+    '''
+    Read an inventory export
+
+    Args:
+        path (str or Path): JSON object (name -> count) or list of
+            {'name', 'count'} records, or a CSV whose first two columns
+            are the name and the count
+
+    Returns:
+        (dict): Ingredient name -> count
+    '''
+    path = Path(path)
+    if path.suffix.lower() == '.json':
+        with open(path) as json_file:
+            data = json.load(json_file)
+        if isinstance(data, list):
+            data = {row['name']: row['count'] for row in data}
+    else:
+        table = pd.read_csv(path)
+        data = dict(zip(table.iloc[:, 0], table.iloc[:, 1]))
+    return {str(name): int(count) for name, count in data.items()}
+
+
+def get_short_name(name):
+    # 'GleamblossomDG xx00b097' -> 'gleamblossom'
+    name = re.sub(r'\s+[0-9a-fx]{8}$', '', name.strip())
+    name = re.sub(r'(?<=[a-z])(DG|DB|HF)$', '', name)
+    return name.lower()
+
+
+def match_inventory(inventory, names):
+    '''
+    Map inventory names to ingredient names, with or without form IDs
+
+    Items that aren't ingredients are ignored with a warning.
+
+    Args:
+        inventory (dict): Name -> count
+        names (iterable of str): Ingredient names of the potion table
+
+    Returns:
+        (dict): Ingredient name -> count, for positive counts
+    '''
+    names = list(names)
+    full = set(names)
+    short = {get_short_name(name): name for name in names}
+    counts, unknown = {}, []
+    for name, count in inventory.items():
+        match = name if name in full else short.get(get_short_name(name))
+        if match is None:
+            unknown.append(name)
+        elif count > 0:
+            counts[match] = counts.get(match, 0) + count
+    if unknown:
+        warnings.warn(f'Not ingredients: {", ".join(unknown)}')
+    return counts
+
+
+def get_ingredient_codes(potions, names):
+    '''
+    (#potions, 3) positions of each potion's ingredients in names (-1 for
+    no ingredient, or one missing from names)
+    '''
+    codes = np.full((potions.index.shape[0], 3), -1, np.intp)
+    for k, column in enumerate(POTION_COLUMNS[:3]):
+        codes[:, k] = pd.Categorical(potions[column], categories=names).codes
+    return codes
+
+
+def get_brewable(potions, counts):
+    '''
+    (np.ndarray): bool, True for potions whose ingredients are all in the
+        inventory
+    '''
+    is_ok = np.ones(potions.index.shape[0], bool)
+    for column in POTION_COLUMNS[:3]:
+        ingredient = potions[column]
+        is_ok &= (ingredient.isna() | ingredient.isin(counts)).to_numpy()
+    return is_ok
+
+
+def brew_greedily(codes, stock, order, window_size=4096):
+    '''
+    Brew as many of each potion as the inventory allows, in order
+
+    Each brew uses up at least one ingredient, so there are at most
+    #ingredients brews, each found with one vectorized scan.
+
+    Args:
+        codes (np.ndarray): Ingredient positions of each potion (-1: none)
+        stock (np.ndarray): Count of each ingredient
+        order (np.ndarray): Potion positions, most wanted first
+        window_size (int): Number of potions checked at once
+
+    Returns:
+        (dict): Potion position -> number of brews
+        (np.ndarray): Count of each ingredient left over
+    '''
+    # Code -1 points at an extra, never-limiting count
+    remaining = np.append(stock, np.iinfo(np.int64).max)
+    codes = codes[order]
+    brews = {}
+    start = 0
+    while start < order.shape[0]:
+        # Next potion with all its ingredients in stock, scanning a window
+        # at a time
+        window = codes[start:start + window_size]
+        available = np.minimum(
+            np.minimum(remaining[window[:, 0]], remaining[window[:, 1]]),
+            remaining[window[:, 2]]
+        )
+        ahead = np.flatnonzero(available > 0)
+        if ahead.shape[0] == 0:
+            start += window_size
+            continue
+        start += ahead[0]
+        brews[int(order[start])] = int(available[ahead[0]])
+        used = codes[start][codes[start] >= 0]
+        remaining[used] -= available[ahead[0]]
+        start += 1
+    return brews, remaining[:-1]
+
+
+def plan_for_value(potions, values, inventory, n_rounds=10):
+    '''
+    Brewing plan maximizing the total gold value of an inventory
+
+    Greedy: potions are brewed as many times as possible in order of
+    decreasing value, then of value per priced ingredient over a few
+    rounds, raising the price of the ingredients each plan runs out of;
+    the best plan is kept. The upper bound gives each ingredient its best
+    share (value / #ingredients) of any potion, so the plan is within
+    bound - total of the optimum.
+
+    Args:
+        potions (pd.DataFrame): Potion table
+        values (array-like): Gold value of each potion (e.g. the Value
+            column of alchemy.score_potions)
+        inventory (dict): Ingredient name -> count (see match_inventory)
+        n_rounds (int): Number of priced greedy rounds
+
+    Returns:
+        (pd.DataFrame): PLAN_COLUMNS, one row per brewed potion
+        (dict): Ingredient name -> count left over
+        (float): Upper bound on the total value of any plan
+    '''
+    counts = match_inventory(inventory, pd.unique(
+        potions[POTION_COLUMNS[:3]].stack().dropna()
+    ))
+    names = sorted(counts)
+    values = np.asarray(values, float)
+    candidates = np.flatnonzero(get_brewable(potions, counts) & (values > 0))
+    codes = get_ingredient_codes(potions.iloc[candidates], names)
+    values = values[candidates]
+    n_used = (codes >= 0).sum(axis=1)
+    stock = np.array([counts[name] for name in names], np.int64)
+
+    # Upper bound from each ingredient's best share of a potion
+    share = values / n_used
+    best_share = np.zeros(len(names))
+    for k in range(3):
+        has = codes[:, k] >= 0
+        np.maximum.at(best_share, codes[has, k], share[has])
+    bound = float((best_share * stock).sum())
+
+    # Greedy by value, then by value per priced ingredient: prices start
+    # equal and go up for ingredients a plan used up, down for the others
+    price = np.ones(len(names) + 1)
+    price[-1] = 0  # code -1
+    best_brews, best_total = {}, -1
+    for round_ in range(n_rounds + 1):
+        if round_ == 0:
+            order = np.argsort(-values, kind='stable')
+        else:
+            order = np.argsort(
+                -values / price[codes].sum(axis=1), kind='stable'
+            )
+        brews, remaining = brew_greedily(codes, stock, order)
+        total = sum(values[p] * n for p, n in brews.items())
+        if total > best_total:
+            best_brews, best_total, leftover = brews, total, remaining
+        if round_ > 0:
+            price[:-1] *= np.where(remaining == 0, 1.3, 0.9)
+
+    # Plan table, most valuable brews first
+    rows = np.array(sorted(best_brews), int)
+    plan = potions.iloc[candidates[rows]][POTION_COLUMNS].copy()
+    plan['Brews'] = [best_brews[p] for p in rows]
+    plan['Value'] = values[rows].astype(int)
+    plan['Total Value'] = plan['Brews'] * plan['Value']
+    plan = plan.sort_values('Total Value', ascending=False, kind='stable')
+    leftover = {
+        name: int(count) for name, count in zip(names, leftover) if count
+    }
+    return plan, leftover, bound
+
+
+def plan_for_effects(potions, effects, inventory, max_nodes=MAX_NODES):
+    '''
+    Smallest set of potions with all the effects that an inventory can brew
+
+    Solves the set cover over the brewable potions exactly (see
+    kit_solver.make_optimal_kit). If the kit needs more of an ingredient
+    than the inventory has, falls back to a greedy cover that takes the
+    potion adding the most missing effects, among those still brewable.
+
+    Args:
+        potions (pd.DataFrame): Potion table
+        effects (list of str): Desired effects
+        inventory (dict): Ingredient name -> count (see match_inventory)
+        max_nodes (int or None): Search budget of the exact solver
+
+    Returns:
+        Same as kit_solver.make_optimal_kit; a greedy kit is never
+        proven to be the smallest
+    '''
+    counts = match_inventory(inventory, pd.unique(
+        potions[POTION_COLUMNS[:3]].stack().dropna()
+    ))
+    brewable = potions[get_brewable(potions, counts)]
+    kit, fx, status, proven = make_optimal_kit(
+        brewable, effects, max_nodes=max_nodes
+    )
+
+    # Check the kit against the counts
+    used = kit[POTION_COLUMNS[:3]].stack().value_counts()
+    if all(counts[name] >= n for name, n in used.items()):
+        return kit, fx, status, proven
+
+    # Greedy cover, one brew per potion
+    effects = list(dict.fromkeys(effects))
+    index = get_effect_index(brewable)
+    coverage = np.zeros((brewable.index.shape[0], len(effects)), bool)
+    for k, effect in enumerate(effects):
+        coverage[index.get(effect, []), k] = True
+    names = sorted(counts)
+    codes = get_ingredient_codes(brewable, names)
+    remaining = np.array([counts[name] for name in names], np.int64)
+    missing = np.ones(len(effects), bool)
+    rows = []
+    while missing.any():
+        available = np.all((codes < 0) | (remaining[codes] > 0), axis=1)
+        gains = np.where(available, (coverage & missing).sum(axis=1), 0)
+        best = int(gains.argmax())
+        if gains[best] == 0:
+            break
+        rows.append(best)
+        missing &= ~coverage[best]
+        remaining[codes[best][codes[best] >= 0]] -= 1
+
+    kit = brewable.iloc[sorted(rows)][KIT_COLUMNS].copy()
+    return summarize_kit(kit, effects) + (False,)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('inventory')
+    parser.add_argument('--effects', nargs='+', default=None)
+    parser.add_argument('--cache', default='cache/all_potions')
+    parser.add_argument('--skill', type=float, default=15)
+    parser.add_argument('--fortify-alchemy', type=float, default=0)
+    parser.add_argument('--perks', nargs='*', default=[],
+                        choices=['alchemist', 'physician', 'benefactor',
+                                 'poisoner'])
+    args = parser.parse_args()
+
+    potions, _ = load_potion_cache(args.cache)
+    inventory = read_inventory(args.inventory)
+    if args.effects:
+        kit, _, status, proven = plan_for_effects(
+            potions, args.effects, inventory
+        )
+        print(f'Kit: {status}' + ('' if proven else ' (not proven smallest)'))
+        print(kit.to_string(index=False))
+    else:
+        character = make_character(
+            args.skill, args.fortify_alchemy, args.perks
+        )
+        values = score_potions(potions, **character)['Value']
+        plan, leftover, bound = plan_for_value(potions, values, inventory)
+        print(plan.to_string(index=False))
+        print(f'Total value: {plan["Total Value"].sum()} '
+              f'(upper bound {bound:.0f})')
+        print(f'Left over: {leftover}')
@@ -0,0 +1,252 @@
+'''
+Columnar, memory-mappable potion cache
+
+Usage:
+    python potion_cache.py [cache]
+
+Converts <cache>/all_potions.csv, <cache>/garden_potions.csv and
+<cache>/all_fx.pkl into one directory per potion table, e.g.
+<cache>/all_potions/, holding:
+    - ingredients.npy: (#potions, 3) int16 ingredient codes (-1 = none;
+      int32 beyond 32767 ingredients)
+    - effects.npy: (#potions, #words) uint64 effect bitmasks
+    - strings.json: ingredient names and effect names (bit order), once
+    - connectivity.npz: effect co-occurrence and ingredient-sharing
+      graphs (see connectivity.py)
+
+The .npy files are opened with mmap_mode='r', so loading is near-instant
+and every process serving the app shares the same pages.
+'''
+import sys
+import json
+import pickle
+import graphlib
+import warnings
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from connectivity import get_connectivity, write_connectivity
+
+POTION_COLUMNS = ['Ingredient 1', 'Ingredient 2', 'Ingredient 3', 'Effects']
+
+
+def get_effect_order(potions):
+    '''
+    Effect order consistent with every Effects string of the table
+
+    The Effects strings are joined in ing_space column order, so ordering
+    the bits the same way lets them round-trip exactly. Falls back to
+    alphabetical order if the strings disagree with each other.
+    '''
+    sorter = graphlib.TopologicalSorter()
+    for effects in potions['Effects'].unique():
+        effects = effects.split(', ')
+        for effect in effects:
+            sorter.add(effect)
+        for first, second in zip(effects, effects[1:]):
+            sorter.add(second, first)
+    try:
+        return list(sorter.static_order())
+    except graphlib.CycleError:
+        warnings.warn('Inconsistent effect order, sorting alphabetically')
+        effects = set()
+        for fx in potions['Effects'].unique():
+            effects.update(fx.split(', '))
+        return sorted(effects)
+
+
+def get_ingredient_order(potions):
+    '''
+    Ingredient order of the ingredient-space a table was built from
+
+    Rows are in loop order, so each row's ingredients are in space order,
+    and so are the ingredients at which consecutive rows first differ.
+    Any order consistent with these pairs enumerates the same table.
+    '''
+    names = potions[POTION_COLUMNS[:3]].to_numpy(object)
+    before, after = names[:-1], names[1:]
+    first = (before != after).argmax(axis=1)
+    rows = np.arange(first.shape[0])
+    pairs = pd.DataFrame(np.concatenate([
+        names[:, :2], names[:, 1:],
+        np.stack([before[rows, first], after[rows, first]], axis=1)
+    ])).dropna().drop_duplicates()
+
+    sorter = graphlib.TopologicalSorter()
+    for name in pd.unique(pd.Series(names.ravel()).dropna()):
+        sorter.add(name)
+    for first, second in pairs.itertuples(index=False):
+        sorter.add(second, first)
+    return list(sorter.static_order())
+
+
+def encode_potions(potions, effects=None, ingredient_names=None):
+    '''
+    Convert a potion DataFrame to integer codes and effect bitmasks
+
+    Args:
+        potions (pd.DataFrame): Potion table (find_ALL_potions format)
+        effects (list of str or None): Bit order; inferred if None
+        ingredient_names (list of str or None): Code order; defaults to
+            the sorted names used by the table. Pass the same list to
+            encode batches of one table separately.
+
+    Returns:
+        (dict): Arrays 'ingredients' and 'effects', and the string
+            dictionaries 'ingredient_names' and 'effect_names'
+    '''
+    if effects is None:
+        effects = get_effect_order(potions)
+    bits = {effect: k for k, effect in enumerate(effects)}
+    n_words = max(1, -(-len(effects) // 64))
+
+    # Ingredient codes
+    if ingredient_names is None:
+        names = pd.unique(
+            potions[POTION_COLUMNS[:3]].stack().dropna().values.ravel()
+        )
+        names = sorted(names)
+    else:
+        names = list(ingredient_names)
+    dtype = np.int16 if len(names) < 2**15 else np.int32
+    codes = np.full((potions.index.shape[0], 3), -1, dtype)
+    for k, column in enumerate(POTION_COLUMNS[:3]):
+        code = pd.Categorical(potions[column], categories=names).codes
+        codes[:, k] = code
+
+    # Effect bitmasks, computed once per distinct Effects string
+    uniques, inverse = np.unique(
+        potions['Effects'].values.astype(str), return_inverse=True
+    )
+    unique_masks = np.zeros((uniques.shape[0], n_words), np.uint64)
+    for n, fx in enumerate(uniques):
+        for effect in fx.split(', '):
+            word, bit = divmod(bits[effect], 64)
+            unique_masks[n, word] |= np.uint64(1 << bit)
+    masks = unique_masks[inverse.ravel()]
+
+    return {
+        'ingredients': codes,
+        'effects': masks,
+        'ingredient_names': names,
+        'effect_names': list(effects),
+    }
+
+
+def decode_effects(masks, effect_names):
+    '''
+    Effects strings of a bitmask array, in bit order
+    '''
+    n_words = masks.shape[1]
+    uniques, inverse = np.unique(
+        np.ascontiguousarray(masks).view(np.dtype((np.void, 8 * n_words))),
+        return_inverse=True
+    )
+    uniques = uniques.view(np.uint64).reshape(-1, n_words)
+
+    # Unpack to (#uniques, #effects) booleans, bit k of word k // 64
+    has_fx = np.unpackbits(
+        uniques.astype('<u8').view(np.uint8), axis=1, bitorder='little'
+    )[:, :len(effect_names)].astype(bool)
+    effect_names = np.array(effect_names, object)
+    strings = [', '.join(effect_names[row]) for row in has_fx]
+    return np.array(strings, object)[inverse.ravel()]
+
+
+def write_potion_cache(potions, path, all_fx=None, effects=None):
+    '''
+    Write a potion table in the columnar format (see module docstring)
+    '''
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    encoded = encode_potions(potions, effects)
+    np.save(path / 'ingredients.npy', encoded['ingredients'])
+    np.save(path / 'effects.npy', encoded['effects'])
+    write_potion_strings(encoded, path, all_fx)
+
+
+def write_potion_strings(arrays, path, all_fx=None):
+    '''
+    Write strings.json and connectivity.npz next to the .npy files of a
+    columnar cache (see write_potion_cache)
+
+    Args:
+        arrays (dict): Output of encode_potions, or the same arrays
+            memory-mapped from path
+        path (str or Path): Cache directory
+        all_fx (set or None): Stored with the table if given
+    '''
+    path = Path(path)
+    strings = {
+        'ingredient_names': list(arrays['ingredient_names']),
+        'effect_names': list(arrays['effect_names']),
+    }
+    if all_fx is not None:
+        strings['all_fx'] = sorted(all_fx)
+    with open(path / 'strings.json', 'w') as json_file:
+        json.dump(strings, json_file, indent=1)
+    write_connectivity(get_connectivity(arrays), path)
+
+
+def load_potion_arrays(path):
+    '''
+    Memory-map a columnar potion cache
+
+    Returns:
+        (dict): Read-only 'ingredients' and 'effects' arrays, plus the
+            string dictionaries from strings.json
+    '''
+    path = Path(path)
+    with open(path / 'strings.json') as json_file:
+        arrays = json.load(json_file)
+    arrays['ingredients'] = np.load(path / 'ingredients.npy', mmap_mode='r')
+    arrays['effects'] = np.load(path / 'effects.npy', mmap_mode='r')
+    return arrays
+
+
+def load_potion_cache(path):
+    '''
+    Load a columnar potion cache as the DataFrame the apps use
+
+    Returns:
+        (pd.DataFrame): Same columns and rows as the CSV cache
+        (set or None): all_fx, if it was stored with the table
+    '''
+    arrays = load_potion_arrays(path)
+    names = np.append(
+        np.array(arrays['ingredient_names'], object), None
+    )  # code -1 -> None
+    codes = arrays['ingredients']
+    potions = pd.DataFrame({
+        'Ingredient 1': names[codes[:, 0]],
+        'Ingredient 2': names[codes[:, 1]],
+        'Ingredient 3': names[codes[:, 2]],
+        'Effects': decode_effects(arrays['effects'], arrays['effect_names'])
+    })
+    all_fx = arrays.get('all_fx')
+    return potions, (set(all_fx) if all_fx is not None else None)
+
+
+def convert_cache(cache_path):
+    '''
+    Convert the CSV / pickle caches in cache_path to the columnar format
+    '''
+    cache_path = Path(cache_path)
+    with open(cache_path / 'all_fx.pkl', 'rb') as pickle_file:
+        all_fx = pickle.load(pickle_file)
+
+    for name in ['all_potions', 'garden_potions']:
+        potions = pd.read_csv(cache_path / f'{name}.csv', index_col=0)
+        write_potion_cache(potions, cache_path / name, all_fx)
+
+        # Make sure the round trip is exact
+        loaded, _ = load_potion_cache(cache_path / name)
+        if loaded.to_csv() != potions.to_csv():
+            warnings.warn(f'{name} does not round-trip exactly')
+        print(f'Converted {potions.index.shape[0]} potions to '
+              f'{cache_path / name}')
+
+
+if __name__ == '__main__':
+    convert_cache(sys.argv[1] if len(sys.argv) > 1 else 'cache')
@@ -0,0 +1,508 @@
+import numpy as np
+import pandas as pd
+
+
+def get_fx_masks(ing_space):
+    '''
+    Encode each ingredient's effects as an integer bitmask
+
+    Bit k of an ingredient's mask is set when the ingredient has the k-th
+    effect (column) of ing_space, so combining ingredients becomes plain
+    integer set algebra.
+
+    Args:
+        ing_space (pd.DataFrame): Output of get_ing_space
+
+    Returns:
+        (list of int): One bitmask per ingredient, in ing_space row order
+    '''
+    # Bit k of byte k // 8 is column k, so the bytes read as a
+    # little-endian integer are the mask
+    packed = np.packbits(
+        ing_space.to_numpy() > 0, axis=1, bitorder='little'
+    )
+    return [int.from_bytes(row.tobytes(), 'little') for row in packed]
+
+
+def get_fx_mask(ing_space, effects):
+    '''
+    Bitmask of a list of effects over the columns of ing_space
+    '''
+    columns = list(ing_space.columns)
+    mask = 0
+    for effect in effects:
+        mask |= 1 << columns.index(effect)
+    return mask
+
+
+class EffectNames:
+    '''
+    Memoized bitmask -> "Effect A, Effect B" conversion
+
+    Effects are joined in ing_space column order, exactly like
+    ', '.join(combo[combo > 1].index) in the pandas implementation.
+    '''
+
+    def __init__(self, effects):
+        self.effects = list(effects)
+        self.names = {}
+
+    def __call__(self, mask):
+        name = self.names.get(mask)
+        if name is None:
+            name = ', '.join(
+                effect for k, effect in enumerate(self.effects)
+                if mask >> k & 1
+            )
+            self.names[mask] = name
+        return name
+
+
+def get_pair_masks(masks):
+    '''
+    Effects shared by every pair of ingredients (a & b), as a nested list
+    '''
+    return [[mask_a & mask_b for mask_b in masks] for mask_a in masks]
+
+
+def find_potions_bitmask(ing_space, effects=[]):
+    '''
+    Bitmask equivalent of util.find_potions
+
+    Args:
+        ing_space (pd.DataFrame): Output of get_ing_space
+        effects (list of str): Effects every potion must have
+
+    Returns:
+        (pd.DataFrame): Same rows, order and columns as util.find_potions
+    '''
+    # Initialize
+    potions = []
+    names = list(ing_space.index)
+    num_ing = len(names)
+    pairs = get_pair_masks(get_fx_masks(ing_space))
+    wanted = get_fx_mask(ing_space, effects)
+    to_str = EffectNames(ing_space.columns)
+
+    # Search all 3-combinations
+    for n in range(num_ing):
+        pairs_n = pairs[n]
+        for m in range(n+1, num_ing):
+            pairs_m = pairs[m]
+            fx_2 = pairs_n[m]
+            if fx_2 & wanted == wanted:
+                potions.append({
+                    'Ingredient 1': names[n],
+                    'Ingredient 2': names[m],
+                    'Ingredient 3': None,
+                    'Effects': to_str(fx_2)
+                })
+            for j in range(m+1, num_ing):
+                # Effects present in at least 2 of the 3 ingredients
+                fx_3 = fx_2 | pairs_n[j] | pairs_m[j]
+                if fx_3 & wanted == wanted:
+                    potions.append({
+                        'Ingredient 1': names[n],
+                        'Ingredient 2': names[m],
+                        'Ingredient 3': names[j],
+                        'Effects': to_str(fx_3)
+                    })
+    return pd.DataFrame(potions)
+
+
+def find_ALL_potions_bitmask(ing_space):
+    '''
+    Bitmask equivalent of util.find_ALL_potions
+
+    A 3-ingredient potion is kept only if no ingredient is dead, i.e. its
+    effects differ from those of each of the 3 sub-pairs.
+
+    Args:
+        ing_space (pd.DataFrame): Output of get_ing_space
+
+    Returns:
+        (pd.DataFrame): Same rows, order and columns as
+            util.find_ALL_potions
+    '''
+    # Initialize
+    potions = []
+    names = list(ing_space.index)
+    num_ing = len(names)
+    pairs = get_pair_masks(get_fx_masks(ing_space))
+    to_str = EffectNames(ing_space.columns)
+
+    # Search all 3-combinations
+    for n in range(num_ing):
+        pairs_n = pairs[n]
+        for m in range(n+1, num_ing):
+            pairs_m = pairs[m]
+
+            # Combination of first 2
+            fx_12 = pairs_n[m]
+            if fx_12:
+                potions.append({
+                    'Ingredient 1': names[n],
+                    'Ingredient 2': names[m],
+                    'Ingredient 3': None,
+                    'Effects': to_str(fx_12)
+                })
+
+            for j in range(m+1, num_ing):
+                fx_13 = pairs_n[j]
+                fx_23 = pairs_m[j]
+                fx_123 = fx_12 | fx_13 | fx_23
+
+                # Save 3-ingredient potion if no ingredient is dead
+                if (
+                    fx_123
+                    and fx_123 != fx_12  # Make sure 3rd isn't dead
+                    and fx_123 != fx_23  # Make sure 1st isn't dead
+                    and fx_123 != fx_13  # Make sure 2nd isn't dead
+                ):
+                    potions.append({
+                        'Ingredient 1': names[n],
+                        'Ingredient 2': names[m],
+                        'Ingredient 3': names[j],
+                        'Effects': to_str(fx_123)
+                    })
+
+    return pd.DataFrame(potions)
+
+
+def get_fx_matrix(ing_space):
+    '''
+    Ingredient-space as a dense (ingredients x effects) boolean array
+    '''
+    return ing_space.values > 0
+
+
+def iter_pair_chunks(num_ing, n, chunk_size):
+    '''
+    Yield (m, j) index arrays of all pairs n < m < j, in loop order
+
+    Each chunk covers whole rows of m and holds at most chunk_size pairs,
+    unless a single m alone has more than chunk_size partners.
+    '''
+    m = n + 1
+    while m < num_ing - 1:
+        # Grow the block of m's until the chunk is full
+        counts = num_ing - 1 - np.arange(m, num_ing - 1)
+        n_rows = np.searchsorted(np.cumsum(counts), chunk_size, 'right')
+        n_rows = max(1, n_rows)
+        ms = np.arange(m, m + n_rows)
+        counts = counts[:n_rows]
+
+        # Expand to one entry per (m, j) pair
+        m_arr = np.repeat(ms, counts)
+        starts = np.repeat(np.cumsum(counts) - counts, counts)
+        j_arr = np.arange(m_arr.shape[0]) - starts + m_arr + 1
+        yield m_arr, j_arr
+
+        m += n_rows
+
+
+def iter_batch_potions(ing_space, effects=None, chunk_size=2**16, ns=None):
+    '''
+    Generator behind batch_potions: yields its output chunk by chunk
+
+    For each first ingredient n, the (m, j) pairs are evaluated in chunks
+    with broadcasting over the effect axis; each chunk also holds the
+    2-ingredient potions (n, m) of its m's, so the chunks come out in loop
+    order and concatenate to batch_potions(...).
+
+    Args:
+        ing_space (pd.DataFrame): Output of get_ing_space
+        effects (list of str or None): If None, find all potions with no
+            dead ingredients (find_ALL_potions rules). Otherwise, find
+            potions with all of the effects (find_potions rules).
+        chunk_size (int): Max number of combinations evaluated at once,
+            which bounds peak memory to ~chunk_size x #effects bytes
+        ns (iterable of int or None): Only search combinations whose first
+            ingredient is one of these (row positions). Defaults to all.
+
+    Yields:
+        (np.ndarray): n, m, j indices of each potion (j = -1 for
+            2-ingredient potions), in loop order
+        (np.ndarray): Boolean effect rows of each potion
+    '''
+    # Initialize
+    fx = get_fx_matrix(ing_space)
+    num_ing = fx.shape[0]
+    find_all = effects is None
+    if not find_all:
+        wanted = ing_space.columns.get_indexer(effects)
+        if (wanted < 0).any():
+            raise KeyError(f'Unknown effects: {effects}')
+
+    def keep(combo):
+        if find_all:
+            return combo.any(axis=1)
+        return combo[:, wanted].all(axis=1)
+
+    if ns is None:
+        ns = range(num_ing - 1)
+
+    for n in ns:
+        fx_n = fx[n]
+
+        # All 2-combinations starting with n, handed out with their m's
+        ms = np.arange(n + 1, num_ing)
+        combo12 = fx_n & fx[ms]
+        is_ok = keep(combo12)
+        pair_inds = np.stack([
+            np.full(is_ok.sum(), n), ms[is_ok], np.full(is_ok.sum(), -1)
+        ], axis=1)
+        pair_combos = combo12[is_ok]
+        done = 0
+
+        # All 3-combinations starting with n
+        for m_arr, j_arr in iter_pair_chunks(num_ing, n, chunk_size):
+            combo12 = fx_n & fx[m_arr]
+            combo13 = fx_n & fx[j_arr]
+            combo23 = fx[m_arr] & fx[j_arr]
+            combo123 = combo12 | combo13 | combo23
+            is_ok = keep(combo123)
+            if find_all:
+                # Make sure no ingredient is dead
+                is_ok &= (combo123 != combo12).any(axis=1)
+                is_ok &= (combo123 != combo23).any(axis=1)
+                is_ok &= (combo123 != combo13).any(axis=1)
+            inds = np.stack([
+                np.full(is_ok.sum(), n), m_arr[is_ok], j_arr[is_ok]
+            ], axis=1)
+            combos = combo123[is_ok]
+
+            # Loop order: each pair goes before the triples of its m
+            stop = np.searchsorted(pair_inds[:, 1], m_arr[-1], 'right')
+            at = np.searchsorted(inds[:, 1], pair_inds[done:stop, 1])
+            inds = np.insert(inds, at, pair_inds[done:stop], axis=0)
+            combos = np.insert(combos, at, pair_combos[done:stop], axis=0)
+            done = stop
+            yield inds, combos
+
+        # The last m has a pair but no triples
+        if done < pair_inds.shape[0]:
+            yield pair_inds[done:], pair_combos[done:]
+
+
+def batch_potions(ing_space, effects=None, chunk_size=2**16, ns=None):
+    '''
+    NumPy batch kernel behind find_potions_batch and find_ALL_potions_batch
+
+    Concatenates the chunks of iter_batch_potions (same arguments).
+
+    Returns:
+        (np.ndarray): n, m, j indices of each potion (j = -1 for
+            2-ingredient potions), sorted in loop order
+        (np.ndarray): Boolean effect rows of each potion
+    '''
+    inds, combos = [], []
+    for chunk_inds, chunk_combos in iter_batch_potions(
+        ing_space, effects, chunk_size, ns
+    ):
+        inds.append(chunk_inds)
+        combos.append(chunk_combos)
+
+    if len(inds) == 0:
+        n_fx = ing_space.columns.shape[0]
+        return np.zeros((0, 3), int), np.zeros((0, n_fx), bool)
+    return np.concatenate(inds), np.concatenate(combos)
+
+
+def batch_to_frame(ing_space, inds, combos):
+    '''
+    Convert batch_potions output to the usual potion DataFrame
+    '''
+    if inds.shape[0] == 0:
+        return pd.DataFrame([])
+
+    # Name each distinct effect combination only once
+    packed = np.packbits(combos, axis=1)
+    keys = packed.view(np.dtype((np.void, packed.shape[1]))).ravel()
+    _, firsts, codes = np.unique(
+        keys, return_index=True, return_inverse=True
+    )
+    columns = np.asarray(ing_space.columns)
+    fx_names = np.array(
+        [', '.join(columns[combos[ind]]) for ind in firsts], object
+    )
+
+    names = np.asarray(ing_space.index, dtype=object)
+    names_3 = np.append(names, None)  # index -1 -> None
+    return pd.DataFrame({
+        'Ingredient 1': names[inds[:, 0]],
+        'Ingredient 2': names[inds[:, 1]],
+        'Ingredient 3': names_3[inds[:, 2]],
+        'Effects': fx_names[codes.ravel()]
+    })
+
+
+def iter_potion_batches(ing_space, effects=None, batch_size=2**16,
+                        chunk_size=2**16, ns=None):
+    '''
+    Stream a potion table as DataFrames of batch_size rows
+
+    Only one batch (plus one kernel chunk) is in memory at a time, so the
+    batches can be written to disk or filtered as they come, and the
+    search stops as soon as the caller stops iterating.
+
+    Args:
+        ing_space (pd.DataFrame): Output of get_ing_space
+        effects (list of str or None): None for find_ALL_potions rules,
+            else the effects every potion must have (find_potions rules)
+        batch_size (int): Rows per batch (the last one may be shorter)
+        chunk_size (int): Passed to iter_batch_potions
+        ns (iterable of int or None): Passed to iter_batch_potions
+
+    Yields:
+        (pd.DataFrame): Ingredient 1-3 and Effects, in find_ALL_potions /
+            find_potions order, with a running index
+    '''
+    chunks = iter_batch_potions(ing_space, effects, chunk_size, ns)
+    inds, combos, n_rows, start = [], [], 0, 0
+    for chunk_inds, chunk_combos in chunks:
+        inds.append(chunk_inds)
+        combos.append(chunk_combos)
+        n_rows += chunk_inds.shape[0]
+        if n_rows < batch_size:
+            continue
+
+        # Cut as many full batches as the buffer holds
+        all_inds, all_combos = np.concatenate(inds), np.concatenate(combos)
+        n_full = n_rows // batch_size * batch_size
+        for k in range(0, n_full, batch_size):
+            batch = batch_to_frame(
+                ing_space, all_inds[k:k + batch_size],
+                all_combos[k:k + batch_size]
+            )
+            batch.index += start
+            start += batch_size
+            yield batch
+        inds, combos = [all_inds[n_full:]], [all_combos[n_full:]]
+        n_rows -= n_full
+
+    if n_rows > 0:
+        batch = batch_to_frame(
+            ing_space, np.concatenate(inds), np.concatenate(combos)
+        )
+        batch.index += start
+        yield batch
+
+
+def iter_potions(ing_space, effects=None, chunk_size=2**16):
+    '''
+    Stream potions one at a time, as (Ingredient 1, Ingredient 2,
+    Ingredient 3, Effects) tuples (see iter_potion_batches)
+
+    E.g. the first 10 potions with an effect, without searching further:
+    itertools.islice(iter_potions(ing_space, ['Paralysis']), 10)
+    '''
+    for batch in iter_potion_batches(
+        ing_space, effects, batch_size=1024, chunk_size=chunk_size
+    ):
+        yield from batch.itertuples(index=False, name=None)
+
+
+def find_potions_batch(ing_space, effects=[], chunk_size=2**16):
+    '''
+    NumPy batch equivalent of util.find_potions (see batch_potions)
+    '''
+    inds, combos = batch_potions(ing_space, list(effects), chunk_size)
+    return batch_to_frame(ing_space, inds, combos)
+
+
+def find_ALL_potions_batch(ing_space, chunk_size=2**16):
+    '''
+    NumPy batch equivalent of util.find_ALL_potions (see batch_potions)
+    '''
+    inds, combos = batch_potions(ing_space, None, chunk_size)
+    return batch_to_frame(ing_space, inds, combos)
+
+
+# From this many ingredients on, enumerate in memory-bounded chunks
+CHUNKED_MIN_INGREDIENTS = 150
+
+
+def find_potions_auto(ing_space, effects=[], chunk_size=2**16):
+    '''
+    util.find_potions with the engine suited to the number of ingredients
+
+    The bitmask loops are faster on small ingredient-spaces; from
+    CHUNKED_MIN_INGREDIENTS on, the chunked batch kernel keeps the working
+    memory bounded (see batch_potions). Both give the same table.
+    '''
+    if ing_space.index.shape[0] < CHUNKED_MIN_INGREDIENTS:
+        return find_potions_bitmask(ing_space, effects)
+    return find_potions_batch(ing_space, effects, chunk_size)
+
+
+def find_ALL_potions_auto(ing_space, chunk_size=2**16):
+    '''
+    util.find_ALL_potions with the engine suited to the number of
+    ingredients (see find_potions_auto)
+    '''
+    if ing_space.index.shape[0] < CHUNKED_MIN_INGREDIENTS:
+        return find_ALL_potions_bitmask(ing_space)
+    return find_ALL_potions_batch(ing_space, chunk_size)
+
+
+def find_ALL_potions_touching(ing_space, touched):
+    '''
+    Rows of find_ALL_potions(ing_space) that use any touched ingredient
+
+    Each combination is generated once, from its first touched ingredient,
+    so the cost is ~#touched x #ingredients^2 instead of #ingredients^3.
+
+    Args:
+        ing_space (pd.DataFrame): Output of get_ing_space
+        touched (iterable of str): Ingredient names
+
+    Returns:
+        (pd.DataFrame): Potions in find_ALL_potions order
+    '''
+    # Initialize
+    potions = []
+    names = list(ing_space.index)
+    num_ing = len(names)
+    positions = {name: n for n, name in enumerate(names)}
+    touched = sorted(positions[name] for name in set(touched))
+    is_touched = [False] * num_ing
+    pairs = get_pair_masks(get_fx_masks(ing_space))
+    to_str = EffectNames(ing_space.columns)
+
+    for t in touched:
+        # Combinations whose first touched ingredient is t
+        others = [
+            x for x in range(num_ing)
+            if x != t and not (is_touched[x] and x < t)
+        ]
+        is_touched[t] = True
+
+        for k, x in enumerate(others):
+            n, m = sorted((t, x))
+            if pairs[n][m]:
+                potions.append((n, m, -1, pairs[n][m]))
+
+            for y in others[k+1:]:
+                n, m, j = sorted((t, x, y))
+                fx_12 = pairs[n][m]
+                fx_13 = pairs[n][j]
+                fx_23 = pairs[m][j]
+                fx_123 = fx_12 | fx_13 | fx_23
+                if (
+                    fx_123
+                    and fx_123 != fx_12  # Make sure 3rd isn't dead
+                    and fx_123 != fx_23  # Make sure 1st isn't dead
+                    and fx_123 != fx_13  # Make sure 2nd isn't dead
+                ):
+                    potions.append((n, m, j, fx_123))
+
+    potions.sort(key=lambda row: row[:3])
+    return pd.DataFrame({
+        'Ingredient 1': [names[row[0]] for row in potions],
+        'Ingredient 2': [names[row[1]] for row in potions],
+        'Ingredient 3': [
+            names[row[2]] if row[2] >= 0 else None for row in potions
+        ],
+        'Effects': [to_str(row[3]) for row in potions],
+    })
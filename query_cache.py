@@ -0,0 +1,431 @@
+'''
+Memoized potion / ingredient / kit queries for the Dash callbacks
+
+Results are keyed on the normalized query (kind, subset, sorted effects,
+logic...) and kept in a bounded LRU cache, evicting the least recently
+used entries beyond max_entries or max_bytes, or older than ttl seconds.
+
+Two backends are available:
+    - MemoryBackend: per process (default)
+    - SQLiteBackend: a local SQLite file, shared by every worker process
+      on the host (e.g. gunicorn workers)
+Pick one with the SKYRIM_QUERY_CACHE environment variable ('memory' or
+'sqlite', with SKYRIM_QUERY_CACHE_PATH for the file), or set_backend.
+The SQLite file defaults to a private per-user folder (see
+default_cache_path): its values are unpickled, so other users must not be
+able to write it.
+
+Keys include a fingerprint of the data files, so results computed from
+stale data are never returned (see registry.get_version).
+'''
+import os
+import time
+import stat
+import pickle
+import sqlite3
+import threading
+import pandas as pd
+from collections import OrderedDict
+
+import registry
+from alchemy import score_arrays, find_top_potions
+from util import filter_by_effect, query_effect_index
+from kit_solver import make_optimal_kit
+
+
+class MemoryBackend:
+    '''
+    In-process LRU store bounded by entries, bytes and age
+
+    Args:
+        max_entries (int): Maximum number of cached results
+        max_bytes (int): Maximum total size of the cached results
+        ttl (float or None): Seconds before an entry expires
+    '''
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 2**20, ttl=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (value, size, created)
+        self.n_bytes = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        '''
+        (bool, object): Whether key was found, and its value
+        '''
+        with self.lock:
+            if key not in self.entries:
+                return False, None
+            value, size, created = self.entries[key]
+            if self.ttl is not None and time.time() - created > self.ttl:
+                del self.entries[key]
+                self.n_bytes -= size
+                return False, None
+            self.entries.move_to_end(key)
+            return True, value
+
+    def put(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.n_bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size, time.time())
+            self.n_bytes += size
+
+            # Evict least recently used
+            while (
+                len(self.entries) > self.max_entries
+                or self.n_bytes > self.max_bytes
+            ):
+                _, (_, old_size, _) = self.entries.popitem(last=False)
+                self.n_bytes -= old_size
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.n_bytes = 0
+
+    def stats(self):
+        return {
+            'evictions': self.evictions,
+            'entries': len(self.entries),
+            'bytes': self.n_bytes,
+        }
+
+
+def check_private(path):
+    '''
+    Refuse a folder or file that another user owns or can write to
+
+    Raises:
+        PermissionError: If path isn't private to the current user
+    '''
+    if not hasattr(os, 'getuid') or not os.path.exists(path):
+        return
+    info = os.stat(path)
+    if info.st_uid != os.getuid() or \
+            info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise PermissionError(
+            f'{path} is not private to the current user, refusing to '
+            'load query cache entries from it'
+        )
+
+
+def default_cache_path():
+    '''
+    (str): <XDG cache home>/skyrim_alchemy/query_cache.sqlite, creating
+        the folder with mode 0700
+    '''
+    root = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+    folder = os.path.join(root, 'skyrim_alchemy')
+    os.makedirs(folder, mode=0o700, exist_ok=True)
+    return os.path.join(folder, 'query_cache.sqlite')
+
+
+class SQLiteBackend:
+    '''
+    LRU store in a local SQLite file, shared by processes on the host
+
+    Values are pickled, so the file and its folder must be private to the
+    user running the app (see check_private). Every process opens its own
+    connection; WAL mode lets readers proceed while another worker writes.
+
+    Args:
+        path (str or Path): Database file
+        max_entries (int): Maximum number of cached results
+        max_bytes (int): Maximum total size of the pickled results
+        ttl (float or None): Seconds before an entry expires
+    '''
+
+    def __init__(self, path, max_entries=4096, max_bytes=256 * 2**20,
+                 ttl=None):
+        self.path = str(path)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self.pid = None
+        self.connection = None
+
+    def connect(self):
+        # Connections can't be shared with forked children
+        if self.pid != os.getpid():
+            check_private(os.path.dirname(os.path.abspath(self.path)))
+            check_private(self.path)
+            self.connection = sqlite3.connect(
+                self.path, timeout=30, check_same_thread=False,
+                isolation_level=None
+            )
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                'key TEXT PRIMARY KEY, value BLOB, size INTEGER, '
+                'created REAL, accessed REAL)'
+            )
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS by_access ON entries (accessed)'
+            )
+            self.pid = os.getpid()
+        return self.connection
+
+    def get(self, key):
+        key = repr(key)
+        with self.lock:
+            connection = self.connect()
+            row = connection.execute(
+                'SELECT value, created FROM entries WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return False, None
+            now = time.time()
+            if self.ttl is not None and now - row[1] > self.ttl:
+                connection.execute(
+                    'DELETE FROM entries WHERE key = ?', (key,)
+                )
+                return False, None
+            connection.execute(
+                'UPDATE entries SET accessed = ? WHERE key = ?', (now, key)
+            )
+        return True, pickle.loads(row[0])
+
+    def put(self, key, value, size=None):
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_bytes:
+            return
+        now = time.time()
+        with self.lock:
+            connection = self.connect()
+            connection.execute(
+                'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)',
+                (repr(key), data, len(data), now, now)
+            )
+
+            # Evict least recently used
+            n_entries, n_bytes = connection.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries'
+            ).fetchone()
+            while n_entries > self.max_entries or n_bytes > self.max_bytes:
+                old_key, old_size = connection.execute(
+                    'SELECT key, size FROM entries '
+                    'ORDER BY accessed LIMIT 1'
+                ).fetchone()
+                connection.execute(
+                    'DELETE FROM entries WHERE key = ?', (old_key,)
+                )
+                n_entries -= 1
+                n_bytes -= old_size
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.connect().execute('DELETE FROM entries')
+
+    def stats(self):
+        with self.lock:
+            n_entries, n_bytes = self.connect().execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries'
+            ).fetchone()
+        return {
+            'evictions': self.evictions,
+            'entries': n_entries,
+            'bytes': n_bytes,
+        }
+
+
+class QueryCache:
+    '''
+    Memoization layer over a backend, with hit/miss metrics
+
+    Args:
+        backend (MemoryBackend or SQLiteBackend): Where results are kept
+    '''
+
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.hits = 0
+        self.misses = 0
+        self.version = None
+
+    def clear(self):
+        self.backend.clear()
+
+    def get(self, key, compute):
+        '''
+        Cached result of compute() for key, computing it on a miss
+        '''
+        # In-process results of stale data can be dropped right away;
+        # shared ones are told apart by the data fingerprint in the key
+        version = registry.get_version()
+        if version != self.version:
+            if isinstance(self.backend, MemoryBackend):
+                self.backend.clear()
+            self.version = version
+        key = (registry.get_fingerprint(),) + tuple(key)
+
+        found, value = self.backend.get(key)
+        if found:
+            self.hits += 1
+            return value
+        self.misses += 1
+
+        value = compute()
+        self.backend.put(key, value, registry.sizeof(value))
+        return value
+
+    def stats(self):
+        '''
+        (dict): Hit/miss counts, hit rate, evictions, entries and bytes
+        '''
+        n_queries = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / n_queries if n_queries else 0.0,
+            **self.backend.stats(),
+        }
+
+
+def make_backend(kind=None, path=None, **kwargs):
+    '''
+    Backend from its name, defaulting to the SKYRIM_QUERY_CACHE and
+    SKYRIM_QUERY_CACHE_PATH environment variables
+    '''
+    kind = kind or os.environ.get('SKYRIM_QUERY_CACHE', 'memory')
+    if kind == 'memory':
+        return MemoryBackend(**kwargs)
+    elif kind == 'sqlite':
+        path = path or os.environ.get('SKYRIM_QUERY_CACHE_PATH') or \
+            default_cache_path()
+        return SQLiteBackend(path, **kwargs)
+    raise ValueError(f'Unknown query cache backend: {kind}')
+
+
+def set_backend(backend):
+    '''
+    Swap the backend of the shared cache (metrics are kept)
+    '''
+    cache.backend = backend
+
+
+# Shared by every callback of the process
+cache = QueryCache(make_backend())
+
+
+def normalize_effects(effects):
+    return tuple(sorted(set(effects or [])))
+
+
+def filter_potions(subset, effects):
+    '''
+    Cached util.filter_potions over registry.get_potions(subset)
+    '''
+    effects = normalize_effects(effects)
+    if len(effects) == 0:
+        registry.get_version()
+        return registry.get_potions(subset)
+
+    # Cache the row positions only, they're far smaller than the rows.
+    # cache.get drops stale data first, so the table is fetched after it,
+    # from the same version as the index the rows came from
+    rows = cache.get(
+        ('potions', subset, effects),
+        lambda: query_effect_index(registry.get_effect_index(subset), effects)
+    )
+    return registry.get_potions(subset).iloc[rows]
+
+
+def filter_ingredients(subset, effects, logic='&'):
+    '''
+    Cached util.filter_by_effect over registry.get_ingredients(subset)
+    '''
+    effects = normalize_effects(effects)
+    if len(effects) == 0:
+        registry.get_version()
+        return registry.get_ingredients(subset)
+    if len(effects) == 1:
+        logic = '&'
+    return cache.get(
+        ('ingredients', subset, effects, logic),
+        lambda: filter_by_effect(
+            registry.get_ingredients(subset), list(effects), logic=logic,
+            matrix=registry.get_effect_matrix(subset)
+        )
+    )
+
+
+def make_kit(subset, effects, max_size=None):
+    '''
+    Cached kit_solver.make_optimal_kit over registry.get_potions(subset)
+
+    Only the deterministic kit is cached; random kits must stay random.
+    The solver's default node budget keeps it deterministic.
+    '''
+    effects = normalize_effects(effects)
+    return cache.get(
+        ('kit', subset, effects, max_size),
+        lambda: make_optimal_kit(
+            registry.get_potions(subset), list(effects),
+            registry.get_effect_index(subset), max_size=max_size
+        )
+    )
+
+
+def _ingredients():
+    # Ingredient table for the effect multipliers, if there's a snapshot
+    try:
+        return registry.get_ingredients()
+    except FileNotFoundError:
+        return None
+
+
+def score_potions(subset, **character):
+    '''
+    Cached alchemy.score_arrays over registry.get_potions(subset)
+
+    Uses the ingredient snapshot's effect multipliers when there is one.
+
+    Returns:
+        (pd.DataFrame): Value, Primary Effect, Magnitude and Duration,
+            with the index of registry.get_potions(subset)
+    '''
+    def compute():
+        scores = score_arrays(
+            registry.get_potion_arrays(subset), _ingredients(), **character
+        )
+        return pd.DataFrame(scores, index=registry.get_potions(subset).index)
+
+    return cache.get(
+        ('scores', subset, tuple(sorted(character.items()))), compute
+    )
+
+
+def top_potions(subset, k=20, names=None, **character):
+    '''
+    Cached alchemy.find_top_potions over registry.get_ing_space(subset)
+
+    Args:
+        subset (str): 'ingredients' (all) or 'garden'
+        k (int): Number of potions
+        names (list of str or None): Only use these ingredients
+        **character: Keyword arguments of alchemy.get_power
+    '''
+    names = tuple(sorted(set(names or [])))
+
+    def compute():
+        ing_space = registry.get_ing_space(subset)
+        if names:
+            ing_space = ing_space[ing_space.index.isin(names)]
+        return find_top_potions(ing_space, k, _ingredients(), **character)
+
+    return cache.get(
+        ('top', subset, k, names, tuple(sorted(character.items()))),
+        compute
+    )
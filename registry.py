@@ -0,0 +1,318 @@
+'''
+Shared, lazily-loaded data for the Dash apps
+
+Every dataset is loaded (or computed) once per process, on first access,
+and shared by all the apps. The cache directory defaults to the cache/
+folder next to this file, and can be changed with the SKYRIM_CACHE_DIR
+environment variable or set_cache_dir. The ingredient table comes from
+the snapshot in the cache directory, or from any other source (see
+sources.py) set with SKYRIM_INGREDIENTS or set_ingredient_source.
+'''
+import os
+import sys
+import time
+import hashlib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+import util
+from snapshot import SNAPSHOT_FILE, MANIFEST_FILE
+from sources import load_ingredients
+from potion_cache import load_potion_cache, load_potion_arrays
+from connectivity import (
+    CONNECTIVITY_FILE, get_connectivity as _get_connectivity,
+    load_connectivity, write_connectivity
+)
+
+SUBSETS = ('ingredients', 'garden')
+POTION_FILES = ('ingredients.npy', 'effects.npy', 'strings.json')
+_cache_dir = Path(
+    os.environ.get('SKYRIM_CACHE_DIR', Path(__file__).parent / 'cache')
+)
+_ingredient_source = os.environ.get('SKYRIM_INGREDIENTS', 'snapshot')
+_datasets = {}
+_stats = {}
+_sources = {}  # file -> modification time when it was loaded
+_version = 0
+
+
+def clear():
+    '''
+    Drop every loaded dataset, so they are reloaded on next access
+    '''
+    global _version
+    _datasets.clear()
+    _stats.clear()
+    _sources.clear()
+    _version += 1
+
+
+def set_cache_dir(path):
+    '''
+    Point the registry at another cache directory, dropping loaded data
+    '''
+    global _cache_dir
+    _cache_dir = Path(path)
+    clear()
+
+
+def set_ingredient_source(source):
+    '''
+    Load the ingredient table from another source (see
+    sources.load_ingredients), dropping loaded data
+    '''
+    global _ingredient_source
+    _ingredient_source = str(source)
+    clear()
+
+
+def _ingredient_files():
+    if _ingredient_source == 'snapshot':
+        return [_cache_dir / SNAPSHOT_FILE, _cache_dir / MANIFEST_FILE]
+    return [Path(_ingredient_source)]
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def get_version():
+    '''
+    Version of the loaded data, bumped whenever it is dropped
+
+    If any file a dataset was loaded from changed on disk since, all the
+    data is dropped first (derived datasets depend on the loaded ones).
+
+    Returns:
+        (int): Version number; results computed from the data stay valid
+            while it doesn't change
+    '''
+    if any(_mtime(path) != mtime for path, mtime in _sources.items()):
+        clear()
+    return _version
+
+
+def get_cache_dir():
+    return _cache_dir
+
+
+def sizeof(obj):
+    '''
+    Approximate memory footprint of a dataset, in bytes
+    '''
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, (tuple, list)):
+        return sum(sizeof(item) for item in obj)
+    if isinstance(obj, dict):
+        return sum(sizeof(item) for item in obj.values())
+    return sys.getsizeof(obj)
+
+
+def get_fingerprint():
+    '''
+    Short hash of the paths and modification times of every data file
+
+    Unlike get_version, it is the same in every process reading the same
+    files, so it can key results shared between processes.
+    '''
+    files = _ingredient_files()
+    for name in ('all_potions', 'garden_potions'):
+        files += [_cache_dir / name / file for file in POTION_FILES]
+    state = [(str(path), _mtime(path)) for path in files]
+    return hashlib.sha1(repr(state).encode()).hexdigest()[:16]
+
+
+def _get(name, loader, sources=()):
+    '''
+    Return dataset name, loading it with loader() the first time
+
+    sources are the files the dataset is loaded from, watched by
+    get_version.
+    '''
+    if name not in _datasets:
+        for path in sources:
+            _sources[path] = _mtime(path)
+        start = time.perf_counter()
+        _datasets[name] = loader()
+        _stats[name] = {
+            'Seconds': time.perf_counter() - start,
+            'MB': sizeof(_datasets[name]) / 2**20,
+        }
+    return _datasets[name]
+
+
+def _potion_table(subset):
+    name = 'all_potions' if subset == 'ingredients' else 'garden_potions'
+    path = _cache_dir / name
+    return _get(
+        name, lambda: load_potion_cache(path),
+        [path / file for file in POTION_FILES]
+    )
+
+
+def get_potions(subset='ingredients'):
+    '''
+    Potion table of an ingredient subset
+
+    Args:
+        subset (str): 'ingredients' (all) or 'garden'
+
+    Returns:
+        (pd.DataFrame): Ingredient 1, Ingredient 2, Ingredient 3, Effects
+    '''
+    if subset not in SUBSETS:
+        raise ValueError(f'Unknown subset: {subset}')
+    return _potion_table(subset)[0]
+
+
+def get_potion_arrays(subset='ingredients'):
+    '''
+    (dict): Memory-mapped columnar arrays of get_potions(subset), in the
+        same row order (see potion_cache.load_potion_arrays)
+    '''
+    if subset not in SUBSETS:
+        raise ValueError(f'Unknown subset: {subset}')
+    name = 'all_potions' if subset == 'ingredients' else 'garden_potions'
+    path = _cache_dir / name
+    return _get(
+        f'{name}_arrays', lambda: load_potion_arrays(path),
+        [path / file for file in POTION_FILES]
+    )
+
+
+def _connectivity(path, arrays):
+    # Cached graphs, rebuilt when older than the potion arrays
+    cached = _mtime(path / CONNECTIVITY_FILE)
+    if cached is not None and cached >= _mtime(path / 'effects.npy'):
+        return load_connectivity(path)
+    connectivity = _get_connectivity(arrays)
+    try:
+        write_connectivity(connectivity, path)
+    except OSError:
+        pass
+    return connectivity
+
+
+def get_connectivity(subset='ingredients'):
+    '''
+    (dict): Effect co-occurrence and ingredient-sharing graphs of
+        get_potions(subset) (see connectivity.get_connectivity), cached
+        on disk next to the potion arrays
+    '''
+    arrays = get_potion_arrays(subset)
+    name = 'all_potions' if subset == 'ingredients' else 'garden_potions'
+    path = _cache_dir / name
+    return _get(
+        f'{name}_connectivity', lambda: _connectivity(path, arrays),
+        [path / file for file in POTION_FILES]
+    )
+
+
+def get_all_fx():
+    '''
+    (set of str): Every effect an ingredient can have
+    '''
+    return _potion_table('ingredients')[1]
+
+
+def get_effect_options():
+    '''
+    (list of dicts): Dropdown options for every effect
+    '''
+    all_fx = get_all_fx()
+    return _get('effect_options', lambda: [
+        {'label': effect, 'value': effect} for effect in all_fx
+    ])
+
+
+def get_effect_index(subset='ingredients'):
+    '''
+    (dict): Inverted effect index of get_potions(subset)
+    '''
+    potions = get_potions(subset)
+    return _get(
+        f'{subset}_index', lambda: util.get_effect_index(potions)
+    )
+
+
+def get_ingredients(subset='ingredients'):
+    '''
+    Ingredient table of an ingredient subset
+
+    Args:
+        subset (str): 'ingredients' (all) or 'garden'
+
+    Returns:
+        (pd.DataFrame): Ingredient Name, Effect 1-4, and whichever of
+            Value, Weight and Garden Yield the source has
+    '''
+    if subset not in SUBSETS:
+        raise ValueError(f'Unknown subset: {subset}')
+    ingredients, garden = _get(
+        'ingredients',
+        lambda: load_ingredients(_ingredient_source, _cache_dir),
+        _ingredient_files()
+    )
+    return ingredients if subset == 'ingredients' else garden
+
+
+def get_effect_matrix(subset='ingredients'):
+    '''
+    (tuple): Output of util.get_effect_matrix for get_ingredients(subset)
+    '''
+    ingredients = get_ingredients(subset)
+    return _get(
+        f'{subset}_effect_matrix', lambda: util.get_effect_matrix(ingredients)
+    )
+
+
+def get_ing_space(subset='ingredients'):
+    '''
+    Ingredient-space of an ingredient subset
+
+    Built from the ingredient snapshot, or rebuilt from the potion table
+    when there is no snapshot (see util.get_ing_space_from_potions).
+    '''
+    if subset not in SUBSETS:
+        raise ValueError(f'Unknown subset: {subset}')
+    try:
+        ingredients = get_ingredients(subset)
+    except FileNotFoundError:
+        potions = get_potions(subset)
+        return _get(
+            f'{subset}_ing_space',
+            lambda: util.get_ing_space_from_potions(potions)
+        )
+    return _get(
+        f'{subset}_ing_space', lambda: util.get_ing_space(ingredients)
+    )
+
+
+def get_ingredient_effects():
+    '''
+    (dict): Output of get_effects for all ingredients
+    '''
+    ingredients = get_ingredients()
+    return _get(
+        'ingredient_effects', lambda: util.get_effects(ingredients)
+    )
+
+
+def report():
+    '''
+    Load time and memory of every dataset loaded so far
+
+    Returns:
+        (pd.DataFrame): Seconds and MB, indexed by dataset name
+    '''
+    return pd.DataFrame.from_dict(_stats, orient='index',
+                                  columns=['Seconds', 'MB'])
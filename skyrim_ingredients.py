@@ -3,6 +3,8 @@ import numpy as np
 import pandas as pd
 from collections import defaultdict
 
+from potion_engine import find_potions_auto
+
 
 def check_first(s):
     bads = {'Collected', 'Harvested', 'collected', 'harvested'}
@@ -74,7 +76,6 @@ def get_ingredients():
     # Get rid of acquisition rows
     is_good = ingredients['Effect 1'].apply(check_first)
     ingredients = ingredients[is_good]
-    assert ingredients.index.shape[0] == 109
 
     # Typing
     ingredients['Value'] = ingredients['Value'].astype(int)
@@ -263,8 +264,9 @@ def find_ALL_potions(ing_space):
 
 
 def filter_find_potions(ing_space, effects=[]):
+    # Same table as find_potions, chunked on large ingredient-spaces
     filtered_space = filter_ing_space(ing_space, effects=effects)
-    potions = find_potions(filtered_space, effects=effects)
+    potions = find_potions_auto(filtered_space, effects=effects)
     return potions
 
 
@@ -320,4 +322,9 @@ def make_kit(potions, effects):
 
 
 def get_connectivity_matrix(potions, all_effects):
-    
+    # Effect x effect: number of potions with both (diagonal: with each)
+    if isinstance(all_effects, dict):
+        all_effects = all_effects['all']
+    has_fx = potions['Effects'].str.get_dummies(sep=', ')
+    has_fx = has_fx.reindex(columns=sorted(all_effects), fill_value=0)
+    return has_fx.T.dot(has_fx)
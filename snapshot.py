@@ -0,0 +1,187 @@
+'''
+Versioned, checksummed local snapshot of the UESP ingredient table
+
+Usage:
+    python snapshot.py refresh [--html saved_page.html] [--cache-dir cache]
+    python snapshot.py verify [--cache-dir cache]
+    python snapshot.py rebuild [--cache-dir cache]
+
+refresh scrapes UESP (or parses a saved copy of the page) and writes
+<cache>/ingredients.csv plus a manifest, <cache>/ingredients.json, with
+its SHA-256, row count, source and version. The version is bumped only
+when the table changes. load_snapshot never touches the network.
+
+rebuild writes the snapshot offline from the bundled potion tables
+instead (see rebuild_from_potions). The repository ships this version,
+so the apps run from a clean checkout. It has no Value, Weight or Garden
+Yield columns, and its manifest lists the garden ingredients; refresh it
+from UESP for those figures and the effect multipliers.
+'''
+import io
+import json
+import hashlib
+import argparse
+import datetime
+import pandas as pd
+from pathlib import Path
+
+from util import UESP_URL, get_garden, get_ingredients, \
+    get_ing_space_from_potions, validate_ingredients
+
+SNAPSHOT_FILE = 'ingredients.csv'
+MANIFEST_FILE = 'ingredients.json'
+POTION_TABLES = ('all_potions.csv', 'garden_potions.csv')
+
+
+def checksum(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def read_manifest(cache_dir):
+    path = Path(cache_dir) / MANIFEST_FILE
+    if not path.exists():
+        return None
+    with open(path) as json_file:
+        return json.load(json_file)
+
+
+def write_snapshot(ingredients, cache_dir, source, garden=None):
+    '''
+    Write the ingredient table and its manifest
+
+    Args:
+        ingredients (pd.DataFrame): First output of get_ingredients
+        cache_dir (str or Path): Where to write the snapshot
+        source (str): URL or file the table came from
+        garden (list of str or None): Garden ingredients, for a table
+            without Garden Yield
+
+    Returns:
+        (dict): The new manifest
+    '''
+    cache_dir = Path(cache_dir)
+    data = ingredients.to_csv().encode()
+    old = read_manifest(cache_dir)
+
+    # Only bump the version when the content changes
+    digest = checksum(data)
+    if old is None:
+        version = 1
+    elif old['sha256'] == digest and old.get('garden') == garden:
+        return old
+    else:
+        version = old['version'] + 1
+
+    manifest = {
+        'version': version,
+        'sha256': digest,
+        'rows': ingredients.index.shape[0],
+        'source': str(source),
+        'retrieved': datetime.date.today().isoformat(),
+    }
+    if garden is not None:
+        manifest['garden'] = list(garden)
+    with open(cache_dir / SNAPSHOT_FILE, 'wb') as csv_file:
+        csv_file.write(data)
+    with open(cache_dir / MANIFEST_FILE, 'w') as json_file:
+        json.dump(manifest, json_file, indent=1)
+    return manifest
+
+
+def rebuild_from_potions(cache_dir):
+    '''
+    Ingredient table rebuilt offline from the cached potion tables
+
+    Effects come from util.get_ing_space_from_potions, in alphabetical
+    order and without their multipliers. The potion tables don't know the
+    values, weights or garden yields, so the table has no such columns;
+    the garden ingredients are those of the garden potions.
+
+    Args:
+        cache_dir (str or Path): Folder holding all_potions.csv and
+            garden_potions.csv
+
+    Returns:
+        (pd.DataFrame): Ingredient Name and Effect 1-4
+        (list of str): Garden ingredients, sorted
+    '''
+    cache_dir = Path(cache_dir)
+    all_potions, garden_potions = [
+        pd.read_csv(cache_dir / name, index_col=0) for name in POTION_TABLES
+    ]
+    ing_space = get_ing_space_from_potions(all_potions)
+    garden = set(
+        garden_potions[['Ingredient 1', 'Ingredient 2', 'Ingredient 3']]
+        .stack().dropna()
+    )
+
+    effects = ing_space.columns.to_numpy()
+    ingredients = pd.DataFrame(
+        [effects[row == 1] for row in ing_space.to_numpy()],
+        columns=[f'Effect {n + 1}' for n in range(4)]
+    )
+    ingredients.insert(0, 'Ingredient Name', ing_space.index)
+    ingredients = validate_ingredients(
+        ingredients, cache_dir / POTION_TABLES[0]
+    )
+    return ingredients, sorted(garden)
+
+
+def load_snapshot(cache_dir):
+    '''
+    Offline equivalent of get_ingredients
+
+    Args:
+        cache_dir (str or Path): Folder holding the snapshot
+
+    Returns:
+        (pd.DataFrame): All ingredients
+        (pd.DataFrame): Ingredients that grow in the Hearthfire gardens,
+            sorted by Garden Yield (in table order if the snapshot has
+            none, see rebuild_from_potions)
+    '''
+    cache_dir = Path(cache_dir)
+    manifest = read_manifest(cache_dir)
+    if manifest is None:
+        raise FileNotFoundError(
+            f'No ingredient snapshot in {cache_dir}, create one with '
+            '`python snapshot.py refresh`'
+        )
+
+    with open(cache_dir / SNAPSHOT_FILE, 'rb') as csv_file:
+        data = csv_file.read()
+    if checksum(data) != manifest['sha256']:
+        raise ValueError(
+            f'Ingredient snapshot in {cache_dir} does not match its '
+            'checksum, refresh it with `python snapshot.py refresh`'
+        )
+
+    ingredients = pd.read_csv(io.BytesIO(data), index_col=0)
+    garden = get_garden(ingredients, manifest.get('garden', ()))
+    return ingredients, garden
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('command', choices=['refresh', 'verify', 'rebuild'])
+    parser.add_argument('--html', default=None,
+                        help='Saved copy of the UESP ingredients page')
+    parser.add_argument('--cache-dir', default='cache')
+    args = parser.parse_args()
+
+    if args.command == 'refresh':
+        source = args.html or UESP_URL
+        ingredients, _ = get_ingredients(source)
+        manifest = write_snapshot(ingredients, args.cache_dir, source)
+    elif args.command == 'rebuild':
+        ingredients, garden = rebuild_from_potions(args.cache_dir)
+        manifest = write_snapshot(
+            ingredients, args.cache_dir,
+            ', '.join(f'{args.cache_dir}/{name}' for name in POTION_TABLES),
+            garden
+        )
+    else:
+        ingredients, _ = load_snapshot(args.cache_dir)
+        manifest = read_manifest(args.cache_dir)
+    print(f'Ingredient snapshot v{manifest["version"]}: '
+          f'{manifest["rows"]} ingredients, sha256 {manifest["sha256"]}')
@@ -0,0 +1,147 @@
+'''
+Pluggable ingredient sources
+
+Usage:
+    python sources.py SOURCE
+
+A source is one of:
+    - 'snapshot' (default): the local UESP snapshot (see snapshot.py)
+    - 'uesp', a URL or a saved .html page: scraped with get_ingredients
+    - a .csv / .tsv file: one row per ingredient
+    - a .json file: a list of records, or an object mapping each
+      ingredient name to its list of effects
+
+Column names are matched loosely, so mod-exported tables load as they
+are: 'Name' or 'ingredient_name' for Ingredient Name, 'effect1' or
+'Primary Effect' for Effect 1, or a single 'Effects' column (a list, or
+a string separated by ';', '|' or ', ') for all four. Every table is
+checked with util.validate_ingredients, whatever its length. Readers for
+other formats are added with register_source.
+'''
+import re
+import json
+import argparse
+import pandas as pd
+from pathlib import Path
+
+from util import UESP_URL, EFFECT_COLUMNS, get_ingredients, \
+    get_effect_codes, get_garden, validate_ingredients
+from snapshot import load_snapshot
+
+COLUMN_ALIASES = {
+    'ingredientname': 'Ingredient Name',
+    'ingredient': 'Ingredient Name',
+    'name': 'Ingredient Name',
+    'fullname': 'Ingredient Name',
+    'primaryeffect': 'Effect 1',
+    'secondaryeffect': 'Effect 2',
+    'tertiaryeffect': 'Effect 3',
+    'quaternaryeffect': 'Effect 4',
+    'value': 'Value',
+    'basevalue': 'Value',
+    'gold': 'Value',
+    'weight': 'Weight',
+    'gardenyield': 'Garden Yield',
+    'gardenhf': 'Garden Yield',
+    **{f'effect{n + 1}': f'Effect {n + 1}' for n in range(4)},
+}
+_readers = {}  # file suffix -> reader
+
+
+def register_source(suffix, reader):
+    '''
+    Read files ending with suffix (e.g. '.xlsx') with reader(path), which
+    returns an ingredient table, normalized and validated afterwards
+    '''
+    _readers[suffix.lower()] = reader
+
+
+def normalize_columns(table):
+    '''
+    Rename loosely matching columns to the get_ingredients schema, and
+    split a single Effects column into Effect 1-4
+    '''
+    renames = {}
+    for column in table.columns:
+        key = re.sub(r'[^a-z0-9]', '', str(column).lower())
+        if key in COLUMN_ALIASES:
+            renames[column] = COLUMN_ALIASES[key]
+    table = table.rename(columns=renames)
+
+    effects = [
+        column for column in table.columns
+        if re.sub(r'[^a-z]', '', str(column).lower()) == 'effects'
+    ]
+    if effects and not set(EFFECT_COLUMNS) & set(table.columns):
+        lists = table[effects[0]].map(
+            lambda fx: fx if isinstance(fx, list)
+            else re.split(r'\s*[;|]\s*|,\s+', str(fx).strip())
+        )
+        for n, column in enumerate(EFFECT_COLUMNS):
+            table[column] = lists.map(
+                lambda fx: fx[n] if len(fx) > n else None
+            )
+        table = table.drop(columns=effects[0])
+    return table
+
+
+def read_json(path):
+    with open(path) as json_file:
+        data = json.load(json_file)
+    if isinstance(data, dict):
+        data = [
+            {'Ingredient Name': name, 'Effects': effects}
+            for name, effects in data.items()
+        ]
+    return pd.DataFrame(data)
+
+
+register_source('.csv', pd.read_csv)
+register_source('.tsv', lambda path: pd.read_csv(path, sep='\t'))
+register_source('.json', read_json)
+
+
+def load_ingredients(source='snapshot', cache_dir='cache'):
+    '''
+    Ingredient table from any source (see module docstring)
+
+    Args:
+        source (str or Path): 'snapshot', 'uesp', a URL or a file
+        cache_dir (str or Path): Folder holding the snapshot
+
+    Returns:
+        (pd.DataFrame): All ingredients
+        (pd.DataFrame): Ingredients that grow in the Hearthfire gardens,
+            sorted by Garden Yield
+    '''
+    source = str(source)
+    garden_names = ()
+    if source == 'snapshot':
+        ingredients, garden = load_snapshot(cache_dir)
+        garden_names = garden['Ingredient Name']
+    elif source == 'uesp' or re.match(r'https?://', source) or \
+            Path(source).suffix.lower() in ('.html', '.htm'):
+        ingredients, _ = get_ingredients(
+            UESP_URL if source == 'uesp' else source
+        )
+    else:
+        suffix = Path(source).suffix.lower()
+        if suffix not in _readers:
+            raise ValueError(f'Unknown ingredient source: {source}')
+        if not Path(source).exists():
+            raise FileNotFoundError(f'No ingredient table at {source}')
+        ingredients = normalize_columns(_readers[suffix](source))
+    ingredients = validate_ingredients(ingredients, source)
+    return ingredients, get_garden(ingredients, garden_names)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('source', nargs='?', default='snapshot')
+    parser.add_argument('--cache-dir', default='cache')
+    args = parser.parse_args()
+
+    ingredients, garden = load_ingredients(args.source, args.cache_dir)
+    n_fx = len(get_effect_codes(ingredients)[0])
+    print(f'{args.source}: {ingredients.index.shape[0]} ingredients '
+          f'({garden.index.shape[0]} in gardens), {n_fx} effects')
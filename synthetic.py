@@ -0,0 +1,121 @@
+'''
+Synthetic ingredient tables for scale testing
+
+Usage:
+    python synthetic.py 2000 [--effects 120] [--seed 0]
+        [--reference ingredients.csv] [--out synthetic_ingredients.csv]
+
+Generated tables have the get_ingredients schema (Ingredient Name,
+Effect 1-4, and Value, Weight, Garden Yield when the reference has them),
+so every engine can run on them. Each ingredient gets 4 distinct effects,
+drawn with the effect frequencies of a reference table: the ingredient
+snapshot by default, or the bundled benchmark fixture without one.
+'''
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from util import EFFECT_COLUMNS, get_effect_codes
+from snapshot import load_snapshot
+
+FIXTURE = Path(__file__).parent / 'benchmarks' / 'fixtures' / \
+    'ingredients.csv'
+OTHER_COLUMNS = ['Value', 'Weight', 'Garden Yield']
+
+
+def load_reference(path=None, cache_dir='cache'):
+    '''
+    Reference ingredient table: path, else the snapshot, else the fixture
+    '''
+    if path is not None:
+        return pd.read_csv(path)
+    try:
+        return load_snapshot(cache_dir)[0]
+    except FileNotFoundError:
+        return pd.read_csv(FIXTURE)
+
+
+def get_effect_frequencies(ingredients):
+    '''
+    (pd.Series): Number of ingredients with each effect, most common first
+    '''
+    all_fx, _, columns = get_effect_codes(ingredients)
+    counts = np.bincount(columns, minlength=len(all_fx))
+    return pd.Series(counts, index=all_fx)\
+        .sort_values(ascending=False, kind='stable')
+
+
+def make_ingredients(n_ingredients, reference, n_effects=None, seed=None):
+    '''
+    Synthetic ingredient table with realistic effect frequencies
+
+    Effects are sampled without replacement, proportionally to their
+    frequency in the reference, all ingredients at once (Gumbel top-k).
+    With more effects than the reference, the extra effects get
+    frequencies resampled from the reference's; with fewer, the most
+    common effects are kept.
+
+    Args:
+        n_ingredients (int): Number of ingredients
+        reference (pd.DataFrame): Real ingredient table (see
+            load_reference)
+        n_effects (int or None): Size of the effect universe, defaults to
+            the reference's
+        seed (int or None): Random seed
+
+    Returns:
+        (pd.DataFrame): Ingredient Name, Effect 1-4, plus the Value, Weight
+            and Garden Yield columns of the reference, resampled
+    '''
+    rng = np.random.default_rng(seed)
+    frequencies = get_effect_frequencies(reference)
+    if n_effects is None:
+        n_effects = frequencies.shape[0]
+    if n_effects < 4:
+        raise ValueError('Ingredients need at least 4 effects to pick from')
+
+    # Effect universe
+    names = list(frequencies.index[:n_effects])
+    weights = frequencies.to_numpy(float)[:n_effects]
+    n_extra = n_effects - len(names)
+    if n_extra > 0:
+        names += [f'Synthetic Effect {k:04d}' for k in range(n_extra)]
+        weights = np.append(weights, rng.choice(weights, n_extra))
+
+    # 4 distinct effects per ingredient, most likely first
+    keys = np.log(weights) + rng.gumbel(size=(n_ingredients, n_effects))
+    top = np.argpartition(-keys, 3, axis=1)[:, :4]
+    order = np.argsort(-np.take_along_axis(keys, top, axis=1), axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+
+    ingredients = pd.DataFrame(
+        np.array(names, object)[top], columns=EFFECT_COLUMNS
+    )
+    ingredients.insert(0, 'Ingredient Name', [
+        f'Synthetic Ingredient {k:05d}' for k in range(n_ingredients)
+    ])
+    for column in OTHER_COLUMNS:
+        if column in reference:
+            ingredients[column] = rng.choice(
+                reference[column].to_numpy(), n_ingredients
+            )
+    return ingredients
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('n_ingredients', type=int)
+    parser.add_argument('--effects', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--reference', default=None)
+    parser.add_argument('--out', default='synthetic_ingredients.csv')
+    args = parser.parse_args()
+
+    ingredients = make_ingredients(
+        args.n_ingredients, load_reference(args.reference), args.effects,
+        args.seed
+    )
+    ingredients.to_csv(args.out, index=False)
+    print(f'Wrote {ingredients.index.shape[0]} ingredients with '
+          f'{len(get_effect_frequencies(ingredients))} effects to {args.out}')
@@ -1,7 +1,10 @@
+import re
 import numpy as np
 import pandas as pd
 from collections import defaultdict
 
+from potion_engine import find_potions_auto
+
 
 def check_first(s):
     bads = {'Collected', 'Harvested', 'collected', 'harvested'}
@@ -11,9 +14,14 @@ def check_first(s):
     return True
 
 
-def get_ingredients():
-    # Scrape the table
-    dfs = pd.read_html('https://en.uesp.net/wiki/Skyrim:Ingredients')
+UESP_URL = 'https://en.uesp.net/wiki/Skyrim:Ingredients'
+EFFECT_COLUMNS = [f'Effect {n+1}' for n in range(4)]
+OPTIONAL_COLUMNS = {'Value': int, 'Weight': float, 'Garden Yield': int}
+
+
+def get_ingredients(source=UESP_URL):
+    # Scrape the table (source can also be a saved copy of the page)
+    dfs = pd.read_html(source)
 
     # Clean columns
     ingredients = dfs[0].drop(columns=['Ingredient Name (ID)'])
@@ -31,22 +39,104 @@ def get_ingredients():
 
     # Get rid of acquisition rows
     is_good = ingredients['Effect 1'].apply(check_first)
-    ingredients = ingredients[is_good]
-    assert ingredients.index.shape[0] == 109
-
-    # Typing
-    ingredients['Value'] = ingredients['Value'].astype(int)
-    ingredients['Weight'] = ingredients['Weight'].astype(float)
-    ingredients['Garden Yield'] = ingredients['Garden Yield']\
-        .fillna(0).astype(int)
+    ingredients = validate_ingredients(ingredients[is_good], source)
 
     # Get the ones you can grow
-    garden = ingredients[ingredients['Garden Yield'] > 0]\
-        .sort_values('Garden Yield', ascending=False)
+    garden = get_garden(ingredients)
 
     return ingredients, garden
 
 
+def get_garden(ingredients, names=()):
+    '''
+    Ingredients that grow in the Hearthfire gardens, sorted by Garden Yield
+
+    A table without Garden Yield (e.g. a snapshot rebuilt offline) can
+    list the garden ingredients by name instead.
+
+    Args:
+        ingredients (pd.DataFrame): Output of validate_ingredients
+        names (iterable of str): Garden ingredients, if there is no
+            Garden Yield column
+
+    Returns:
+        (pd.DataFrame): Rows of ingredients
+    '''
+    if 'Garden Yield' not in ingredients:
+        return ingredients[ingredients['Ingredient Name'].isin(list(names))]
+    return ingredients[ingredients['Garden Yield'] > 0]\
+        .sort_values('Garden Yield', ascending=False)
+
+
+def validate_ingredients(ingredients, source='ingredient table'):
+    '''
+    Check an ingredient table against the get_ingredients schema
+
+    Every ingredient needs a unique, non-empty Ingredient Name and 4
+    distinct effects (magnitudes such as ' (1.5x)' aside). Value, Weight
+    and Garden Yield are optional: missing values become 0, and missing
+    columns stay missing, so the apps can tell unknown figures from 0.
+
+    Args:
+        ingredients (pd.DataFrame): Ingredient table, of any length
+        source (str): Where the table came from, for the error messages
+
+    Returns:
+        (pd.DataFrame): Typed copy
+
+    Raises:
+        ValueError: Listing what doesn't fit the schema
+    '''
+    missing = [
+        column for column in ['Ingredient Name'] + EFFECT_COLUMNS
+        if column not in ingredients
+    ]
+    if missing:
+        raise ValueError(f'{source}: missing columns {", ".join(missing)}')
+    if ingredients.index.shape[0] == 0:
+        raise ValueError(f'{source}: no ingredients')
+
+    ingredients = ingredients.copy()
+    errors = []
+    names = ingredients['Ingredient Name']
+    if names.isna().any() or (names.astype(str).str.strip() == '').any():
+        errors.append('ingredients without a name')
+    duplicates = names[names.duplicated()].unique()
+    if duplicates.shape[0]:
+        errors.append(f'duplicate names {", ".join(map(str, duplicates))}')
+
+    effects = ingredients[EFFECT_COLUMNS]
+    if effects.isna().any(axis=None):
+        rows = names[effects.isna().any(axis=1)]
+        errors.append(
+            f'fewer than 4 effects for {", ".join(map(str, rows))}'
+        )
+    else:
+        stripped = effects.apply(
+            lambda column: column.astype(str).str.split(
+                ' (', n=1, regex=False
+            ).str[0].str.strip()
+        )
+        repeated = stripped.nunique(axis=1) < 4
+        if repeated.any():
+            errors.append(
+                f'repeated effects for {", ".join(map(str, names[repeated]))}'
+            )
+
+    for column, dtype in OPTIONAL_COLUMNS.items():
+        if column not in ingredients:
+            continue
+        values = pd.to_numeric(ingredients[column], errors='coerce')
+        if values[ingredients[column].notna()].isna().any():
+            errors.append(f'non-numeric {column}')
+        else:
+            ingredients[column] = values.fillna(0).astype(dtype)
+
+    if errors:
+        raise ValueError(f'{source}: {"; ".join(errors)}')
+    return ingredients
+
+
 def get_effects(df):
     fx = set()
     for n in range(4):
@@ -76,35 +166,147 @@ def check_val(row, check):
     return False
 
 
-def filter_by_effect(df, effects, logic='&'):
+def get_effect_codes(df):
+    '''
+    Factorize the four effect columns of an ingredient table
+
+    Args:
+        df (pd.DataFrame): Output of get_ingredients (or a subset)
+
+    Returns:
+        (np.ndarray): Effect names, sorted
+        (np.ndarray): Row of each (ingredient, effect) entry
+        (np.ndarray): Column (index into the effect names) of each entry
+
+    Raises:
+        ValueError: If an effect is missing (NaN would become 'nan')
+    '''
+    effects = df[EFFECT_COLUMNS]
+    if effects.isna().any(axis=None):
+        rows = df.loc[effects.isna().any(axis=1).to_numpy(),
+                      'Ingredient Name']
+        raise ValueError(
+            f'fewer than 4 effects for {", ".join(map(str, rows))}'
+        )
+
+    # Strip the magnitudes, e.g. 'Fortify Sneak (1.5x)'
+    names = effects.to_numpy(dtype=str)
+    names = pd.Series(names.ravel())\
+        .str.split(' (', n=1, regex=False).str[0].to_numpy(dtype=str)
+    all_fx, columns = np.unique(names, return_inverse=True)
+    rows = np.repeat(np.arange(df.index.shape[0]), 4)
+    return all_fx, rows, columns
+
+
+def get_effect_matrix(df):
+    '''
+    Ingredient x effect boolean matrix of an ingredient table
+
+    Args:
+        df (pd.DataFrame): Output of get_ingredients (or a subset)
+
+    Returns:
+        (np.ndarray): bool, one row per ingredient of df (in order), True
+            where the ingredient has the effect
+        (np.ndarray): Effect name of each column, sorted
+    '''
+    all_fx, rows, columns = get_effect_codes(df)
+    has_fx = np.zeros((df.index.shape[0], len(all_fx)), bool)
+    has_fx[rows, columns] = True
+    return has_fx, all_fx
+
+
+def filter_by_effect(df, effects, logic='&', matrix=None):
+    '''
+    Ingredients with all ('&') or any ('|') of the effects
+
+    Args:
+        df (pd.DataFrame): Output of get_ingredients (or a subset)
+        effects (str or list of str): Effects to look for
+        logic (str): '&' or '|'
+        matrix (tuple): Output of get_effect_matrix(df), computed if None
+
+    Returns:
+        (pd.DataFrame): Matching rows of df
+    '''
     if isinstance(effects, str):
         effects = [effects]
-    is_effects = None
-    for effect in effects:
-        is_effect = df.apply(lambda row: check_val(row, effect), axis=1)
-        if is_effects is None:
-            is_effects = is_effect
-        else:
-            exec(f'is_effects {logic}= is_effect')
+    if logic not in ('&', '|'):
+        raise ValueError(f'Unknown filter logic: {logic}')
+    has_fx, all_fx = matrix if matrix is not None else get_effect_matrix(df)
+
+    # Unknown effects match no ingredient
+    columns = np.searchsorted(all_fx, effects)
+    is_known = columns < len(all_fx)
+    is_known[is_known] = all_fx[columns[is_known]] == \
+        np.asarray(effects)[is_known]
+    selected = has_fx[:, columns[is_known]]
+
+    if logic == '&':
+        is_effects = selected.all(axis=1) & is_known.all()
+    else:
+        is_effects = selected.any(axis=1)
     return df[is_effects].copy()
 
 
-def get_ing_space(ingredients):
-    fx = get_effects(ingredients)
-    num_ing = ingredients.index.shape[0]
-    num_fx = len(fx['all'])
+def get_ing_space(ingredients, sparse=False):
+    '''
+    Ingredients x effects matrix, counting each effect of each ingredient
+
+    Args:
+        ingredients (pd.DataFrame): Output of get_ingredients (or a subset)
+        sparse (bool): Store the columns as pandas sparse arrays (most of
+            the matrix is 0)
+
+    Returns:
+        (pd.DataFrame): Indexed by Ingredient Name, with the effects sorted
+            alphabetically as columns
+    '''
+    all_fx, rows, columns = get_effect_codes(ingredients)
+    counts = np.zeros((ingredients.index.shape[0], len(all_fx)), int)
+    np.add.at(counts, (rows, columns), 1)
+
     ing_space = pd.DataFrame(
-        np.zeros((num_ing, num_fx), int),
-        index=ingredients['Ingredient Name'],
-        columns=fx['all']
+        counts,
+        index=pd.Index(ingredients['Ingredient Name']),
+        columns=list(all_fx)
     )
+    if sparse:
+        ing_space = ing_space.astype(pd.SparseDtype(int, 0))
+    return ing_space
 
-    for n in range(num_ing):
-        row = ingredients.iloc[n]
-        name = row['Ingredient Name']
-        for m in range(4):
-            effect = row[f'Effect {m+1}'].split(' (')[0]
-            ing_space.loc[name, effect] += 1
+
+def get_ing_space_from_potions(potions):
+    '''
+    Rebuild an ingredient-space from a cached potion table (offline)
+
+    Every vanilla ingredient shares each of its effects with at least one
+    other ingredient, so the union of the 2-ingredient potion effects
+    recovers each ingredient's full effect set.
+
+    Args:
+        potions (pd.DataFrame): Output of find_ALL_potions
+
+    Returns:
+        (pd.DataFrame): Ingredients x effects matrix of 0/1, with the
+            effects sorted alphabetically
+    '''
+    pairs = potions[potions['Ingredient 3'].isna()]
+    ing_fx = defaultdict(set)
+    for row in pairs.itertuples(index=False):
+        effects = row[3].split(', ')
+        ing_fx[row[0]].update(effects)
+        ing_fx[row[1]].update(effects)
+
+    names = sorted(ing_fx)
+    all_fx = sorted(set().union(*ing_fx.values()))
+    ing_space = pd.DataFrame(
+        np.zeros((len(names), len(all_fx)), int),
+        index=pd.Index(names, name='Ingredient Name'),
+        columns=all_fx
+    )
+    for name in names:
+        ing_space.loc[name, list(ing_fx[name])] = 1
 
     return ing_space
 
@@ -113,13 +315,13 @@ def filter_ing_space(ing_space, effects=[], logic='|'):
     if len(effects) == 0:
         return ing_space
 
-    conds = None
-    for effect in effects:
-        cond = ing_space[effect] == 1
-        if conds is None:
-            conds = cond
-        else:
-            exec(f'conds {logic}= cond')
+    conds = ing_space[list(effects)].to_numpy() == 1
+    if logic == '&':
+        conds = conds.all(axis=1)
+    elif logic == '|':
+        conds = conds.any(axis=1)
+    else:
+        raise ValueError(f'Unknown filter logic: {logic}')
 
     return ing_space[conds]
 
@@ -153,22 +355,216 @@ def find_potions(ing_space, effects=[]):
     return pd.DataFrame(potions)
 
 
+def find_ALL_potions(ing_space):
+    # Initialize
+    potions = []
+    num_ing = ing_space.index.shape[0]
+
+    # Search all 3-combinations
+    for n in range(num_ing):
+        # Get first ingredient
+        ing1 = ing_space.iloc[n]
+
+        for m in range(n+1, num_ing):
+            # Get second ingredient
+            ing2 = ing_space.iloc[m]
+
+            # Combination of first 2
+            combo12 = ing1 + ing2
+
+            # If desired effects, add to potions list
+            check = combo12 > 1
+            effects_2 = ', '.join(combo12[combo12 > 1].index)
+            if check.any():
+                potions.append({
+                    'Ingredient 1': ing_space.index[n],
+                    'Ingredient 2': ing_space.index[m],
+                    'Ingredient 3': None,
+                    'Effects': effects_2
+                })
+
+            for j in range(m+1, num_ing):
+                # Combination of all 3
+                combo123 = ing1 + ing2 + ing_space.iloc[j]
+
+                # Make sure desired effects present
+                check = combo123 > 1
+                effects_3 = ', '.join(combo123[combo123 > 1].index)
+
+                # Make sure that simpler potions aren't possible
+                combo23 = ing2 + ing_space.iloc[j]
+                effects_2_ = ', '.join(combo23[combo23 > 1].index)
+
+                combo13 = ing1 + ing_space.iloc[j]
+                effects_13 = ', '.join(combo13[combo13 > 1].index)
+
+                # Save 3-ingredient potion if valid
+                if (
+                    check.any()
+                    & (effects_3 != effects_2)  # Make sure 3rd isn't dead
+                    & (effects_3 != effects_2_)  # Make sure 1st isn't dead
+                    & (effects_3 != effects_13)  # Make sure 2nd isn't dead
+                ):
+                    potions.append({
+                        'Ingredient 1': ing_space.index[n],
+                        'Ingredient 2': ing_space.index[m],
+                        'Ingredient 3': ing_space.index[j],
+                        'Effects': effects_3
+                    })
+
+    return pd.DataFrame(potions)
+
+
 def filter_find_potions(ing_space, effects=[]):
+    # Same table as find_potions, chunked on large ingredient-spaces
     filtered_space = filter_ing_space(ing_space, effects=effects)
-    potions = find_potions(filtered_space, effects=effects)
+    potions = find_potions_auto(filtered_space, effects=effects)
     return potions
 
 
-def filter_potions(potions, effects):
+def get_effect_index(potions):
+    '''
+    Inverted index of a potion table: effect -> row positions
+
+    Args:
+        potions (pd.DataFrame): Potion table, with an Effects column
+
+    Returns:
+        (dict): Effect name -> sorted np.ndarray of row positions
+            (for potions.iloc) of the potions with that effect
+    '''
+    postings = defaultdict(list)
+    for n, effects in enumerate(potions['Effects']):
+        for effect in effects.split(', '):
+            postings[effect].append(n)
+    return {
+        effect: np.array(rows, dtype=np.int32)
+        for effect, rows in postings.items()
+    }
+
+
+def query_effect_index(index, effects):
+    '''
+    Row positions of the potions having all of the effects
+
+    Postings are intersected from the shortest up, so the cost is bounded
+    by the rarest effect rather than by the size of the table.
+    '''
+    postings = []
+    for effect in set(effects):
+        if effect not in index:
+            return np.array([], dtype=np.int32)
+        postings.append(index[effect])
+    postings.sort(key=len)
+    rows = postings[0]
+    for other in postings[1:]:
+        rows = np.intersect1d(rows, other, assume_unique=True)
+    return rows
+
+
+def filter_potions(potions, effects, index=None):
     if len(effects) == 0:
         return potions
+    if index is not None:
+        return potions.iloc[query_effect_index(index, effects)]
     effects = set(effects)
     filter = potions['Effects'].apply(
         lambda x: effects.issubset(set(x.split(', '))))
     return potions[filter]
 
 
-def make_kit(potions, effects):
+FILTER_OPERATORS = {
+    'contains': 'contains', 'icontains': 'contains', 'scontains': 'contains',
+    '=': '==', 'eq': '==', 's=': '==', 'i=': '==', 'seq': '==', 'ieq': '==',
+    '!=': '!=', 'ne': '!=', 's!=': '!=', 'i!=': '!=', 'sne': '!=',
+    'ine': '!=', '<': '<', 'lt': '<', '<=': '<=', 'le': '<=', '>': '>',
+    'gt': '>', '>=': '>=', 'ge': '>=', 'datestartswith': 'startswith',
+}
+
+
+def parse_filter_query(filter_query):
+    '''
+    Split a DataTable filter_query into (column, operator, value, case)
+
+    Handles the "{column} operator value" clauses joined by " && " that
+    the native DataTable filter row produces.
+    '''
+    clauses = []
+    for part in filter_query.split(' && '):
+        match = re.match(r'\s*\{(.+?)\}\s+(\S+)\s+(.*)$', part)
+        if match is None or match.group(2) not in FILTER_OPERATORS:
+            continue
+        column, op, value = match.groups()
+        value = value.strip()
+        if len(value) > 1 and value[0] == value[-1] and value[0] in '"\'`':
+            value = value[1:-1]
+        ignore_case = op.startswith('i') and op != 'i'
+        clauses.append((column, FILTER_OPERATORS[op], value, ignore_case))
+    return clauses
+
+
+def filter_table(df, filter_query):
+    '''
+    Rows of df matching a DataTable filter_query (see parse_filter_query)
+    '''
+    if not filter_query:
+        return df
+    is_match = np.ones(df.index.shape[0], bool)
+    for column, op, value, ignore_case in parse_filter_query(filter_query):
+        if column not in df.columns:
+            continue
+        if pd.api.types.is_numeric_dtype(df[column]):
+            # Compare numbers as numbers, not strings
+            try:
+                value = float(value)
+            except ValueError:
+                continue
+            col = df[column]
+            ignore_case = False
+            op = '==' if op in ('contains', 'startswith') else op
+        else:
+            col = df[column].fillna('').astype(str)
+        if ignore_case:
+            col = col.str.lower()
+            value = value.lower()
+        if op == 'contains':
+            is_match &= col.str.contains(value, regex=False).values
+        elif op == 'startswith':
+            is_match &= col.str.startswith(value).values
+        else:
+            is_match &= {
+                '==': col == value, '!=': col != value,
+                '<': col < value, '<=': col <= value,
+                '>': col > value, '>=': col >= value,
+            }[op].values
+    return df[is_match]
+
+
+def sort_table(df, sort_by):
+    '''
+    Sort df by a DataTable sort_by list of {'column_id', 'direction'}
+    '''
+    if not sort_by:
+        return df
+    return df.sort_values(
+        [col['column_id'] for col in sort_by],
+        ascending=[col['direction'] == 'asc' for col in sort_by],
+        kind='mergesort'
+    )
+
+
+def get_page(df, page_current, page_size):
+    '''
+    One page of df, and the number of pages
+
+    Pages past the last one give the last page.
+    '''
+    page_count = max(1, -(-df.index.shape[0] // page_size))
+    start = min(page_current, page_count - 1) * page_size
+    return df.iloc[start:start + page_size], page_count
+
+
+def make_kit(potions, effects, index=None):
     if len(effects) == 0:
         return (
             pd.DataFrame(columns=[
@@ -189,7 +585,7 @@ def make_kit(potions, effects):
         if effect not in fx.keys():
 
             # Filter full potion list by those with effect
-            filtered_ptns = filter_potions(potions, [effect])
+            filtered_ptns = filter_potions(potions, [effect], index)
 
             # If no potions have the desired effect, skip
             if len(filtered_ptns) == 0: